@@ -1,78 +1,172 @@
-from autogen import ConversableAgent
-import logging
-
-logger = logging.getLogger(__name__)
-
-def make_comedian(name: str, llm_config: dict) -> ConversableAgent:
-    """Create a comedian agent"""
-    system_message = f"""Your name is {name} and you are a quick-witted, kind stand-up comedian.
-You are performing an improv scene based on the audience suggestion.
-Rules:
-- Keep each line to 2 sentences or less
-- Always tie your response to the original suggestion
-- Be playful but keep it safe and clean
-- When asked to wrap up, end with "I gotta go"
-"""
-    
-    def termination_predicate(messages):
-        if messages and isinstance(messages, list) and len(messages) > 0:
-            last_msg = messages[-1]
-            if isinstance(last_msg, dict):
-                content = last_msg.get("content", "")
-            else:
-                content = str(last_msg)
-            termination_phrases = ["I gotta go", "Goodbye"]
-            return any(phrase.lower() in content.lower() for phrase in termination_phrases)
-        return False
-    
-    try:
-        logger.debug(f"Creating comedian agent: {name}")
-        logger.debug(f"LLM config for {name}: {llm_config}")
-        
-        agent = ConversableAgent(
-            name=name,
-            system_message=system_message,
-            llm_config=llm_config,
-            is_termination_msg=termination_predicate,
-            human_input_mode="NEVER"
-        )
-        
-        logger.debug(f"Successfully created {name}")
-        return agent
-    except Exception as e:
-        logger.error(f"Error creating comedian {name}: {str(e)}")
-        raise
-
-def make_critic(llm_config: dict) -> ConversableAgent:
-    """Create a critic agent with low temperature"""
-    system_message = """You are a comedy judge. Evaluate ONLY the last comedian line shown.
-Use this rubric (0-10 total):
-- Relevance to suggestion (0-2)
-- Setup to punch coherence (0-3)
-- Originality (0-3)
-- Punch impact (0-2)
-
-Output strictly JSON, no extra text:
-{"speaker":"<name>","score":<0-10>,"tags":["..."],"comments":"..."}
-"""
-    
-    # For newer Azure OpenAI models, temperature is not supported
-    # Just use the same config as comedians
-    critic_config = llm_config.copy()
-    
-    try:
-        logger.debug("Creating critic agent")
-        logger.debug(f"Critic config: {critic_config}")
-        
-        agent = ConversableAgent(
-            name="Critic",
-            system_message=system_message,
-            llm_config=critic_config,
-            human_input_mode="NEVER"
-        )
-        
-        logger.debug("Successfully created critic")
-        return agent
-    except Exception as e:
-        logger.error(f"Error creating critic: {str(e)}")
-        raise
+from autogen import ConversableAgent
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def make_comedian(name: str, llm_config: dict) -> ConversableAgent:
+    """Create a comedian agent"""
+    # The name goes last so both comedians' system messages share their prefix (prompt caching)
+    system_message = f"""You are a quick-witted, kind stand-up comedian.
+You are performing an improv scene based on the audience suggestion.
+Rules:
+- Keep each line to 2 sentences or less
+- Always tie your response to the original suggestion
+- Be playful but keep it safe and clean
+- When asked to wrap up, end with "I gotta go"
+Your name is {name}.
+"""
+    
+    def termination_predicate(messages):
+        if messages and isinstance(messages, list) and len(messages) > 0:
+            last_msg = messages[-1]
+            if isinstance(last_msg, dict):
+                content = last_msg.get("content", "")
+            else:
+                content = str(last_msg)
+            termination_phrases = ["I gotta go", "Goodbye"]
+            return any(phrase.lower() in content.lower() for phrase in termination_phrases)
+        return False
+    
+    try:
+        logger.debug("Creating comedian agent: %s", name)
+        logger.debug("LLM config for %s: %s", name, llm_config)
+        
+        agent = ConversableAgent(
+            name=name,
+            system_message=system_message,
+            llm_config=llm_config,
+            is_termination_msg=termination_predicate,
+            human_input_mode="NEVER"
+        )
+        
+        logger.debug("Successfully created %s", name)
+        return agent
+    except Exception as e:
+        logger.error("Error creating comedian %s: %s", name, e)
+        raise
+
+def make_critic(llm_config: dict) -> ConversableAgent:
+    """Create a critic agent with low temperature"""
+    system_message = """You are a comedy judge. Evaluate ONLY the last comedian line shown.
+Use this rubric (0-10 total):
+- Relevance to suggestion (0-2)
+- Setup to punch coherence (0-3)
+- Originality (0-3)
+- Punch impact (0-2)
+
+Output strictly JSON, no extra text:
+{"speaker":"<name>","score":<0-10>,"tags":["..."],"comments":"..."}
+
+If you are shown several numbered lines instead, evaluate each one on its own and
+output strictly {"evaluations":[<one such object per line, in the same order>]}.
+"""
+    
+    # For newer Azure OpenAI models, temperature is not supported
+    # Just use the same config as comedians
+    critic_config = llm_config.copy()
+    
+    try:
+        logger.debug("Creating critic agent")
+        logger.debug("Critic config: %s", critic_config)
+        
+        agent = ConversableAgent(
+            name="Critic",
+            system_message=system_message,
+            llm_config=critic_config,
+            human_input_mode="NEVER"
+        )
+        
+        logger.debug("Successfully created critic")
+        return agent
+    except Exception as e:
+        logger.error("Error creating critic: %s", e)
+        raise
+
+def config_key(llm_config: dict) -> str:
+    """Stable hash of an LLM config, independent of key order"""
+    canonical = json.dumps(llm_config, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class AgentPool:
+    """Thread-safe pool of idle agents reused across shows and sessions
+
+    Agents are keyed by role, persona name and a hash of the LLM config. An agent is
+    leased to one show at a time and reset on release, so concurrent shows never
+    share chat history. At most max_idle agents are kept; the least recently used
+    are evicted first.
+    """
+
+    def __init__(self, max_idle: int = 32):
+        self.max_idle = max_idle
+        self._idle: "OrderedDict[Tuple[str, str, str], List[ConversableAgent]]" = OrderedDict()
+        self._idle_count = 0
+        self._leased: Dict[int, Tuple[str, str, str]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, role: str, name: str, llm_config: dict) -> ConversableAgent:
+        """Lease an agent ("comedian" or "critic"), building one only if none is idle"""
+        key = (role, name, config_key(llm_config))
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                agent = idle.pop()
+                if not idle:
+                    del self._idle[key]
+                self._idle_count -= 1
+                self._leased[id(agent)] = key
+                self.reused += 1
+                return agent
+
+        # Build outside the lock; client setup is the slow part
+        if role == "critic":
+            agent = make_critic(llm_config)
+        else:
+            agent = make_comedian(name, llm_config)
+
+        with self._lock:
+            self._leased[id(agent)] = key
+            self.created += 1
+        return agent
+
+    def release(self, agent: ConversableAgent, reusable: bool = True):
+        """Return a leased agent; pass reusable=False to drop it (e.g. after a failed show)"""
+        with self._lock:
+            key = self._leased.pop(id(agent), None)
+        if key is None or not reusable:
+            return
+
+        # Clear any per-show conversation state before the next lease
+        agent.reset()
+
+        with self._lock:
+            self._idle.setdefault(key, []).append(agent)
+            self._idle.move_to_end(key)
+            self._idle_count += 1
+            while self._idle_count > self.max_idle:
+                oldest_key, agents = next(iter(self._idle.items()))
+                agents.pop(0)
+                if not agents:
+                    del self._idle[oldest_key]
+                self._idle_count -= 1
+
+    def clear(self):
+        """Drop all idle agents"""
+        with self._lock:
+            self._idle.clear()
+            self._idle_count = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Pool counters for diagnostics"""
+        with self._lock:
+            return {"idle": self._idle_count, "leased": len(self._leased),
+                    "created": self.created, "reused": self.reused}
+
+# Process-wide pool shared by every show (Streamlit keeps imported modules across reruns)
+default_agent_pool = AgentPool()
@@ -1,151 +1,282 @@
-import streamlit as st
-import os
-import traceback
-import time
-from config import build_llm_config
-from orchestration import run_improv_streaming
-from ui_components import display_transcript, display_scores, display_best_line, display_export
-from models import ShowState, LineEval
-
-# Streamlit UI
-st.set_page_config(page_title="Improv Duo", page_icon="🎭", layout="wide")
-
-# Initialize session state
-if "show_state" not in st.session_state:
-    st.session_state.show_state = None
-if "streaming_state" not in st.session_state:
-    st.session_state.streaming_state = None
-if "is_running" not in st.session_state:
-    st.session_state.is_running = False
-
-# Sidebar settings
-with st.sidebar:
-    st.header("Settings")
-    
-    st.subheader("Model Configuration")
-    model = st.text_input("Model", value=os.getenv("AZURE_OPENAI_MODEL", "gpt-4o-mini"))
-    api_key = st.text_input("API Key", value=os.getenv("AZURE_OPENAI_API_KEY", ""), type="password")
-    base_url = st.text_input("Base URL (optional)", value=os.getenv("AZURE_OPENAI_ENDPOINT", ""))
-    timeout = st.number_input("Timeout (seconds)", min_value=10, max_value=300, value=60)
-    seed = st.number_input("Seed", value=42)
-    
-    st.subheader("Show Settings")
-    rounds = st.slider("Rounds", 1, 8, 4)
-    starter = st.selectbox("Who starts?", ["Random", "Cathy", "Joe"])
-    
-    # Save to session state
-    st.session_state.model = model
-    st.session_state.api_key = api_key
-    st.session_state.base_url = base_url
-    st.session_state.timeout = timeout
-    st.session_state.seed = seed
-
-# Main app
-st.title("🎭 Improv Duo: Cathy & Joe (with a Critic)")
-
-# Input section
-col1, col2, col3 = st.columns([3, 1, 1])
-with col1:
-    suggestion = st.text_input("Audience suggestion", value="airport security")
-with col2:
-    run_button = st.button("Run Show", type="primary", use_container_width=True, disabled=st.session_state.is_running)
-with col3:
-    if st.button("Reset", use_container_width=True):
-        st.session_state.show_state = None
-        st.session_state.streaming_state = None
-        st.session_state.is_running = False
-        st.rerun()
-
-# Run show with streaming
-if run_button:
-    if not st.session_state.get("api_key"):
-        st.error("Please provide an API key in the sidebar.")
-    else:
-        st.session_state.is_running = True
-        
-        # Show current settings
-        st.info(f"🎭 Starting {rounds} round{'s' if rounds > 1 else ''} with {starter} going first")
-        
-        # Create containers for streaming output
-        transcript_container = st.container()
-        scores_container = st.container()
-        
-        # Initialize streaming state
-        st.session_state.streaming_state = ShowState(
-            suggestion=suggestion,
-            rounds=rounds,
-            order=[],
-            critic=None,
-            transcript=[],
-            evaluations=[],
-            wrapped=False
-        )
-        
-        try:
-            llm_config = build_llm_config()
-            
-            # Callbacks for streaming
-            def on_comedian_line(speaker: str, line: str, round_idx: int):
-                """Handle new comedian line"""
-                st.session_state.streaming_state.transcript.append({
-                    "speaker": speaker,
-                    "text": line
-                })
-                
-                # Check if this comedian had feedback from previous round
-                has_feedback = False
-                if round_idx > 0 and st.session_state.streaming_state.evaluations:
-                    # Look for this speaker's last evaluation
-                    for eval in reversed(st.session_state.streaming_state.evaluations):
-                        if eval.speaker.lower() == speaker.lower() and eval.round_idx < round_idx:
-                            has_feedback = True
-                            break
-                
-                # Update transcript display
-                with transcript_container:
-                    with st.chat_message(speaker):
-                        if has_feedback:
-                            st.caption("💭 *Considering critic feedback...*")
-                        st.write(f"**{speaker}:** {line}")
-                
-                # Small delay for visual effect
-                time.sleep(0.5)
-            
-            def on_critic_eval(eval: LineEval):
-                """Handle new critic evaluation"""
-                st.session_state.streaming_state.evaluations.append(eval)
-                
-                # Update scores display
-                with scores_container:
-                    st.write(f"🎯 **{eval.speaker.capitalize()}** scored {eval.score}/10 - {', '.join(eval.tags)}")
-            
-            # Run with streaming
-            with st.spinner("🎭 Show in progress..."):
-                st.session_state.show_state = run_improv_streaming(
-                    suggestion, rounds, starter, llm_config,
-                    on_comedian_line=on_comedian_line,
-                    on_critic_eval=on_critic_eval
-                )
-            
-            st.success("🎭 Show completed!")
-            st.session_state.is_running = False
-            
-        except Exception as e:
-            st.error(f"Error during show: {str(e)}")
-            st.session_state.is_running = False
-            
-            # Show detailed error information
-            with st.expander("Detailed Error Information"):
-                st.code(traceback.format_exc())
-
-# Display complete results after show
-if st.session_state.show_state and not st.session_state.is_running:
-    st.divider()
-    st.subheader("📊 Complete Show Analysis")
-    
-    state = st.session_state.show_state
-    
-    # Display all components
-    display_scores(state)
-    display_best_line(state)
-    display_export(state)
+import streamlit as st
+import os
+from checkpoint import ShowLog
+from config import Config, build_llm_config
+from log_setup import setup_logging
+from ui_components import (display_transcript, display_scores, display_best_line, display_export,
+                           display_performance, display_history)
+from models import ShowState
+
+# Heavy modules load on demand: orchestration (and autogen) when the first show runs,
+# pandas when results are displayed. Reruns of the settings sidebar only touch cached resources.
+
+@st.cache_resource(show_spinner=False)
+def load_config() -> Config:
+    """Environment settings and the background log writer, set up once per process"""
+    # LOG_LEVEL and IMPROV_LOG_* environment variables control verbosity
+    setup_logging(os.getenv("LOG_LEVEL"))
+    return Config()
+
+@st.cache_resource(show_spinner=False)
+def agent_pool():
+    """Agents (and their API clients) shared across reruns and sessions"""
+    from agents import AgentPool
+    return AgentPool()
+
+@st.cache_resource(show_spinner=False)
+def show_archive(path: str):
+    """Shared SQLite show archive (one connection per process)"""
+    from archive import ShowArchive
+    return ShowArchive(path)
+
+@st.cache_resource(show_spinner=False)
+def call_context(endpoints_path: str):
+    """Call settings shared by every session; routes across endpoints if a file is configured"""
+    from calls import CallContext
+    from router import load_router
+    return CallContext(router=load_router(endpoints_path) if endpoints_path else None)
+
+@st.cache_resource(show_spinner=False)
+def prescorer():
+    """Local first-tier critic (loads NumPy on first use)"""
+    from prescore import PreScorer
+    return PreScorer()
+
+env_config = load_config()
+
+# Streamlit UI
+st.set_page_config(page_title="Improv Duo", page_icon="🎭", layout="wide")
+
+# How often the live view polls the show worker, and how long a show keeps running
+# without a poll (the tab was closed or the session ended) before it is cancelled
+POLL_S = 0.5
+IDLE_TIMEOUT_S = 15.0
+
+# Initialize session state
+if "show_state" not in st.session_state:
+    st.session_state.show_state = None
+if "streaming_state" not in st.session_state:
+    st.session_state.streaming_state = None
+if "checkpoint_path" not in st.session_state:
+    st.session_state.checkpoint_path = None
+if "worker" not in st.session_state:
+    st.session_state.worker = None
+if "bubbles" not in st.session_state:
+    st.session_state.bubbles = []
+if "live_line" not in st.session_state:
+    st.session_state.live_line = None
+if "outcome" not in st.session_state:
+    st.session_state.outcome = None
+
+# Reflects the background worker, so it can never get stuck after an error
+st.session_state.is_running = st.session_state.worker is not None and st.session_state.worker.is_running
+
+# Sidebar settings
+with st.sidebar:
+    view = st.radio("View", ["Show", "History"], horizontal=True)
+
+    st.header("Settings")
+    
+    st.subheader("Model Configuration")
+    model = st.text_input("Model", value=env_config.model)
+    api_key = st.text_input("API Key", value=env_config.api_key, type="password")
+    base_url = st.text_input("Base URL (optional)", value=env_config.endpoint)
+    timeout = st.number_input("Timeout (seconds)", min_value=10, max_value=300, value=60)
+    seed = st.number_input("Seed", value=42)
+    
+    st.subheader("Show Settings")
+    scene_memory = st.checkbox("Scene memory", value=True,
+                               help="Let comedians see a token-budgeted summary of the whole scene")
+    rounds = st.slider("Rounds", 1, 16 if scene_memory else 8, 4)
+    starter = st.selectbox("Who starts?", ["Random", "Cathy", "Joe"])
+    pipeline_critic = st.checkbox("Pipeline critic", value=True,
+                                  help="Score each line in the background while the next comedian performs")
+    stream_tokens = st.checkbox("Stream tokens", value=True,
+                                help="Show comedian lines word by word as they are generated")
+    prescore = st.checkbox("Tiered critic", value=False,
+                           help="Score obvious misses (repeats, rambling) locally "
+                                "and only send the rest to the critic")
+    candidates = st.slider("Candidates per line", 1, 5, 1,
+                           help="Generate several lines in parallel and let the critic keep the best "
+                                "(lines then appear whole instead of streaming)")
+    
+    # Save to session state
+    st.session_state.model = model
+    st.session_state.api_key = api_key
+    st.session_state.base_url = base_url
+    st.session_state.timeout = timeout
+    st.session_state.seed = seed
+
+# Main app
+st.title("🎭 Improv Duo: Cathy & Joe (with a Critic)")
+
+@st.fragment(run_every=POLL_S)
+def keep_show_alive():
+    """Heartbeat for a show running while another view is open"""
+    if st.session_state.worker is not None:
+        st.session_state.worker.token.touch()
+
+if view == "History":
+    if st.session_state.is_running:
+        keep_show_alive()
+    display_history(show_archive(env_config.archive_path))
+    st.stop()
+
+# Input section
+col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+with col1:
+    suggestion = st.text_input("Audience suggestion", value="airport security")
+with col2:
+    run_button = st.button("Run Show", type="primary", use_container_width=True, disabled=st.session_state.is_running)
+with col3:
+    resume_button = st.button("Resume", use_container_width=True,
+                              disabled=st.session_state.is_running or not st.session_state.checkpoint_path,
+                              help="Continue the last failed or stopped show from its last completed line")
+with col4:
+    if st.session_state.is_running:
+        if st.button("Stop", use_container_width=True, help="Stop the show before its next model call"):
+            st.session_state.worker.cancel()
+            st.session_state.worker.join(timeout=5)
+            st.rerun()
+    elif st.button("Reset", use_container_width=True):
+        st.session_state.show_state = None
+        st.session_state.streaming_state = None
+        st.session_state.worker = None
+        st.session_state.bubbles = []
+        st.session_state.live_line = None
+        st.session_state.outcome = None
+        st.session_state.checkpoint_path = None
+        st.rerun()
+
+def apply_events(worker):
+    """Fold the worker's queued events into the live show state"""
+    live_state = st.session_state.streaming_state
+    for event in worker.drain():
+        if event[0] == "token":
+            _, speaker, token, round_idx = event
+            live = st.session_state.live_line
+            if live is None or live["key"] != (speaker, round_idx):
+                live = st.session_state.live_line = {"key": (speaker, round_idx), "text": ""}
+            live["text"] += token
+        elif event[0] == "line":
+            _, speaker, line, round_idx = event
+            live_state.add_line(speaker, line, round_idx)
+            # Did this comedian have feedback from an earlier round?
+            last = live_state.stats.last_feedback(speaker)
+            st.session_state.bubbles.append((speaker, line, last is not None and last.round_idx < round_idx))
+            st.session_state.live_line = None
+        else:
+            live_state.add_evaluation(event[1])
+
+def render_show():
+    """Transcript (with the line being generated) followed by the scores so far"""
+    for speaker, line, had_feedback in st.session_state.bubbles:
+        with st.chat_message(speaker):
+            if had_feedback:
+                st.caption("💭 *Considering critic feedback...*")
+            st.write(f"**{speaker}:** {line}")
+    live = st.session_state.live_line
+    if live:
+        speaker = live["key"][0]
+        with st.chat_message(speaker):
+            st.write(f"**{speaker}:** {live['text']}▌")
+    for eval in st.session_state.streaming_state.evaluations:
+        tier = " *(pre-scored)*" if eval.tier == "local" else ""
+        st.write(f"🎯 **{eval.speaker.capitalize()}** scored {eval.score}/10 - {', '.join(eval.tags)}{tier}")
+
+@st.fragment(run_every=POLL_S)
+def live_show():
+    """Re-rendered every POLL_S while the show runs; each poll is also the worker's heartbeat"""
+    worker = st.session_state.worker
+    apply_events(worker)
+    render_show()
+    if not worker.is_running:
+        # Rerun the whole page to show the results and re-enable the buttons
+        st.rerun()
+
+def finish_show(worker):
+    """Record how a finished worker ended (once)"""
+    apply_events(worker)
+    if worker.state is not None:
+        st.session_state.show_state = worker.state
+        # The archive now holds the finished show
+        ShowLog(st.session_state.checkpoint_path).discard()
+        st.session_state.checkpoint_path = None
+        st.session_state.outcome = ("success", None)
+    elif worker.cancelled:
+        st.session_state.outcome = ("cancelled", worker.token.reason)
+    else:
+        st.session_state.outcome = ("error", worker.error)
+    st.session_state.worker_traceback = worker.traceback
+
+# Start a show in the background
+if (run_button or resume_button) and not st.session_state.is_running:
+    if not st.session_state.get("api_key"):
+        st.error("Please provide an API key in the sidebar.")
+    else:
+        # Every show writes an event log; a resumed one replays it and carries on
+        checkpoint = ShowLog(st.session_state.checkpoint_path) if resume_button else ShowLog.new()
+        header = checkpoint.header()
+        if header:
+            suggestion, rounds, starter = header["suggestion"], header["rounds"], header["order"][0]
+
+        # Initialize streaming state
+        st.session_state.streaming_state = ShowState(suggestion=suggestion, rounds=rounds)
+        st.session_state.show_state = None
+        st.session_state.bubbles = []
+        st.session_state.live_line = None
+        st.session_state.outcome = None
+        st.session_state.checkpoint_path = checkpoint.path
+
+        from show_worker import ShowWorker
+        st.session_state.worker = ShowWorker(
+            suggestion, rounds, starter, build_llm_config(env_config),
+            stream_tokens=stream_tokens,
+            idle_timeout_s=IDLE_TIMEOUT_S,
+            pipeline_critic=pipeline_critic,
+            memory_budget=300 if scene_memory else None,
+            agent_pool=agent_pool(),
+            ctx=call_context(env_config.endpoints_path),
+            archive=show_archive(env_config.archive_path),
+            checkpoint=checkpoint,
+            candidates=candidates,
+            prescorer=prescorer() if prescore else None
+        ).start()
+        st.rerun()
+
+worker = st.session_state.worker
+if worker is not None:
+    live_state = st.session_state.streaming_state
+    if st.session_state.is_running:
+        st.info(f"🎭 {live_state.rounds} round{'s' if live_state.rounds > 1 else ''} of "
+                f"\"{live_state.suggestion}\" in progress...")
+        live_show()
+    else:
+        if st.session_state.outcome is None:
+            finish_show(worker)
+        render_show()
+        status, detail = st.session_state.outcome
+        if status == "success":
+            st.success("🎭 Show completed!")
+        elif status == "cancelled":
+            st.warning(f"Show stopped: {detail}")
+            st.info("Press **Resume** to continue from the last completed line.")
+        else:
+            st.error(f"Error during show: {detail}")
+            st.info("Press **Resume** to continue from the last completed line.")
+            # Show detailed error information
+            with st.expander("Detailed Error Information"):
+                st.code(st.session_state.worker_traceback)
+
+# Display complete results after show
+if st.session_state.show_state and not st.session_state.is_running:
+    st.divider()
+    st.subheader("📊 Complete Show Analysis")
+    
+    state = st.session_state.show_state
+    
+    # Display all components
+    display_scores(state)
+    display_best_line(state)
+    display_export(state)
+    display_performance(state)
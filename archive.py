@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from models import LineEval, ShowState
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shows (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    suggestion TEXT NOT NULL,
+    rounds INTEGER NOT NULL,
+    wrapped INTEGER NOT NULL DEFAULT 0,
+    lines INTEGER NOT NULL DEFAULT 0,
+    avg_score REAL,
+    best_score REAL
+);
+CREATE INDEX IF NOT EXISTS shows_suggestion ON shows (suggestion COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS shows_finished ON shows (finished_at);
+
+CREATE TABLE IF NOT EXISTS lines (
+    show_id INTEGER NOT NULL REFERENCES shows (id),
+    round INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    text TEXT NOT NULL,
+    score REAL,
+    tags TEXT,
+    comments TEXT,
+    PRIMARY KEY (show_id, round, speaker)
+);
+CREATE INDEX IF NOT EXISTS lines_score ON lines (score);
+CREATE INDEX IF NOT EXISTS lines_speaker_score ON lines (speaker, score);
+
+CREATE TABLE IF NOT EXISTS line_tags (
+    show_id INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (show_id, round, speaker, tag)
+);
+CREATE INDEX IF NOT EXISTS line_tags_tag ON line_tags (tag, show_id);
+"""
+
+# Word search over suggestions; skipped if this SQLite build lacks FTS5
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS shows_fts USING fts5(suggestion, content='shows', content_rowid='id')"
+
+LINE_ORDERS = {
+    "score": "l.score DESC, l.show_id DESC",
+    "recent": "l.show_id DESC, l.round DESC",
+}
+
+def _fts_query(text: str) -> str:
+    """Prefix-match every word, quoted so user input can't inject FTS syntax"""
+    words = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words)
+
+class ShowArchive:
+    """Append-only, indexed archive of shows in SQLite
+
+    Shows are written as they run: begin_show() when a show starts, add_line() and
+    add_evaluation() per event, finish_show() at the end, so a show is never held in
+    memory just to be saved. Only finished shows are returned by queries. Lines are
+    indexed by speaker and score, tags by tag, and suggestions by word (FTS5).
+    """
+
+    def __init__(self, path: str = ".archive/shows.sqlite"):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # WAL keeps readers (the history view) from blocking writers (running shows)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_line_tags()
+        try:
+            self._conn.execute(FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            logger.warning("SQLite has no FTS5; suggestion search falls back to LIKE")
+            self.full_text = False
+        self._conn.commit()
+
+    def _migrate_line_tags(self):
+        """Give line_tags tables from older archives their primary key, dropping duplicate rows"""
+        columns = self._conn.execute("PRAGMA table_info(line_tags)").fetchall()
+        if any(column["pk"] for column in columns):
+            return
+        logger.info("Adding a primary key to line_tags in %s", self.path)
+        self._conn.executescript(
+            "ALTER TABLE line_tags RENAME TO line_tags_old;"
+            "DROP INDEX IF EXISTS line_tags_tag;"
+            + SCHEMA[SCHEMA.index("CREATE TABLE IF NOT EXISTS line_tags"):]
+            + "INSERT OR IGNORE INTO line_tags SELECT show_id, round, speaker, tag FROM line_tags_old;"
+            "DROP TABLE line_tags_old;"
+        )
+
+    def _write(self, sql: str, params: tuple) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def begin_show(self, suggestion: str, rounds: int) -> int:
+        """Start a show record and return its id"""
+        with self._lock:
+            show_id = self._conn.execute(
+                "INSERT INTO shows (started_at, suggestion, rounds) VALUES (?, ?, ?)",
+                (time.time(), suggestion, rounds),
+            ).lastrowid
+            if self.full_text:
+                self._conn.execute("INSERT INTO shows_fts (rowid, suggestion) VALUES (?, ?)",
+                                   (show_id, suggestion))
+            self._conn.commit()
+        return show_id
+
+    def add_line(self, show_id: int, speaker: str, text: str, round_idx: int):
+        """Record a comedian line"""
+        self._write(
+            "INSERT INTO lines (show_id, round, speaker, text) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (show_id, round, speaker) DO UPDATE SET text = excluded.text",
+            (show_id, round_idx, speaker.lower(), text),
+        )
+
+    def add_evaluation(self, show_id: int, speaker: str, line_eval: LineEval):
+        """Attach a critic evaluation to the line it scores
+
+        speaker is the comedian who delivered the line; the critic's reported
+        speaker is not trusted for the join.
+        """
+        speaker = speaker.lower()
+        tags = [tag.lower() for tag in line_eval.tags]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO lines (show_id, round, speaker, text, score, tags, comments) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (show_id, round, speaker) DO UPDATE SET "
+                "score = excluded.score, tags = excluded.tags, comments = excluded.comments",
+                (show_id, line_eval.round_idx, speaker, line_eval.text, line_eval.score,
+                 json.dumps(line_eval.tags), line_eval.comments),
+            )
+            # A line evaluated again (e.g. after a resume) keeps only its latest tags
+            self._conn.execute("DELETE FROM line_tags WHERE show_id = ? AND round = ? AND speaker = ?",
+                               (show_id, line_eval.round_idx, speaker))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO line_tags (show_id, round, speaker, tag) VALUES (?, ?, ?, ?)",
+                [(show_id, line_eval.round_idx, speaker, tag) for tag in tags],
+            )
+            self._conn.commit()
+
+    def finish_show(self, show_id: int, wrapped: bool):
+        """Mark a show finished and store its summary columns"""
+        self._write(
+            "UPDATE shows SET finished_at = ?, wrapped = ?, "
+            "lines = (SELECT COUNT(*) FROM lines WHERE show_id = ?), "
+            "avg_score = (SELECT AVG(score) FROM lines WHERE show_id = ?), "
+            "best_score = (SELECT MAX(score) FROM lines WHERE show_id = ?) WHERE id = ?",
+            (time.time(), int(wrapped), show_id, show_id, show_id, show_id),
+        )
+
+    def archive_show(self, state: ShowState) -> int:
+        """Archive an already finished show in one go"""
+        show_id = self.begin_show(state.suggestion, state.rounds)
+        for line in state.transcript:
+            self.add_line(show_id, line.speaker, line.text, line.round_idx)
+        for line_eval in state.evaluations:
+            match = next((line.speaker for line in state.transcript
+                          if line.text == line_eval.text and line.round_idx == line_eval.round_idx),
+                         line_eval.speaker)
+            self.add_evaluation(show_id, match, line_eval)
+        self.finish_show(show_id, state.wrapped)
+        return show_id
+
+    def _suggestion_filter(self, suggestion: str, clauses: List[str], params: list):
+        if self.full_text and _fts_query(suggestion):
+            clauses.append("s.id IN (SELECT rowid FROM shows_fts WHERE shows_fts MATCH ?)")
+            params.append(_fts_query(suggestion))
+        else:
+            clauses.append("s.suggestion LIKE ?")
+            params.append(f"%{suggestion}%")
+
+    def search_lines(self, suggestion: Optional[str] = None, speaker: Optional[str] = None,
+                     tag: Optional[str] = None, min_score: Optional[float] = None,
+                     last_shows: Optional[int] = None, order_by: str = "score",
+                     limit: int = 50, offset: int = 0) -> List[Dict]:
+        """One page of scored lines from finished shows
+
+        E.g. the best lines for suggestions containing "airport" across the last
+        10k shows: search_lines(suggestion="airport", last_shows=10000).
+        """
+        if order_by not in LINE_ORDERS:
+            raise ValueError(f"order_by must be one of {tuple(LINE_ORDERS)}, got {order_by!r}")
+        clauses = ["s.finished_at IS NOT NULL", "l.score IS NOT NULL"]
+        params: list = []
+        if suggestion:
+            self._suggestion_filter(suggestion, clauses, params)
+        if speaker:
+            clauses.append("l.speaker = ?")
+            params.append(speaker.lower())
+        if tag:
+            clauses.append("(l.show_id, l.round, l.speaker) IN "
+                           "(SELECT show_id, round, speaker FROM line_tags WHERE tag = ?)")
+            params.append(tag.lower())
+        if min_score is not None:
+            clauses.append("l.score >= ?")
+            params.append(min_score)
+        if last_shows:
+            clauses.append("s.id IN (SELECT id FROM shows WHERE finished_at IS NOT NULL "
+                           "ORDER BY id DESC LIMIT ?)")
+            params.append(last_shows)
+
+        sql = (
+            "SELECT l.show_id, s.suggestion, l.round, l.speaker, l.text, l.score, l.tags, l.comments "
+            "FROM lines l JOIN shows s ON s.id = l.show_id "
+            f"WHERE {' AND '.join(clauses)} ORDER BY {LINE_ORDERS[order_by]} LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+        return [
+            {**dict(row), "round": row["round"] + 1, "tags": json.loads(row["tags"] or "[]")}
+            for row in rows
+        ]
+
+    def recent_shows(self, suggestion: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """One page of finished show summaries, newest first"""
+        clauses = ["s.finished_at IS NOT NULL"]
+        params: list = []
+        if suggestion:
+            self._suggestion_filter(suggestion, clauses, params)
+        sql = (
+            "SELECT s.id, s.suggestion, s.rounds, s.wrapped, s.lines, s.avg_score, s.best_score, s.finished_at "
+            f"FROM shows s WHERE {' AND '.join(clauses)} ORDER BY s.id DESC LIMIT ? OFFSET ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+        return [{**dict(row), "wrapped": bool(row["wrapped"])} for row in rows]
+
+    def load_show(self, show_id: int) -> Optional[Dict]:
+        """A finished show in the export format, or None"""
+        with self._lock:
+            show = self._conn.execute("SELECT * FROM shows WHERE id = ?", (show_id,)).fetchone()
+            if show is None:
+                return None
+            lines = self._conn.execute(
+                "SELECT round, speaker, text, score, tags, comments FROM lines WHERE show_id = ? "
+                "ORDER BY round, rowid", (show_id,)
+            ).fetchall()
+        return {
+            "id": show["id"],
+            "suggestion": show["suggestion"],
+            "rounds": show["rounds"],
+            "wrapped": bool(show["wrapped"]),
+            "transcript": [{"speaker": line["speaker"].capitalize(), "text": line["text"]} for line in lines],
+            "evaluations": [
+                {"speaker": line["speaker"], "text": line["text"], "score": line["score"],
+                 "tags": json.loads(line["tags"] or "[]"), "comments": line["comments"], "round": line["round"] + 1}
+                for line in lines if line["score"] is not None
+            ],
+            "avg_score": show["avg_score"],
+        }
+
+    def count_shows(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM shows WHERE finished_at IS NOT NULL").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,322 @@
+"""Headless bulk show runner.
+
+Reads suggestions (one per line) from a file or stdin, runs shows concurrently on a
+bounded worker pool sharing one rate limiter, and appends each finished show to a
+JSONL file in the same shape as the Streamlit export.
+
+    python batch_runner.py suggestions.txt -o shows.jsonl --workers 8 --rpm 300 --tpm 150000
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import hashlib
+import argparse
+from collections import Counter
+from typing import List, Optional, TextIO, Tuple
+
+from archive import ShowArchive
+from cache import ResponseCache
+from calls import CallContext
+from checkpoint import ShowLog
+from config import Config, make_llm_config
+from log_setup import parse_levels, setup_logging
+from metrics import registry, start_metrics_server
+from candidates import CANDIDATE_SELECTORS
+from orchestration import run_improv_async, CRITIC_BATCH_MODES
+from prescore import PreScorer
+from ratelimit import RateLimiter
+from serialize import dumps_text, loads
+from retry import RetryPolicy
+from router import EndpointRouter, load_router
+from utils import show_export
+
+logger = logging.getLogger(__name__)
+
+def read_suggestions(stream: TextIO) -> List[str]:
+    """Read one suggestion per line, skipping blanks and # comments"""
+    suggestions = []
+    for raw in stream:
+        line = raw.strip()
+        if line and not line.startswith("#"):
+            suggestions.append(line)
+    return suggestions
+
+def completed_suggestions(output_path: str) -> Counter:
+    """Count shows already present in an output file (for resume)"""
+    done = Counter()
+    try:
+        with open(output_path, encoding="utf-8") as f:
+            for raw in f:
+                try:
+                    done[loads(raw)["suggestion"]] += 1
+                except (ValueError, KeyError, TypeError):
+                    # A truncated last line from an interrupted run is simply redone
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+def _ends_with_newline(path: str) -> bool:
+    """True if the file is empty or its last byte is a newline"""
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+def checkpoint_log(checkpoint_dir: str, suggestion: str, rounds: int, starter: str, occurrence: int) -> ShowLog:
+    """Event log of the occurrence-th show (counted over the whole input) for a suggestion and settings"""
+    key = f"{suggestion}\0{rounds}\0{starter}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return ShowLog(os.path.join(checkpoint_dir, f"{digest}-{occurrence}.jsonl"))
+
+def remaining_suggestions(suggestions: List[str], done: Counter, checkpoint_dir: Optional[str] = None,
+                          rounds: int = 4, starter: str = "Random") -> List[Tuple[str, int]]:
+    """(suggestion, occurrence) pairs still to run, occurrences numbered over the whole input
+
+    The output holds as many shows of a suggestion as done counts, but not which
+    occurrences they were. With checkpoint_dir, occurrences with an unfinished log
+    are the ones run again, so their shows resume. A finished show's log is deleted
+    once it is written; one left behind by a crash just before that is deleted here.
+    """
+    pending = set()
+    for suggestion, count in Counter(suggestions).items():
+        numbers = list(range(1, count + 1))
+        if checkpoint_dir:
+            logs = {n: checkpoint_log(checkpoint_dir, suggestion, rounds, starter, n) for n in numbers}
+            # Most likely finished first: an ended log, then no log (done or never started), then unfinished
+            rank = {n: 1 if not logs[n].exists else (0 if logs[n].finished() else 2) for n in numbers}
+            numbers = sorted(numbers, key=lambda n: rank[n])
+        finished = min(count, done[suggestion])
+        pending.update((suggestion, n) for n in numbers[finished:])
+        if checkpoint_dir:
+            for n in numbers[:finished]:
+                if rank[n] == 0:
+                    logs[n].discard()
+
+    seen = Counter()
+    todo = []
+    for suggestion in suggestions:
+        seen[suggestion] += 1
+        if (suggestion, seen[suggestion]) in pending:
+            todo.append((suggestion, seen[suggestion]))
+    return todo
+
+async def run_batch(shows: List[Tuple[str, int]], output: TextIO, llm_config: dict, rounds: int = 4,
+                    starter: str = "Random", workers: int = 4, critic_batch: str = "show",
+                    limiter: RateLimiter = None, cache: ResponseCache = None,
+                    archive: ShowArchive = None, checkpoint_dir: str = None,
+                    retry: RetryPolicy = None, router: EndpointRouter = None,
+                    candidates: int = 1, candidate_selector: str = "critic",
+                    candidate_budget_s: float = None, prescorer: PreScorer = None) -> dict:
+    """Run shows on a bounded pool of workers, writing each result as soon as it finishes
+
+    shows are (suggestion, occurrence) pairs as returned by remaining_suggestions.
+    With checkpoint_dir, each show keeps an event log there, so re-running the same
+    input with the same rounds and starter resumes interrupted shows from their last
+    completed line.
+    """
+    queue = asyncio.Queue()
+    for show in shows:
+        queue.put_nowait(show)
+
+    ctx = CallContext(limiter=limiter, cache=cache, retry=retry, router=router)
+    stats = {"shows": 0, "failed": 0, "lines": 0}
+
+    async def worker():
+        while True:
+            try:
+                suggestion, occurrence = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            checkpoint = None
+            if checkpoint_dir:
+                checkpoint = checkpoint_log(checkpoint_dir, suggestion, rounds, starter, occurrence)
+                if not checkpoint.matches(suggestion, rounds):
+                    logger.warning("Discarding %s: it is for a different show", checkpoint.path)
+                    checkpoint.discard()
+            try:
+                state = await run_improv_async(suggestion, rounds, starter, llm_config,
+                                               critic_batch=critic_batch, ctx=ctx, archive=archive,
+                                               checkpoint=checkpoint, candidates=candidates,
+                                               candidate_selector=candidate_selector,
+                                               candidate_budget_s=candidate_budget_s,
+                                               prescorer=prescorer)
+            except Exception as e:
+                logger.error("Show failed for suggestion %r: %s", suggestion, e)
+                stats["failed"] += 1
+                continue
+
+            # Writes happen on the event loop thread, so lines never interleave
+            output.write(dumps_text(show_export(state)) + "\n")
+            output.flush()
+            if checkpoint:
+                checkpoint.discard()
+            stats["shows"] += 1
+            stats["lines"] += len(state.transcript)
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    stats["elapsed_s"] = time.monotonic() - started
+    return stats
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run many improv shows headlessly to JSONL")
+    parser.add_argument("input", nargs="?", default="-", help="Suggestions file, one per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to append finished shows to")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent shows")
+    parser.add_argument("--rpm", type=float, default=None, help="Global requests-per-minute limit")
+    parser.add_argument("--tpm", type=float, default=None, help="Global tokens-per-minute limit")
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--starter", choices=["Random", "Cathy", "Joe"], default="Random")
+    parser.add_argument("--critic-batch", choices=CRITIC_BATCH_MODES, default="show",
+                        help="Lines per critic call (default: whole show)")
+    parser.add_argument("--candidates", type=int, default=1,
+                        help="Generate this many lines per comedian turn in parallel and keep the best")
+    parser.add_argument("--candidate-selector", choices=CANDIDATE_SELECTORS, default="critic",
+                        help="How the best candidate is picked (default: one short critic call)")
+    parser.add_argument("--candidate-budget", type=float, default=None,
+                        help="Seconds per turn; candidates arriving later are dropped")
+    parser.add_argument("--prescore", action="store_true",
+                        help="Score clear rule-breakers (repeats, rambling) locally "
+                             "and send only the rest to the critic")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache", default=None, help="SQLite response cache path (disabled if omitted)")
+    parser.add_argument("--cache-agents", default=None,
+                        help="Comma-separated agent names to cache, e.g. 'Critic' (default: all)")
+    parser.add_argument("--cache-max-mb", type=float, default=256)
+    parser.add_argument("--replay-only", action="store_true",
+                        help="Serve every call from the cache and fail shows on a miss")
+    parser.add_argument("--endpoints", default=None,
+                        help="JSON file of endpoints to route calls across (see router.py)")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per call on transient errors")
+    parser.add_argument("--call-deadline", type=float, default=None, help="Seconds allowed per call attempt")
+    parser.add_argument("--retry-budget", type=int, default=8, help="Retries and hedges allowed per show")
+    parser.add_argument("--hedge-quantile", type=float, default=None,
+                        help="Send a duplicate request for calls slower than this latency quantile (e.g. 0.95)")
+    parser.add_argument("--archive", default=None,
+                        help="Also write shows to this SQLite show archive (see archive.py)")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="Keep per-show event logs here so interrupted shows resume mid-show")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port while running")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--log-component", action="append", default=[], metavar="NAME=LEVEL",
+                        help="Per-component log level, e.g. orchestration=DEBUG (repeatable)")
+    parser.add_argument("--log-body-sample", type=float, default=None,
+                        help="Fraction of prompt/response bodies written at DEBUG (default 1.0)")
+    parser.add_argument("--log-file", default=None, help="Also write logs to this file")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level, parse_levels(",".join(args.log_component)),
+                  body_sample_rate=args.log_body_sample, log_file=args.log_file)
+
+    env_config = Config()
+    llm_config = make_llm_config(
+        model=args.model or env_config.model,
+        api_key=env_config.api_key,
+        base_url=args.base_url if args.base_url is not None else env_config.endpoint,
+        api_version=env_config.api_version,
+        timeout=args.timeout,
+        seed=args.seed,
+    )
+
+    if args.input == "-":
+        suggestions = read_suggestions(sys.stdin)
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            suggestions = read_suggestions(f)
+
+    todo = remaining_suggestions(suggestions, completed_suggestions(args.output), args.checkpoint_dir,
+                                 args.rounds, args.starter)
+    skipped = len(suggestions) - len(todo)
+    print(f"{len(suggestions)} suggestions, {skipped} already done, {len(todo)} to run", file=sys.stderr)
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    cache = None
+    if args.cache:
+        cache = ResponseCache(
+            args.cache,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024),
+            enabled_for=args.cache_agents.split(",") if args.cache_agents else None,
+            replay_only=args.replay_only,
+        )
+    elif args.replay_only:
+        parser.error("--replay-only requires --cache")
+    archive = ShowArchive(args.archive) if args.archive else None
+    router = load_router(args.endpoints) if args.endpoints else None
+    retry = RetryPolicy(max_attempts=args.max_attempts, deadline_s=args.call_deadline,
+                        show_budget=args.retry_budget, hedge_quantile=args.hedge_quantile)
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        # Start on a fresh line if an interrupted run left a partial record behind
+        if not _ends_with_newline(args.output):
+            output.write("\n")
+        stats = asyncio.run(run_batch(todo, output, llm_config, rounds=args.rounds, starter=args.starter,
+                                      workers=args.workers, critic_batch=args.critic_batch,
+                                      limiter=limiter, cache=cache, archive=archive,
+                                      checkpoint_dir=args.checkpoint_dir, retry=retry, router=router,
+                                      candidates=args.candidates, candidate_selector=args.candidate_selector,
+                                      candidate_budget_s=args.candidate_budget,
+                                      prescorer=PreScorer() if args.prescore else None))
+
+    elapsed = max(stats["elapsed_s"], 1e-9)
+    print(
+        f"Finished {stats['shows']} shows ({stats['failed']} failed) in {elapsed:.1f}s: "
+        f"{stats['shows'] / elapsed * 60:.1f} shows/min, {stats['lines'] / elapsed:.2f} lines/s",
+        file=sys.stderr,
+    )
+    snapshot = registry.snapshot()
+    for kind, quantiles in sorted(snapshot["latency_s"].items()):
+        print(f"{kind} latency: p50 {quantiles['p50']:.2f}s, p95 {quantiles['p95']:.2f}s, "
+              f"p99 {quantiles['p99']:.2f}s", file=sys.stderr)
+    print(f"Tokens per show: {snapshot['tokens_per_show']:.0f}, "
+          f"estimated cost: ${sum(snapshot['cost_by_model'].values()):.4f}", file=sys.stderr)
+    tokens = snapshot["tokens"]
+    print(f"Prompt tokens: {tokens.get('prompt', 0)}, {tokens.get('cached', 0)} served from the provider's "
+          f"prompt cache ({snapshot['cached_prompt_share']:.0%})", file=sys.stderr)
+    counters = snapshot["counters"]
+    print(f"Retries: {counters.get('retries', 0)}, hedged calls: {counters.get('hedged', 0)} "
+          f"({counters.get('hedge_won', 0)} won), retry budget exhausted: "
+          f"{counters.get('retry_budget_exhausted', 0)}", file=sys.stderr)
+    if args.candidates > 1:
+        print(f"Candidates: {counters.get('candidates_generated', 0)} kept, "
+              f"{counters.get('candidates_dropped', 0)} dropped past the turn budget, "
+              f"{counters.get('candidate_selector_fallback', 0)} heuristic fallbacks", file=sys.stderr)
+    if args.prescore:
+        local = counters.get("critic_local", 0)
+        scored = local + counters.get("critic_escalated", 0)
+        print(f"Pre-scorer: {local} of {scored} lines scored locally "
+              f"({local / scored if scored else 0:.0%} fewer critic evaluations)", file=sys.stderr)
+    if router:
+        for role, endpoints in router.stats().items():
+            for endpoint in endpoints:
+                latency = endpoint["latency_ewma_s"]
+                print(f"{role} endpoint {endpoint['endpoint']}: {endpoint['calls']} calls, "
+                      f"{endpoint['errors']} errors, latency {latency or 0:.2f}s"
+                      f"{' (cooling down)' if endpoint['cooling_down'] else ''}", file=sys.stderr)
+    parse = snapshot["critic_parse"]
+    print(f"Critic parse failures: {parse['parse_failure_rate']:.1%}, "
+          f"repaired: {parse['repair_success_rate']:.1%}, wasted calls: {parse['wasted_call_rate']:.1%}",
+          file=sys.stderr)
+    if cache:
+        cache_stats = cache.stats()
+        print(f"Cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+              f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries", file=sys.stderr)
+        cache.close()
+    if archive:
+        print(f"Archive: {archive.count_shows()} finished shows in {args.archive}", file=sys.stderr)
+        archive.close()
+    return 0 if stats["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
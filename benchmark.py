@@ -0,0 +1,210 @@
+"""Offline benchmark suite for the show orchestration.
+
+Starts a local fake OpenAI-compatible server (fake_openai_server.py) for each
+scenario and runs real shows against it through run_improv_async, so orchestration
+overhead and concurrency behaviour can be measured without API spend. Results are
+written as JSON and can be compared against a previous run to catch regressions.
+
+    python benchmark.py -o bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.2
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from dataclasses import dataclass, field, fields, asdict
+from typing import Dict, List, Optional
+
+from calls import CallContext
+from config import make_llm_config
+from log_setup import setup_logging
+from fake_openai_server import FakeOpenAIServer, FakeServerConfig
+from metrics import percentiles
+from orchestration import run_improv_async
+from retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Scenario:
+    """One benchmark workload"""
+    name: str
+    shows: int
+    concurrency: int
+    rounds: int = 4
+    server: FakeServerConfig = field(default_factory=FakeServerConfig)
+    show_options: Dict = field(default_factory=dict)
+    retry: Optional[RetryPolicy] = None
+    expect_min: Dict[str, float] = field(default_factory=dict)  # result keys that must reach these values
+
+SCENARIOS = [
+    Scenario("single_show", shows=5, concurrency=1,
+             server=FakeServerConfig(latency_ms=150, latency_sigma=0.0, seed=1)),
+    Scenario("pipelined_show", shows=5, concurrency=1,
+             server=FakeServerConfig(latency_ms=150, latency_sigma=0.0, seed=1),
+             show_options={"pipeline_critic": True}),
+    Scenario("concurrent_shows", shows=64, concurrency=32,
+             server=FakeServerConfig(latency_ms=150, latency_sigma=0.3, seed=2)),
+    Scenario("long_show", shows=2, concurrency=1, rounds=16,
+             server=FakeServerConfig(latency_ms=50, latency_sigma=0.0, seed=3),
+             show_options={"memory_budget": 300}),
+    Scenario("parse_failure_storm", shows=16, concurrency=8,
+             server=FakeServerConfig(latency_ms=100, latency_sigma=0.2, critic_parse_failure_rate=0.5, seed=4)),
+    Scenario("flaky_endpoint", shows=16, concurrency=8,
+             server=FakeServerConfig(latency_ms=100, latency_sigma=0.2, error_rate=0.05, error_status=503, seed=5),
+             retry=RetryPolicy(base_delay_s=0.05), expect_min={"retries": 1}),
+    Scenario("hedged_tail", shows=16, concurrency=4,
+             server=FakeServerConfig(latency_ms=100, latency_sigma=0.9, seed=6),
+             retry=RetryPolicy(hedge_quantile=0.9, hedge_min_samples=10)),
+    Scenario("best_of_3", shows=5, concurrency=1,
+             server=FakeServerConfig(latency_ms=150, latency_sigma=0.3, seed=7),
+             show_options={"candidates": 3, "candidate_budget_s": 0.4}),
+    # This app's prompts are far below the 1024-token minimum real providers cache,
+    # so the fake cache is scaled down to show how much of each prompt is a shared prefix
+    Scenario("prompt_cache", shows=5, concurrency=1,
+             server=FakeServerConfig(latency_ms=50, latency_sigma=0.0, seed=8,
+                                     prompt_cache_min_tokens=64, prompt_cache_block_tokens=16)),
+]
+
+async def run_scenario(scenario: Scenario, scale: float = 1.0) -> dict:
+    """Run one scenario against a fresh fake server and summarize it"""
+    shows = max(1, int(scenario.shows * scale))
+    with FakeOpenAIServer(scenario.server) as server:
+        llm_config = make_llm_config(model="fake-model", api_key="sk-fake", base_url=server.base_url,
+                                     timeout=30, seed=42)
+        ctx = CallContext(retry=scenario.retry) if scenario.retry else None
+        semaphore = asyncio.Semaphore(scenario.concurrency)
+        durations: List[float] = []
+        overheads: List[float] = []
+        counters: Dict[str, int] = {}
+        calls = 0
+        retries = 0
+        tokens = 0
+        prompt_tokens = 0
+        cached_tokens = 0
+        failed = 0
+
+        async def one_show(i: int):
+            nonlocal calls, retries, tokens, prompt_tokens, cached_tokens, failed
+            async with semaphore:
+                try:
+                    state = await run_improv_async(f"benchmark suggestion {i}", scenario.rounds, "Cathy",
+                                                   llm_config, ctx=ctx, **scenario.show_options)
+                except Exception as e:
+                    logger.error("Benchmark show failed: %s", e)
+                    failed += 1
+                    return
+            snapshot = state.metrics.snapshot()
+            durations.append(snapshot["duration_s"])
+            # Time not spent waiting on the model (only meaningful when calls run sequentially)
+            overheads.append(snapshot["duration_s"] - sum(c.latency_s for c in state.metrics.calls))
+            calls += snapshot["calls"]
+            retries += snapshot["retries"]
+            tokens += snapshot["prompt_tokens"] + snapshot["completion_tokens"]
+            prompt_tokens += snapshot["prompt_tokens"]
+            cached_tokens += snapshot["cached_tokens"]
+            for name, value in snapshot["counters"].items():
+                counters[name] = counters.get(name, 0) + value
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_show(i) for i in range(shows)))
+        wall = time.perf_counter() - started
+
+    return {
+        "shows": shows,
+        "failed": failed,
+        "concurrency": scenario.concurrency,
+        "rounds": scenario.rounds,
+        "server": {k: v for k, v in asdict(scenario.server).items() if k != "comedian_lines"},
+        "options": scenario.show_options,
+        "retry": ({f.name: getattr(scenario.retry, f.name) for f in fields(scenario.retry) if f.init}
+                  if scenario.retry else None),
+        "wall_s": wall,
+        "throughput_shows_per_min": (shows - failed) / wall * 60 if wall else 0.0,
+        "show_duration_s": percentiles(durations),
+        "overhead_s": percentiles(overheads),
+        "calls": calls,
+        "retries": retries,
+        "tokens": tokens,
+        "cached_prompt_share": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        "counters": counters,
+    }
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def check(results: dict) -> List[str]:
+    """List scenarios whose results miss their expect_min values"""
+    failures = []
+    for scenario in SCENARIOS:
+        current = results["scenarios"].get(scenario.name)
+        for key, minimum in scenario.expect_min.items() if current else ():
+            if current[key] < minimum:
+                failures.append(f"{scenario.name}: {key} {current[key]} < {minimum}")
+    return failures
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """List regressions beyond tolerance (throughput down or p95 show time up)"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        old_tp, new_tp = previous["throughput_shows_per_min"], current["throughput_shows_per_min"]
+        if old_tp and new_tp < old_tp * (1 - tolerance):
+            regressions.append(f"{name}: throughput {new_tp:.1f} < {old_tp:.1f} shows/min")
+        old_p95, new_p95 = previous["show_duration_s"]["p95"], current["show_duration_s"]["p95"]
+        if old_p95 and new_p95 > old_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 show time {new_p95:.2f}s > {old_p95:.2f}s")
+    return regressions
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the orchestration against a fake LLM server")
+    parser.add_argument("-o", "--output", default=None, help="Write JSON results here (default: stdout)")
+    parser.add_argument("--only", action="append", default=None, help="Run only these scenarios")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the number of shows per scenario")
+    parser.add_argument("--baseline", default=None, help="Previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+
+    # Keep per-call debug logging out of the measurements
+    setup_logging("WARNING")
+
+    selected = [s for s in SCENARIOS if not args.only or s.name in args.only]
+    results = {
+        "meta": {"git": _git_revision(), "python": platform.python_version(),
+                 "platform": platform.platform(), "timestamp": time.time()},
+        "scenarios": {},
+    }
+    for scenario in selected:
+        print(f"Running {scenario.name}...", file=sys.stderr)
+        results["scenarios"][scenario.name] = asyncio.run(run_scenario(scenario, args.scale))
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failures = check(results)
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        failures += regressions
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Iterable, List, Dict
+
+logger = logging.getLogger(__name__)
+
+# Top-level llm_config keys that change what the model returns
+RELEVANT_PARAMS = ("seed", "temperature", "top_p", "max_tokens", "stop")
+
+def _schema_of(response_format):
+    """JSON-serializable form of a response_format (dict or pydantic model class)"""
+    if hasattr(response_format, "model_json_schema"):
+        return response_format.model_json_schema()
+    return response_format
+
+class CacheMiss(Exception):
+    """Raised in replay-only mode when a request has no cached response"""
+
+class ResponseCache:
+    """Content-addressed LLM response cache backed by SQLite with LRU eviction
+
+    Keys hash the system message, prompt messages, model(s), seed and other
+    output-relevant parameters. For routed calls the models are those of the
+    endpoint pool serving the call, so endpoints in one pool (meant to be
+    interchangeable deployments) share entries, while pools differ.
+
+    enabled_for restricts caching to some agent names (e.g. {"Critic"}); None
+    caches every agent. With replay_only=True a miss raises CacheMiss instead of
+    calling the API, so regression runs are free and deterministic.
+
+    Hits only note their access time in memory; the LRU order is written back in
+    the same transaction as the next put(), or on close(), so a hit costs one SELECT.
+    """
+
+    def __init__(self, path: str = ".cache/responses.sqlite", max_bytes: int = 256 * 1024 * 1024,
+                 enabled_for: Optional[Iterable[str]] = None, replay_only: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled_for = {name.lower() for name in enabled_for} if enabled_for is not None else None
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._touched: Dict[str, float] = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def enabled(self, agent_name: str) -> bool:
+        """Whether responses for this agent are cached"""
+        return self.enabled_for is None or agent_name.lower() in self.enabled_for
+
+    @staticmethod
+    def make_key(system_message: str, messages: List[Dict[str, str]], llm_config: Optional[dict]) -> str:
+        """Hash everything that determines the response"""
+        llm_config = llm_config or {}
+        request = {
+            "system": system_message,
+            "messages": messages,
+            "models": [entry.get("model") for entry in llm_config.get("config_list", [])],
+            "params": {k: llm_config[k] for k in RELEVANT_PARAMS if k in llm_config},
+            # Schema classes (structured output) hash by their JSON schema, not their repr
+            "schema": _schema_of(llm_config.get("response_format")),
+        }
+        canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a response, counting the hit or miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._touched[key] = time.time()
+
+        if row is None and self.replay_only:
+            raise CacheMiss(f"No cached response for request {key[:12]}")
+        return row[0] if row else None
+
+    def put(self, key: str, response: str):
+        """Store a response and evict least recently used entries beyond max_bytes"""
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            # Pending hits first, so eviction sees recently read entries as recent
+            self._flush_touched()
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+
+            while self._total_bytes > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_access LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (oldest[0],))
+                self._total_bytes -= oldest[1]
+                logger.debug("Evicted cached response %s", oldest[0][:12])
+            self._conn.commit()
+
+    def _flush_touched(self):
+        """Write batched hit times to the table (caller holds the lock and commits)"""
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and store size"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "entries": entries, "bytes": self._total_bytes}
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
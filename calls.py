@@ -0,0 +1,310 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, List, Dict, Callable, Awaitable, Any, Tuple
+from cache import ResponseCache
+from metrics import CallRecord, ShowMetrics
+from ratelimit import RateLimiter
+from retry import RetryBudget, RetryPolicy, default_retry_policy, is_retryable
+
+if TYPE_CHECKING:
+    from autogen import ConversableAgent
+    from router import EndpointRouter
+
+logger = logging.getLogger(__name__)
+
+# Blocking client calls run here rather than in the loop's default executor, which is
+# sized for CPU work (min(32, cpus + 4)); slow, retried and hedged calls would starve it
+_call_executor = ThreadPoolExecutor(max_workers=int(os.getenv("IMPROV_CALL_THREADS", "64")),
+                                    thread_name_prefix="agent-call")
+
+async def _to_thread(func: Callable, *args) -> Any:
+    """asyncio.to_thread on the agent-call executor (context variables are copied too)"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_call_executor, context.run, func, *args)
+
+class ShowCancelled(Exception):
+    """Raised instead of making another call once a show's CancelToken is cancelled"""
+
+class CancelToken:
+    """Cooperative cancellation for one show, safe to cancel from any thread
+
+    Checked before every agent call and between turns, so no new call starts once it
+    is cancelled. With idle_timeout_s the token also counts as cancelled when touch()
+    (a viewer heartbeat) hasn't been called for that long, e.g. after a browser tab closed.
+    """
+
+    def __init__(self, idle_timeout_s: Optional[float] = None):
+        self.idle_timeout_s = idle_timeout_s
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._last_touch = time.monotonic()
+
+    def cancel(self, reason: str = "Cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def touch(self):
+        self._last_touch = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.idle_timeout_s is not None:
+            if time.monotonic() - self._last_touch > self.idle_timeout_s:
+                self.cancel(f"No viewer for {self.idle_timeout_s:g}s")
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise ShowCancelled(self.reason)
+
+@dataclass
+class CallContext:
+    """Execution settings shared by every agent call in a show"""
+    limiter: Optional[RateLimiter] = None
+    cache: Optional[ResponseCache] = None
+    metrics: Optional[ShowMetrics] = None
+    retry: Optional[RetryPolicy] = None
+    retry_budget: Optional[RetryBudget] = None
+    router: Optional["EndpointRouter"] = None
+    cancel: Optional[CancelToken] = None
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used for rate limiting"""
+    return len(text) // 4 + 1
+
+class _TokenRelay:
+    """IOStream that forwards streamed completion chunks to an asyncio queue
+
+    ag2 writes each streamed chunk to the default IOStream from a worker thread,
+    so chunks are handed to the event loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self._loop = loop
+        self._queue = queue
+
+    def _push(self, text: str):
+        if text:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, text)
+
+    def print(self, *objects, sep: str = " ", end: str = "\n", flush: bool = False):
+        # Streamed chunks are printed without a line ending; the rest is console decoration
+        if end == "" and objects:
+            text = sep.join(str(obj) for obj in objects)
+            if not text.startswith("\033"):
+                self._push(text)
+
+    def send(self, message):
+        # Newer ag2 versions emit stream events instead of printing
+        if type(message).__name__.startswith("Stream"):
+            content = getattr(message, "content", None)
+            content = getattr(content, "content", content)
+            if isinstance(content, str):
+                self._push(content)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        raise RuntimeError("Agents run with human_input_mode='NEVER'")
+
+def _create(agent: "ConversableAgent", messages: List[Dict[str, str]], params: Optional[dict] = None,
+            client: Any = None) -> Tuple[str, Any]:
+    """Blocking completion through the agent's ag2 client, returning (text, raw response)
+
+    This is what the agent's reply path does internally; calling the client directly
+    keeps the raw response so usage and cost can be recorded per call, and lets
+    params (e.g. response_format) override the agent's llm_config for one call.
+    client (a routed endpoint's client) replaces the agent's own.
+    """
+    if client is None:
+        client = agent.client
+    else:
+        # The endpoint's client doesn't know the agent's top-level settings (seed, stream, ...)
+        settings = {k: v for k, v in (agent.llm_config or {}).items() if k != "config_list"}
+        params = {**settings, **(params or {})}
+    response = client.create(messages=[{"role": "system", "content": agent.system_message}] + messages,
+                             **(params or {}))
+    reply = client.extract_text_or_completion_object(response)[0]
+    if not isinstance(reply, str):
+        reply = getattr(reply, "content", None) or ""
+    return reply, response
+
+async def _a_create_streaming(agent: "ConversableAgent", messages: List[Dict[str, str]],
+                              on_token: Callable[[str], Awaitable[None]],
+                              params: Optional[dict] = None, client: Any = None) -> Tuple[str, Any]:
+    """Generate a reply with the provider's streaming API, forwarding chunks to on_token"""
+    from autogen.io import IOStream
+
+    # A routed endpoint's client is built from the endpoint's own entry, which doesn't stream
+    params = {**(params or {}), "stream": True}
+    queue = asyncio.Queue()
+    relay = _TokenRelay(asyncio.get_running_loop(), queue)
+
+    # The task (and its worker thread) copy the current context, so the relay only applies to this call
+    with IOStream.set_default(relay):
+        reply = asyncio.ensure_future(_to_thread(_create, agent, messages, params, client))
+
+    try:
+        while True:
+            next_token = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({reply, next_token}, return_when=asyncio.FIRST_COMPLETED)
+            if next_token not in done:
+                next_token.cancel()
+                break
+            await on_token(next_token.result())
+
+        # Chunks queued just before the reply finished
+        while not queue.empty():
+            await on_token(queue.get_nowait())
+    except BaseException:
+        reply.cancel()
+        raise
+    return reply.result()
+
+def _usage(response: Any) -> Tuple[int, int, int]:
+    """(prompt, completion, cached prompt) tokens reported by the provider"""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (
+        getattr(usage, "prompt_tokens", 0) or 0,
+        getattr(usage, "completion_tokens", 0) or 0,
+        getattr(details, "cached_tokens", 0) or 0,
+    )
+
+def _model_name(agent: "ConversableAgent", response: Any = None) -> str:
+    model = getattr(response, "model", None)
+    if not model and isinstance(agent.llm_config, dict):
+        config_list = agent.llm_config.get("config_list") or [{}]
+        model = config_list[0].get("model")
+    return model or "unknown"
+
+async def _a_attempt(agent: "ConversableAgent", messages: List[Dict[str, str]], ctx: Optional[CallContext],
+                     on_token: Optional[Callable[[str], Awaitable[None]]], kind: str,
+                     params: Optional[dict], policy: RetryPolicy) -> Tuple[str, CallRecord]:
+    """One rate-limited, routed, deadline-bound call; failures are recorded, successes returned with their record"""
+    metrics = ctx.metrics if ctx else None
+    queued = time.perf_counter()
+    limiter = ctx.limiter if ctx else None
+    pool = ctx.router.pool_for(kind) if ctx and ctx.router else None
+    prompt_estimate = 0
+    if limiter or pool:
+        prompt_text = agent.system_message + "".join(m["content"] for m in messages)
+        prompt_estimate = estimate_tokens(prompt_text)
+    if limiter:
+        await limiter.acquire(prompt_estimate)
+    endpoint = await pool.acquire(prompt_estimate) if pool else None
+    client = endpoint.client if endpoint else None
+
+    started = time.perf_counter()
+    record = CallRecord(kind=kind, agent=agent.name, model=_model_name(agent), latency_s=0.0,
+                        queued_s=started - queued, endpoint=endpoint.name if endpoint else None)
+    error = None
+    completed = False
+    try:
+        if on_token:
+            response, raw = await policy.with_deadline(
+                _a_create_streaming(agent, messages, on_token, params, client))
+        else:
+            response, raw = await policy.with_deadline(_to_thread(_create, agent, messages, params, client))
+        completed = True
+    except Exception as e:
+        error = e
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.latency_s = time.perf_counter() - started
+        if endpoint:
+            pool.release(endpoint, record.latency_s, error, completed)
+        if record.error and metrics:
+            metrics.record_call(record)
+
+    record.model = _model_name(agent, raw)
+    record.prompt_tokens, record.completion_tokens, record.cached_tokens = _usage(raw)
+    record.cost = getattr(raw, "cost", 0.0) or 0.0
+
+    if limiter or endpoint:
+        # Charge the completion, and correct the prompt estimate once real usage is known
+        completion = record.completion_tokens or estimate_tokens(response)
+        correction = record.prompt_tokens - prompt_estimate if record.prompt_tokens else 0
+        if limiter:
+            limiter.consume(completion + correction)
+        if endpoint:
+            pool.consume(endpoint, completion + correction)
+    return response, record
+
+async def a_generate_reply(agent: "ConversableAgent", messages: List[Dict[str, str]],
+                           ctx: Optional[CallContext] = None,
+                           on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                           kind: str = "call", params: Optional[dict] = None) -> str:
+    """Generate an agent reply, applying the show's call context
+
+    When on_token (an async callable) is given, the reply is streamed and each chunk
+    is forwarded as it arrives; the agent's config_list entries must enable "stream". Every
+    call is timed and its token usage recorded in ctx.metrics under `kind`. params
+    are per-call overrides of the agent's llm_config.
+
+    Calls follow ctx.retry (or the default RetryPolicy): per-attempt deadlines,
+    jittered backoff on transient errors within ctx.retry_budget, and hedging of
+    slow non-streaming calls. The recorded call carries the number of retries.
+    Raises ShowCancelled instead of starting an attempt once ctx.cancel is cancelled.
+    """
+    metrics = ctx.metrics if ctx else None
+    cache = ctx.cache if ctx and ctx.cache and ctx.cache.enabled(agent.name) else None
+    cache_key = None
+    if cache:
+        request_config = {**(agent.llm_config or {}), **(params or {})}
+        if ctx.router:
+            # A routed call is answered by one of the pool's endpoints, not the agent's own model
+            request_config["config_list"] = ctx.router.pool_for(kind).config_list()
+        cache_key = cache.make_key(agent.system_message, messages, request_config)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Cache hit for %s", agent.name)
+            if metrics:
+                metrics.record_call(CallRecord(kind=kind, agent=agent.name, model=_model_name(agent),
+                                               latency_s=0.0, cache_hit=True))
+            if on_token:
+                await on_token(cached)
+            return cached
+
+    policy = (ctx.retry if ctx else None) or default_retry_policy
+    budget = ctx.retry_budget if ctx else None
+    attempt = 0
+    while True:
+        if ctx and ctx.cancel:
+            ctx.cancel.raise_if_cancelled()
+        try:
+            if on_token:
+                # Streaming calls are not hedged: a duplicate would interleave tokens
+                response, record = await _a_attempt(agent, messages, ctx, on_token, kind, params, policy)
+            else:
+                response, record = await policy.hedged(
+                    kind, lambda: _a_attempt(agent, messages, ctx, None, kind, params, policy), budget,
+                    on_hedge=metrics.incr if metrics else None,
+                )
+            break
+        except Exception as e:
+            attempt += 1
+            if attempt >= policy.max_attempts or not is_retryable(e):
+                raise
+            if budget is not None and not budget.try_spend():
+                logger.warning("Retry budget exhausted, giving up on %s call for %s", kind, agent.name)
+                if metrics:
+                    metrics.incr("retry_budget_exhausted")
+                raise
+            delay = policy.backoff(attempt - 1, e)
+            logger.info("Retrying %s call for %s in %.2fs after %s", kind, agent.name, delay, type(e).__name__)
+            await asyncio.sleep(delay)
+
+    record.retries = attempt
+    if metrics:
+        metrics.record_call(record)
+    policy.observe(kind, record.latency_s)
+    if cache:
+        cache.put(cache_key, response)
+    return response
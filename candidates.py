@@ -0,0 +1,83 @@
+import re
+import json
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# How the winning line among best-of-N comedian candidates is picked
+CANDIDATE_SELECTORS = ("critic", "heuristic")
+
+_WORD = re.compile(r"[a-z0-9']+")
+_SENTENCE_END = re.compile(r"[.!?]+(?:\s|$)")
+_STOPWORDS = {"a", "an", "the", "and", "or", "of", "to", "in", "on", "at", "for", "with", "is", "it"}
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+def sentence_count(text: str) -> int:
+    """Sentences in a line (a trailing fragment without punctuation counts as one)"""
+    stripped = text.strip()
+    if not stripped:
+        return 0
+    ends = len(_SENTENCE_END.findall(stripped))
+    return ends + (0 if _SENTENCE_END.search(stripped[-1] + " ") else 1)
+
+def heuristic_score(line: str, suggestion: str, partner_line: Optional[str] = None) -> float:
+    """Cheap local quality estimate of a comedian line; higher is better
+
+    Rewards tying back to the suggestion, penalises breaking the two-sentence rule,
+    echoing the partner's line and very short or rambling replies.
+    """
+    words = _words(line)
+    if not words:
+        return float("-inf")
+    score = 0.0
+    topic = set(_words(suggestion)) - _STOPWORDS
+    if topic:
+        score += 2.0 * len(topic & set(words)) / len(topic)
+    score -= 2.0 * max(0, sentence_count(line) - 2)
+    if partner_line:
+        partner = set(_words(partner_line))
+        overlap = len(partner & set(words)) / max(1, len(partner | set(words)))
+        score -= 3.0 * overlap
+    if len(words) < 5:
+        score -= 1.0
+    elif len(words) > 40:
+        score -= (len(words) - 40) / 10
+    return score
+
+def pick_heuristic(lines: List[str], suggestion: str, partner_line: Optional[str] = None) -> int:
+    """Index of the best line by heuristic_score (first wins ties)"""
+    scores = [heuristic_score(line, suggestion, partner_line) for line in lines]
+    return max(range(len(lines)), key=lambda i: scores[i])
+
+def selector_prompt(lines: List[str], suggestion: str, partner_line: Optional[str] = None) -> str:
+    """Ask the critic to pick the strongest of several candidate lines"""
+    numbered = "\n".join(f'{i + 1}. "{line}"' for i, line in enumerate(lines))
+    partner = f'Partner\'s previous line: "{partner_line}"\n' if partner_line else ""
+    # Fixed instructions first, so the prompt shares its prefix with the critic's other prompts
+    return f"""Suggestion: "{suggestion}"
+Do not evaluate each line. Pick the single strongest candidate next line by your rubric and return JSON only: {{"best": <candidate number>}}
+
+{partner}Candidates:
+{numbered}"""
+
+def parse_choice(reply: str, count: int) -> Optional[int]:
+    """Zero-based candidate index from a selector reply, or None if it names none"""
+    match = re.search(r"\{.*\}", reply or "", re.DOTALL)
+    choice = None
+    if match:
+        try:
+            choice = json.loads(match.group(0)).get("best")
+        except (ValueError, AttributeError):
+            choice = None
+    if choice is None:
+        # A bare number is an acceptable answer too
+        number = re.fullmatch(r"\s*(\d+)\.?\s*", reply or "")
+        choice = number.group(1) if number else None
+    try:
+        index = int(choice) - 1
+    except (TypeError, ValueError):
+        return None
+    return index if 0 <= index < count else None
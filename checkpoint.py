@@ -0,0 +1,92 @@
+import os
+import uuid
+import logging
+from typing import Dict, List, Optional, TextIO
+
+from serialize import dumps_text, loads
+
+logger = logging.getLogger(__name__)
+
+# Event types, in the order a show writes them
+EVENT_TYPES = ("show", "line", "eval", "end")
+
+class ShowLog:
+    """Append-only JSONL event log for one show
+
+    run_improv_async writes a "show" header (suggestion, rounds, speaking order),
+    then a "line" event per comedian line, an "eval" event each time an evaluation
+    is recorded and an "end" event when the show finishes. Passing the same log to
+    a new run replays these events, rebuilding ShowState and each comedian's last
+    feedback exactly, and continues from the next turn without repeating paid calls.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    @classmethod
+    def new(cls, directory: str = ".checkpoints") -> "ShowLog":
+        """A log under a fresh random name"""
+        return cls(os.path.join(directory, f"{uuid.uuid4().hex}.jsonl"))
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def events(self) -> List[Dict]:
+        """All complete events; a partial line left by a crash mid-write is ignored"""
+        if not self.exists:
+            return []
+        events = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    logger.warning("Ignoring partial event at the end of %s", self.path)
+                    break
+                event = loads(line)
+                if event.get("type") in EVENT_TYPES:
+                    events.append(event)
+        return events
+
+    def header(self) -> Optional[Dict]:
+        """The "show" event, if the log has one"""
+        return next((event for event in self.events() if event["type"] == "show"), None)
+
+    def matches(self, suggestion: str, rounds: int) -> bool:
+        """True unless the log's header is for a different suggestion or round count"""
+        header = self.header()
+        return header is None or (header["suggestion"], header["rounds"]) == (suggestion, rounds)
+
+    def finished(self) -> bool:
+        """Whether the log records the end of its show"""
+        return any(event["type"] == "end" for event in self.events())
+
+    def _truncate_partial(self):
+        """Cut a partial last line left by a crash mid-write, so appends start on a fresh line"""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                logger.warning("Dropping partial event at the end of %s", self.path)
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, event_type: str, **fields):
+        """Write one event and flush it to the OS before returning"""
+        if self._file is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if self.exists:
+                self._truncate_partial()
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(dumps_text({"type": event_type, **fields}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Close and delete the log (e.g. once a finished show has been archived)"""
+        self.close()
+        if self.exists:
+            os.remove(self.path)
@@ -1,52 +1,66 @@
-import os
-import streamlit as st
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-class Config:
-    """Configuration class for Azure OpenAI and system settings."""
-    
-    def __init__(self):
-        self.api_key = os.getenv("AZURE_OPENAI_API_KEY", "").strip()
-        self.api_version = os.getenv("AZURE_OPENAI_API_VERSION", "").strip()
-        self.endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").strip()
-        self.model = os.getenv("AZURE_OPENAI_MODEL", "gpt-4o-mini").strip()
-
-def build_llm_config() -> dict:
-    """Build LLM configuration from sidebar inputs and env vars"""
-    # Initialize config from environment
-    env_config = Config()
-    
-    # Get values from session state or environment
-    model = st.session_state.get("model", env_config.model)
-    api_key = st.session_state.get("api_key", env_config.api_key)
-    base_url = st.session_state.get("base_url", env_config.endpoint)
-    
-    # Build config list entry
-    config_entry = {
-        "model": model,
-        "api_key": api_key,
-    }
-    
-    # For Azure OpenAI, we need to set api_type and other Azure-specific fields
-    if base_url and ("azure" in base_url.lower() or "cognitiveservices" in base_url.lower()):
-        config_entry["api_type"] = "azure"
-        config_entry["azure_endpoint"] = base_url
-        config_entry["api_version"] = env_config.api_version
-        # For Azure, model is the deployment name
-        config_entry["azure_deployment"] = model
-    else:
-        # For standard OpenAI
-        if base_url:
-            config_entry["base_url"] = base_url
-    
-    config = {
-        "config_list": [config_entry],
-        "timeout": st.session_state.get("timeout", 60),
-        "seed": st.session_state.get("seed", 42),
-        # Temperature removed - not supported in newer Azure OpenAI models
-    }
-    
-    return config
+import os
+from typing import Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+class Config:
+    """Configuration class for Azure OpenAI and system settings."""
+
+    def __init__(self):
+        self.api_key = os.getenv("AZURE_OPENAI_API_KEY", "").strip()
+        self.api_version = os.getenv("AZURE_OPENAI_API_VERSION", "").strip()
+        self.endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").strip()
+        self.model = os.getenv("AZURE_OPENAI_MODEL", "gpt-4o-mini").strip()
+        self.archive_path = os.getenv("IMPROV_ARCHIVE", ".archive/shows.sqlite").strip()
+        self.endpoints_path = os.getenv("IMPROV_ENDPOINTS", "").strip()
+
+def make_llm_config(model: str, api_key: str, base_url: str = "", api_version: str = "",
+                    timeout: int = 60, seed: int = 42) -> dict:
+    """Build an ag2 LLM configuration from explicit settings"""
+    # Build config list entry
+    config_entry = {
+        "model": model,
+        "api_key": api_key,
+        # Retries happen in RetryPolicy (retry.py) only; the SDK's own would hide errors from it
+        "max_retries": 0,
+    }
+
+    # For Azure OpenAI, we need to set api_type and other Azure-specific fields
+    if base_url and ("azure" in base_url.lower() or "cognitiveservices" in base_url.lower()):
+        config_entry["api_type"] = "azure"
+        config_entry["azure_endpoint"] = base_url
+        config_entry["api_version"] = api_version
+        # For Azure, model is the deployment name
+        config_entry["azure_deployment"] = model
+    else:
+        # For standard OpenAI
+        if base_url:
+            config_entry["base_url"] = base_url
+
+    config = {
+        "config_list": [config_entry],
+        "timeout": timeout,
+        "seed": seed,
+        # Temperature removed - not supported in newer Azure OpenAI models
+    }
+
+    return config
+
+def build_llm_config(env_config: Optional[Config] = None) -> dict:
+    """Build LLM configuration from sidebar inputs and env vars"""
+    import streamlit as st
+
+    # Initialize config from environment unless a (cached) one is passed in
+    env_config = env_config or Config()
+
+    # Get values from session state or environment
+    return make_llm_config(
+        model=st.session_state.get("model", env_config.model),
+        api_key=st.session_state.get("api_key", env_config.api_key),
+        base_url=st.session_state.get("base_url", env_config.endpoint),
+        api_version=env_config.api_version,
+        timeout=st.session_state.get("timeout", 60),
+        seed=st.session_state.get("seed", 42),
+    )
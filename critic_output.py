@@ -0,0 +1,172 @@
+import re
+import json
+import math
+import threading
+from typing import Any, List, Optional, Set, Tuple
+from pydantic import BaseModel
+from models import LineEval
+from retry import status_of
+
+class LineEvalSchema(BaseModel):
+    """Structured-output schema for one critic evaluation"""
+    speaker: str
+    score: float
+    tags: List[str]
+    comments: str
+
+class LineEvalBatchSchema(BaseModel):
+    """Structured-output schema for a batched critic evaluation"""
+    evaluations: List[LineEvalSchema]
+
+class CriticParseError(ValueError):
+    """The critic reply did not contain a usable evaluation"""
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_DECODER = json.JSONDecoder()
+
+# Endpoint sets that answered a structured-output request with a 400
+_REJECTED: Set[Tuple] = set()
+_REJECTED_LOCK = threading.Lock()
+
+REPAIR_PROMPT = """Your previous reply could not be parsed as JSON:
+<<<
+{reply}
+>>>
+Rewrite it as {shape} and nothing else. Do not re-evaluate; keep the same scores and comments."""
+
+def _config_list(llm_config: Any) -> List[dict]:
+    """config_list entries of a plain dict or an ag2 LLMConfig"""
+    if not hasattr(llm_config, "items"):
+        return []
+    return list(dict(llm_config.items()).get("config_list") or [])
+
+def _endpoints_key(llm_config: Any) -> Tuple:
+    return tuple(sorted(
+        tuple(str(entry.get(key) or "") for key in ("api_type", "model", "base_url", "azure_endpoint", "api_version"))
+        for entry in _config_list(llm_config)
+    ))
+
+def supports_structured_output(llm_config: Any) -> bool:
+    """Whether every endpoint in the config is OpenAI or Azure OpenAI (which accept response_format)
+
+    llm_config is a dict or an ag2 LLMConfig. Endpoints that have rejected
+    response_format before (see reject_structured_output) are not asked again.
+    """
+    if not hasattr(llm_config, "items"):
+        return False
+    for entry in _config_list(llm_config):
+        if entry.get("api_type", "openai") not in ("openai", "azure"):
+            return False
+        base_url = entry.get("base_url")
+        if base_url and "openai.com" not in str(base_url):
+            return False
+    with _REJECTED_LOCK:
+        return _endpoints_key(llm_config) not in _REJECTED
+
+def rejects_structured_output(error: BaseException) -> bool:
+    """Whether a call failed because the provider doesn't accept response_format
+
+    E.g. an Azure api_version before 2024-08-01-preview, or a model without json_schema support.
+    """
+    return status_of(error) == 400 and "response_format" in str(error)
+
+def reject_structured_output(llm_config: Any):
+    """Remember that these endpoints reject response_format, for the rest of the process"""
+    with _REJECTED_LOCK:
+        _REJECTED.add(_endpoints_key(llm_config))
+
+def extract_json(text: Any) -> Any:
+    """Pull the first JSON value out of a reply that may be fenced or wrapped in prose"""
+    if not isinstance(text, str):
+        raise CriticParseError("Critic reply is not text")
+
+    # Fast path: the reply is already bare JSON
+    stripped = text.strip()
+    try:
+        return json.loads(stripped)
+    except ValueError:
+        pass
+
+    candidates = [match.group(1) for match in _FENCE.finditer(stripped)] + [stripped]
+    for candidate in candidates:
+        for start, char in enumerate(candidate):
+            if char in "{[":
+                try:
+                    value, _ = _DECODER.raw_decode(candidate, start)
+                    return value
+                except ValueError:
+                    continue
+    raise CriticParseError("No JSON value found in critic reply")
+
+def _score(value: Any) -> float:
+    """Coerce a score to a float clamped to 0-10"""
+    if isinstance(value, bool):
+        raise CriticParseError("Score is not a number")
+    if isinstance(value, (int, float)):
+        score = float(value)
+    elif isinstance(value, str) and _NUMBER.search(value):
+        # Accept things like "7/10"
+        score = float(_NUMBER.search(value).group())
+    else:
+        raise CriticParseError("Score is missing or not a number")
+    if math.isnan(score):
+        raise CriticParseError("Score is NaN")
+    return min(10.0, max(0.0, score))
+
+def _tags(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [str(tag).strip() for tag in value if str(tag).strip()]
+    if isinstance(value, str):
+        return [tag.strip() for tag in value.split(",") if tag.strip()]
+    return []
+
+def eval_from_result(result: Any, speaker: str, line: str, round_idx: int) -> LineEval:
+    """Validate one parsed critic object against the LineEval fields"""
+    if not isinstance(result, dict):
+        raise CriticParseError("Evaluation is not a JSON object")
+    reported = result.get("speaker")
+    comments = result.get("comments", "")
+    return LineEval(
+        speaker=(reported if isinstance(reported, str) and reported else speaker).lower(),
+        text=line,
+        score=_score(result.get("score")),
+        tags=_tags(result.get("tags")),
+        comments=comments if isinstance(comments, str) else str(comments),
+        round_idx=round_idx
+    )
+
+def parse_line_eval(response: Any, speaker: str, line: str, round_idx: int) -> LineEval:
+    """Parse a single-line critic reply"""
+    result = extract_json(response)
+    # Some models wrap a single evaluation in the batch shape
+    if isinstance(result, dict) and isinstance(result.get("evaluations"), list) and result["evaluations"]:
+        result = result["evaluations"][0]
+    elif isinstance(result, list) and result:
+        result = result[0]
+    return eval_from_result(result, speaker, line, round_idx)
+
+def parse_batch(response: Any, entries: List[Tuple[str, str, int]]) -> List[Optional[LineEval]]:
+    """Parse a batched critic reply; entries that fail validation come back as None
+
+    Raises CriticParseError if the reply holds no list of evaluations at all.
+    """
+    results = extract_json(response)
+    if isinstance(results, dict):
+        results = results.get("evaluations")
+    if not isinstance(results, list):
+        raise CriticParseError("Batched reply has no list of evaluations")
+
+    evals = []
+    for i, (speaker, line, round_idx) in enumerate(entries):
+        try:
+            evals.append(eval_from_result(results[i], speaker, line, round_idx))
+        except (IndexError, CriticParseError):
+            evals.append(None)
+    return evals
+
+def repair_prompt(reply: Any, batch: bool = False) -> str:
+    """Cheap follow-up asking the critic to reformat an unparseable reply"""
+    shape = ('a JSON object {"evaluations": [...]} with one evaluation object per line' if batch
+             else 'one JSON object {"speaker": ..., "score": ..., "tags": [...], "comments": ...}')
+    return REPAIR_PROMPT.format(reply=str(reply)[:2000], shape=shape)
@@ -0,0 +1,287 @@
+"""Local stand-in for an OpenAI-compatible chat-completions endpoint.
+
+Used by benchmark.py to measure orchestration overhead and concurrency without
+spending API money. Latency, token rate, error rate and critic parse failures are
+configurable; comedian and critic replies are canned.
+
+    python fake_openai_server.py --port 8011 --latency-ms 400 --tokens-per-s 60
+    # then point the app at base_url http://127.0.0.1:8011/v1
+"""
+import re
+import json
+import math
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+COMEDIAN_LINES = [
+    "I packed light for this trip, just my emotional baggage and a sandwich.",
+    "The scanner beeped at me, turns out my personality is a prohibited item.",
+    "They asked if I had anything to declare, so I declared my love for the pilot.",
+    "My shoes went through the X-ray and came back with better posture than me.",
+    "I tried the express lane, but my jokes still need a layover.",
+    "Okay, my flight is boarding and my dignity is in the bin tray. I gotta go.",
+]
+
+TAGS = [["wordplay"], ["observational"], ["callback"], ["absurd"], ["self-deprecating"]]
+
+@dataclass
+class FakeServerConfig:
+    """Behaviour of the fake endpoint"""
+    latency_ms: float = 300.0          # median time to first token
+    latency_sigma: float = 0.25        # lognormal spread of the latency (0 = fixed)
+    tokens_per_s: float = 0.0          # completion token rate (0 = instant)
+    error_rate: float = 0.0            # fraction of requests answered with error_status
+    error_status: int = 500
+    critic_parse_failure_rate: float = 0.0  # fraction of critic replies that are not valid JSON
+    wrap_rate: float = 0.0             # fraction of comedian lines that end the scene
+    prompt_cache_min_tokens: int = 1024  # prompts shorter than this are never served from the prefix cache
+    prompt_cache_block_tokens: int = 128  # cached prefixes grow in blocks of this many tokens
+    seed: Optional[int] = None
+    comedian_lines: List[str] = field(default_factory=lambda: list(COMEDIAN_LINES))
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+class _FakeBackend:
+    """Generates canned replies with the configured timing and failure behaviour"""
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._prefixes: set = set()
+        self.requests = 0
+
+    def _roll(self) -> float:
+        with self._lock:
+            self.requests += 1
+            return self._random.random()
+
+    def latency_s(self) -> float:
+        c = self.config
+        with self._lock:
+            jitter = self._random.gauss(0, c.latency_sigma) if c.latency_sigma else 0.0
+        return c.latency_ms / 1000.0 * math.exp(jitter)
+
+    def should_fail(self) -> bool:
+        return self._roll() < self.config.error_rate
+
+    def cached_tokens(self, messages: List[dict]) -> int:
+        """Prompt tokens served from the prefix cache, like OpenAI's automatic prompt caching
+
+        The prompt is cut into blocks of prompt_cache_block_tokens once it reaches
+        prompt_cache_min_tokens; the longest run of blocks already seen in an earlier
+        request counts as cached, and every block prefix of this request is remembered.
+        """
+        text = "".join(f"{m.get('role')}:{m.get('content') or ''}\n" for m in messages)
+        # _estimate_tokens counts four characters per token
+        block = self.config.prompt_cache_block_tokens * 4
+        start = max(self.config.prompt_cache_min_tokens * 4, block)
+        cached = 0
+        with self._lock:
+            for end in range(start, len(text) + 1, block):
+                prefix = text[:end]
+                if prefix in self._prefixes:
+                    cached = end // 4
+                else:
+                    self._prefixes.add(prefix)
+        return cached
+
+    def reply(self, messages: List[dict]) -> str:
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        prompt = messages[-1].get("content", "") if messages else ""
+        if "comedy judge" in system:
+            return self._critic_reply(prompt)
+        lines = self.config.comedian_lines
+        with self._lock:
+            line = self._random.choice(lines[:-1] if len(lines) > 1 else lines)
+        if self._roll() < self.config.wrap_rate:
+            line = lines[-1]
+        return line
+
+    def _critic_reply(self, prompt: str) -> str:
+        if self._roll() < self.config.critic_parse_failure_rate:
+            return "Great energy! Here's my take:\n```json\n{\"score\": 7, oops"
+
+        # Like a real critic, name the speaker given for each line
+        speakers = re.findall(r"Speaker: (\S+)", prompt)
+
+        def evaluation(i: int = 0) -> dict:
+            speaker = speakers[i] if i < len(speakers) else "comedian"
+            with self._lock:
+                return {"speaker": speaker, "score": self._random.randint(4, 9),
+                        "tags": self._random.choice(TAGS), "comments": "Solid tie-in; tighten the punch."}
+
+        if '"best"' in prompt:
+            # Best-of-N candidate selection
+            candidates = len(re.findall(r"^\d+\. ", prompt, re.M))
+            with self._lock:
+                return json.dumps({"best": self._random.randint(1, max(1, candidates))})
+
+        count = prompt.count("\nLine ") + (1 if prompt.startswith("Line ") else 0)
+        if "evaluations" in prompt and count:
+            return json.dumps({"evaluations": [evaluation(i) for i in range(count)]})
+        return json.dumps(evaluation())
+
+def _usage(prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> dict:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+def _completion(model: str, content: str, prompt_tokens: int, completion_tokens: int,
+                cached_tokens: int = 0) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop", "logprobs": None}],
+        "usage": _usage(prompt_tokens, completion_tokens, cached_tokens),
+    }
+
+def _make_handler(backend: _FakeBackend):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            # Accept both OpenAI (/v1/chat/completions) and Azure (/openai/deployments/<d>/chat/completions) paths
+            if not self.path.split("?")[0].endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            messages = request.get("messages", [])
+            model = request.get("model", "fake-model")
+
+            time.sleep(backend.latency_s())
+            if backend.should_fail():
+                status = backend.config.error_status
+                self._send_json(status, {"error": {"message": "injected failure", "type": "fake_error",
+                                                   "code": str(status)}})
+                return
+
+            content = backend.reply(messages)
+            prompt_tokens = sum(_estimate_tokens(m.get("content") or "") for m in messages)
+            cached_tokens = min(backend.cached_tokens(messages), prompt_tokens)
+            completion_tokens = _estimate_tokens(content)
+            rate = backend.config.tokens_per_s
+
+            if request.get("stream"):
+                self._stream(model, content, prompt_tokens, completion_tokens, cached_tokens, rate)
+                return
+            if rate:
+                time.sleep(completion_tokens / rate)
+            self._send_json(200, _completion(model, content, prompt_tokens, completion_tokens, cached_tokens))
+
+        def _stream(self, model: str, content: str, prompt_tokens: int, completion_tokens: int,
+                    cached_tokens: int, rate: float):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                piece = word if i == 0 else " " + word
+                chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model,
+                         "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece},
+                                      "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if rate:
+                    time.sleep(_estimate_tokens(piece) / rate)
+            final = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     "usage": _usage(prompt_tokens, completion_tokens, cached_tokens)}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            logger.debug("fake-openai: " + format, *args)
+
+    return Handler
+
+class FakeOpenAIServer:
+    """Background fake chat-completions server; use as a context manager"""
+
+    def __init__(self, config: Optional[FakeServerConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeServerConfig()
+        self.backend = _FakeBackend(self.config)
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self.backend))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted"""
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.25)
+    parser.add_argument("--tokens-per-s", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--critic-parse-failure-rate", type=float, default=0.0)
+    parser.add_argument("--wrap-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--prompt-cache-min-tokens", type=int, default=1024)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate, error_status=args.error_status,
+        critic_parse_failure_rate=args.critic_parse_failure_rate, wrap_rate=args.wrap_rate, seed=args.seed,
+        prompt_cache_min_tokens=args.prompt_cache_min_tokens,
+    )
+    server = FakeOpenAIServer(config, host=args.host, port=args.port)
+    print(f"Fake OpenAI server on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
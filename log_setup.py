@@ -0,0 +1,158 @@
+"""Project logging: level-gated, queue-backed and secret-redacting.
+
+Call setup_logging() once from an entry point (app.py, batch_runner.py). Records
+are handed to a QueueHandler and written by a QueueListener thread, so callers on
+the event loop never block on stream or file I/O. Prompt and response bodies go
+through log_body(), which only formats them at DEBUG and for a sampled fraction
+of calls. Secret fields (api_key, tokens, passwords) are redacted before a record
+leaves the calling thread.
+
+Levels can also come from the environment:
+
+    IMPROV_LOG_LEVEL=INFO
+    IMPROV_LOG_LEVELS="orchestration=DEBUG,calls=INFO"
+    IMPROV_LOG_BODY_SAMPLE=0.05
+"""
+import os
+import re
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Any, Dict, Optional
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Chatty third-party loggers stay at WARNING unless a component level says otherwise
+QUIET_LOGGERS = ("httpx", "httpcore", "openai", "autogen", "urllib3", "watchdog")
+
+SECRET_KEYS = {"api_key", "apikey", "authorization", "password", "secret", "token",
+               "access_token", "azure_ad_token", "client_secret"}
+_SECRET_SUFFIXES = ("_key", "_secret", "_token", "_password")
+_SECRET_TEXT = re.compile(
+    r"""((?:api_key|api-key|authorization|password|client_secret|access_token|azure_ad_token)['"]?\s*[:=]\s*['"]?)"""
+    r"""(?:Bearer\s+)?[^'",\s}]+""",
+    re.IGNORECASE,
+)
+_KEY_LIKE = re.compile(r"\bsk-[A-Za-z0-9_\-]{8,}")
+REDACTED = "***"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+_body_sample_rate = 1.0
+_max_body_chars = 2000
+
+def _is_secret_key(key: Any) -> bool:
+    if not isinstance(key, str):
+        return False
+    key = key.lower()
+    return key in SECRET_KEYS or key.endswith(_SECRET_SUFFIXES)
+
+def redact(value: Any) -> Any:
+    """Copy of value with secret fields and key-like strings masked"""
+    if isinstance(value, dict):
+        return {k: REDACTED if _is_secret_key(k) and v else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    if isinstance(value, str):
+        return _KEY_LIKE.sub(REDACTED, _SECRET_TEXT.sub(r"\1" + REDACTED, value))
+    return value
+
+class RedactingFilter(logging.Filter):
+    """Masks secrets in a record's message and arguments"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, str):
+            record.msg = redact(record.msg)
+        if isinstance(record.args, dict):
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(redact(arg) for arg in record.args)
+        return True
+
+def _clip(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > _max_body_chars:
+        return f"{value[:_max_body_chars]}… [{len(value) - _max_body_chars} more chars]"
+    return value
+
+def log_body(log: logging.Logger, msg: str, *args):
+    """Debug-log a message carrying a prompt or response body
+
+    Nothing is formatted unless DEBUG is enabled for the logger and the call is
+    picked by the body sample rate; long bodies are clipped.
+    """
+    if not log.isEnabledFor(logging.DEBUG) or _body_sample_rate <= 0:
+        return
+    if _body_sample_rate < 1 and random.random() >= _body_sample_rate:
+        return
+    log.debug(msg, *(_clip(arg) for arg in args))
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse "orchestration=DEBUG,calls=INFO" into a component level map"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging(level: Optional[str] = None, components: Optional[Dict[str, str]] = None,
+                  body_sample_rate: Optional[float] = None, log_file: Optional[str] = None,
+                  max_body_chars: int = 2000, force: bool = False) -> logging.handlers.QueueListener:
+    """Route all logging through a background writer thread
+
+    level is the root level, components maps logger names to their own levels and
+    body_sample_rate is the fraction of log_body() calls that are written. Arguments
+    left as None fall back to the IMPROV_LOG_* environment variables. Calling again
+    is a no-op (so Streamlit reruns are cheap) unless force replaces the configuration.
+    """
+    global _listener, _queue_handler, _body_sample_rate, _max_body_chars
+    if _listener is not None and not force:
+        return _listener
+
+    level = (level or os.getenv("IMPROV_LOG_LEVEL") or "WARNING").upper()
+    levels = {name: "WARNING" for name in QUIET_LOGGERS}
+    levels.update(parse_levels(os.getenv("IMPROV_LOG_LEVELS", "")))
+    levels.update({name: lvl.upper() for name, lvl in (components or {}).items()})
+    if body_sample_rate is None:
+        body_sample_rate = float(os.getenv("IMPROV_LOG_BODY_SAMPLE", "1.0"))
+    _body_sample_rate = max(0.0, min(1.0, body_sample_rate))
+    _max_body_chars = max_body_chars
+
+    shutdown_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Redact before the record is formatted and queued
+    _queue_handler.addFilter(RedactingFilter())
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    for name, component_level in levels.items():
+        logging.getLogger(name).setLevel(component_level)
+    return _listener
+
+def shutdown_logging():
+    """Flush and stop the writer thread"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+atexit.register(shutdown_logging)
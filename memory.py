@@ -0,0 +1,77 @@
+import re
+from collections import deque
+from typing import Deque, List, Tuple
+from calls import estimate_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def _gist(speaker: str, text: str, max_words: int = 16) -> str:
+    """Compress a line to its first sentence, clipped to max_words"""
+    first = _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+    words = first.split()
+    if len(words) > max_words:
+        first = " ".join(words[:max_words]) + "…"
+    return f"{speaker}: {first}"
+
+class SceneMemory:
+    """Token-budgeted scene context for comedian prompts
+
+    The last keep_last lines are kept verbatim. Older lines are folded, one at a
+    time as they leave the window, into a rolling summary of one-sentence gists;
+    the oldest gists are dropped once the summary exceeds its share of the budget.
+    Each update is O(1), so per-turn prompt cost stays flat as rounds grow.
+    """
+
+    def __init__(self, token_budget: int = 300, keep_last: int = 4):
+        self.token_budget = token_budget
+        self.keep_last = keep_last
+        self._recent: Deque[Tuple[str, str, int]] = deque()
+        self._summary: Deque[Tuple[str, int]] = deque()
+        self._summary_tokens = 0
+        self.prompt_tokens: List[int] = []
+
+    def add(self, speaker: str, text: str):
+        """Append a transcript line, folding the oldest verbatim line into the summary"""
+        line = f"{speaker}: {text}"
+        self._recent.append((speaker, line, estimate_tokens(line)))
+        if len(self._recent) > self.keep_last:
+            old_speaker, old_line, _ = self._recent.popleft()
+            gist = _gist(old_speaker, old_line.split(": ", 1)[1])
+            gist_tokens = estimate_tokens(gist)
+            self._summary.append((gist, gist_tokens))
+            self._summary_tokens += gist_tokens
+
+        # Verbatim lines get priority; the summary keeps whatever budget is left
+        summary_budget = max(0, self.token_budget - sum(tokens for _, _, tokens in self._recent))
+        while self._summary and self._summary_tokens > summary_budget:
+            _, dropped = self._summary.popleft()
+            self._summary_tokens -= dropped
+
+    def render(self, skip_latest: int = 0) -> str:
+        """Scene context for the next prompt, omitting the newest skip_latest lines"""
+        recent = list(self._recent)
+        if skip_latest:
+            recent = recent[:-skip_latest]
+
+        # Drop the oldest verbatim lines if they alone exceed the budget
+        used = 0
+        kept = []
+        for _, line, tokens in reversed(recent):
+            if used + tokens > self.token_budget:
+                break
+            kept.append(line)
+            used += tokens
+        kept.reverse()
+
+        parts = []
+        if self._summary:
+            parts.append("Earlier in the scene: " + " / ".join(gist for gist, _ in self._summary))
+        if kept:
+            parts.append("\n".join(kept))
+        return "\n".join(parts)
+
+    def account(self, prompt: str) -> int:
+        """Record the estimated token size of a prompt built from this memory"""
+        tokens = estimate_tokens(prompt)
+        self.prompt_tokens.append(tokens)
+        return tokens
@@ -0,0 +1,267 @@
+import time
+import logging
+import threading
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+def percentiles(values: Iterable[float]) -> Dict[str, float]:
+    """Nearest-rank p50/p95/p99 of a sample"""
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{int(q * 100)}": 0.0 for q in QUANTILES}
+    return {
+        f"p{int(q * 100)}": ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+        for q in QUANTILES
+    }
+
+def cached_share(prompt_tokens: int, cached_tokens: int) -> float:
+    """Fraction of prompt tokens the provider served from its prompt-prefix cache"""
+    return cached_tokens / prompt_tokens if prompt_tokens else 0.0
+
+def critic_parse_rates(counters: Dict[str, int]) -> Dict[str, float]:
+    """Share of critic replies that needed a repair call, and that were still wasted"""
+    attempts = counters.get("critic_parse_attempts", 0)
+    failed = counters.get("critic_parse_failed", 0)
+    return {
+        "parse_failure_rate": failed / attempts if attempts else 0.0,
+        "repair_success_rate": counters.get("critic_repaired", 0) / failed if failed else 0.0,
+        "wasted_call_rate": counters.get("critic_unparsed", 0) / attempts if attempts else 0.0,
+    }
+
+@dataclass
+class CallRecord:
+    """Timing and usage of one agent call"""
+    kind: str  # "comedian", "critic" or "critic_batch"
+    agent: str
+    model: str
+    latency_s: float
+    queued_s: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    endpoint: Optional[str] = None
+
+class MetricsRegistry:
+    """Process-wide aggregates across every show
+
+    Latencies are kept in a bounded window per call kind so percentiles reflect
+    recent traffic and memory stays flat for long-running processes.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._round_latencies: Deque[float] = deque(maxlen=window)
+        self._show_tokens: Deque[int] = deque(maxlen=window)
+        self._show_durations: Deque[float] = deque(maxlen=window)
+        self.counters: Counter = Counter()
+        self.tokens: Counter = Counter()
+        self.cost_by_model: Counter = Counter()
+
+    def record_call(self, record: CallRecord):
+        with self._lock:
+            if record.error:
+                # Failed attempts are counted apart and kept out of latencies and call totals
+                self.counters[f"{record.kind}_errors"] += 1
+                return
+            self.counters[f"{record.kind}_calls"] += 1
+            if record.cache_hit:
+                self.counters["cache_hits"] += 1
+            else:
+                self._latencies[record.kind].append(record.latency_s)
+            self.counters["retries"] += record.retries
+            self.tokens["prompt"] += record.prompt_tokens
+            self.tokens["completion"] += record.completion_tokens
+            self.tokens["cached"] += record.cached_tokens
+            self.cost_by_model[record.model] += record.cost
+
+    def record_round(self, seconds: float):
+        with self._lock:
+            self._round_latencies.append(seconds)
+
+    def record_show(self, duration_s: float, total_tokens: int):
+        with self._lock:
+            self.counters["shows"] += 1
+            self._show_durations.append(duration_s)
+            self._show_tokens.append(total_tokens)
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self) -> dict:
+        """Point-in-time copy of all aggregates"""
+        with self._lock:
+            shows = len(self._show_tokens)
+            return {
+                "counters": dict(self.counters),
+                "tokens": dict(self.tokens),
+                "cost_by_model": dict(self.cost_by_model),
+                "latency_s": {kind: percentiles(values) for kind, values in self._latencies.items()},
+                "round_latency_s": percentiles(self._round_latencies),
+                "show_duration_s": percentiles(self._show_durations),
+                "tokens_per_show": sum(self._show_tokens) / shows if shows else 0.0,
+                "cached_prompt_share": cached_share(self.tokens["prompt"], self.tokens["cached"]),
+                "critic_parse": critic_parse_rates(self.counters),
+            }
+
+    def to_prometheus(self) -> str:
+        """Render aggregates in the Prometheus text exposition format"""
+        snap = self.snapshot()
+        lines = ["# TYPE improv_events_total counter"]
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f'improv_events_total{{event="{name}"}} {value}')
+        lines.append("# TYPE improv_tokens_total counter")
+        for kind, value in sorted(snap["tokens"].items()):
+            lines.append(f'improv_tokens_total{{type="{kind}"}} {value}')
+        lines.append("# TYPE improv_cost_total counter")
+        for model, value in sorted(snap["cost_by_model"].items()):
+            lines.append(f'improv_cost_total{{model="{model}"}} {value:.6f}')
+        lines.append("# TYPE improv_call_latency_seconds summary")
+        for kind, quantiles in sorted(snap["latency_s"].items()):
+            for label, value in quantiles.items():
+                quantile = int(label[1:]) / 100
+                lines.append(f'improv_call_latency_seconds{{kind="{kind}",quantile="{quantile}"}} {value:.6f}')
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry shared by every show
+registry = MetricsRegistry()
+
+class ShowMetrics:
+    """Call log and aggregates for one show, mirrored into a MetricsRegistry
+
+    Failed attempts go to errors rather than calls, so they don't count as calls or
+    skew latency percentiles.
+    """
+
+    def __init__(self, parent: Optional[MetricsRegistry] = None):
+        self.parent = parent or registry
+        self.calls: List[CallRecord] = []
+        self.errors: List[CallRecord] = []
+        self.rounds: List[float] = []
+        self.counters: Counter = Counter()
+        self.started = time.perf_counter()
+        self.duration_s: Optional[float] = None
+
+    def record_call(self, record: CallRecord):
+        (self.errors if record.error else self.calls).append(record)
+        self.parent.record_call(record)
+
+    def record_round(self, seconds: float):
+        self.rounds.append(seconds)
+        self.parent.record_round(seconds)
+
+    def incr(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+        self.parent.incr(name, amount)
+
+    def finish(self):
+        """Close the show span and report it to the registry"""
+        self.duration_s = time.perf_counter() - self.started
+        self.parent.record_show(self.duration_s, self.total_tokens)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(c.prompt_tokens + c.completion_tokens for c in self.calls)
+
+    def snapshot(self) -> dict:
+        """Per-kind latency percentiles, token and cost totals for this show"""
+        by_kind: Dict[str, List[CallRecord]] = defaultdict(list)
+        for call in self.calls:
+            by_kind[call.kind].append(call)
+        errors_by_kind = Counter(error.kind for error in self.errors)
+        for kind in errors_by_kind:
+            by_kind.setdefault(kind, [])
+        prompt_tokens = sum(c.prompt_tokens for c in self.calls)
+        cached_tokens = sum(c.cached_tokens for c in self.calls)
+
+        return {
+            "duration_s": self.duration_s if self.duration_s is not None else time.perf_counter() - self.started,
+            "calls": len(self.calls),
+            "errors": len(self.errors),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": sum(c.completion_tokens for c in self.calls),
+            "cached_tokens": cached_tokens,
+            "cached_prompt_share": cached_share(prompt_tokens, cached_tokens),
+            "cost": sum(c.cost for c in self.calls),
+            "retries": sum(c.retries for c in self.calls),
+            "counters": dict(self.counters),
+            "critic_parse": critic_parse_rates(self.counters),
+            "round_latency_s": percentiles(self.rounds),
+            "by_kind": {
+                kind: {
+                    "calls": len(calls),
+                    "errors": errors_by_kind[kind],
+                    "cache_hits": sum(1 for c in calls if c.cache_hit),
+                    "prompt_tokens": sum(c.prompt_tokens for c in calls),
+                    "completion_tokens": sum(c.completion_tokens for c in calls),
+                    "cached_tokens": sum(c.cached_tokens for c in calls),
+                    **percentiles(c.latency_s for c in calls if not c.cache_hit),
+                }
+                for kind, calls in by_kind.items()
+            },
+        }
+
+    def to_records(self) -> List[dict]:
+        return [asdict(c) for c in self.calls]
+
+    def to_dict(self) -> dict:
+        """Call log, rounds and counters of the show, as plain data"""
+        return {"calls": self.to_records(), "errors": [asdict(c) for c in self.errors],
+                "rounds": self.rounds, "counters": dict(self.counters), "duration_s": self.duration_s}
+
+    @classmethod
+    def from_dict(cls, data: dict, parent: Optional[MetricsRegistry] = None) -> "ShowMetrics":
+        """Restore a show's metrics without reporting them to the registry again"""
+        metrics = cls(parent)
+        metrics.calls = [CallRecord(**record) for record in data["calls"]]
+        metrics.errors = [CallRecord(**record) for record in data.get("errors", [])]
+        metrics.rounds = list(data["rounds"])
+        metrics.counters = Counter(data["counters"])
+        metrics.duration_s = data["duration_s"]
+        return metrics
+
+    def __getstate__(self) -> dict:
+        # The registry holds a lock and is per process; unpickled metrics report to the local one
+        state = self.__dict__.copy()
+        state["parent"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.parent = registry
+
+def start_metrics_server(port: int, metrics: Optional[MetricsRegistry] = None,
+                         host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the registry as Prometheus text on /metrics from a daemon thread"""
+    source = metrics or registry
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = source.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return server
@@ -1,24 +1,107 @@
-from dataclasses import dataclass
-from typing import List, Dict
-from autogen import ConversableAgent
-
-@dataclass
-class LineEval:
-    """Evaluation data for a single comedian line"""
-    speaker: str
-    text: str
-    score: float
-    tags: List[str]
-    comments: str
-    round_idx: int
-
-@dataclass
-class ShowState:
-    """Complete state of an improv show"""
-    suggestion: str
-    rounds: int
-    order: List[ConversableAgent]
-    critic: ConversableAgent
-    transcript: List[Dict[str, str]]
-    evaluations: List[LineEval]
-    wrapped: bool
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from memory import SceneMemory
+from metrics import ShowMetrics
+from serialize import dumps, loads
+from stats import ScoreStats
+
+# Version of the to_dict()/to_bytes() layout
+STATE_FORMAT = 1
+
+@dataclass(slots=True)
+class LineEval:
+    """Evaluation data for a single comedian line"""
+    speaker: str
+    text: str
+    score: float
+    tags: List[str]
+    comments: str
+    round_idx: int
+    tier: str = "llm"  # "llm" (critic agent) or "local" (PreScorer)
+
+@dataclass(slots=True)
+class Line:
+    """A single comedian line in the transcript"""
+    speaker: str
+    text: str
+    round_idx: int
+
+@dataclass(slots=True)
+class ShowState:
+    """Complete state of an improv show
+
+    Agents are referenced by name (order, critic), never embedded, so a state holds
+    only plain data and can be pickled, cached or moved between processes.
+    to_bytes()/from_bytes() give a compact serialized form with rows as arrays.
+    """
+    suggestion: str
+    rounds: int
+    order: List[str] = field(default_factory=list)
+    critic: str = "Critic"
+    transcript: List[Line] = field(default_factory=list)
+    evaluations: List[LineEval] = field(default_factory=list)
+    wrapped: bool = False
+    stats: ScoreStats = field(default_factory=ScoreStats)
+    memory: Optional[SceneMemory] = None
+    metrics: Optional[ShowMetrics] = None
+
+    def add_line(self, speaker: str, text: str, round_idx: int) -> Line:
+        """Append a comedian line to the transcript (and scene memory)"""
+        line = Line(speaker, text, round_idx)
+        self.transcript.append(line)
+        if self.memory:
+            self.memory.add(speaker, text)
+        return line
+
+    def add_evaluation(self, line_eval: LineEval):
+        """Record an evaluation and update the running score aggregates"""
+        self.evaluations.append(line_eval)
+        self.stats.add(line_eval)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-data form; lines and evaluations are positional rows"""
+        return {
+            "format": STATE_FORMAT,
+            "suggestion": self.suggestion,
+            "rounds": self.rounds,
+            "order": self.order,
+            "critic": self.critic,
+            "wrapped": self.wrapped,
+            "lines": [[line.speaker, line.text, line.round_idx] for line in self.transcript],
+            "evaluations": [[e.speaker, e.text, e.score, e.tags, e.comments, e.round_idx, e.tier]
+                            for e in self.evaluations],
+            "memory": ({"token_budget": self.memory.token_budget, "keep_last": self.memory.keep_last,
+                        "prompt_tokens": self.memory.prompt_tokens} if self.memory else None),
+            "metrics": self.metrics.to_dict() if self.metrics else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ShowState":
+        """Rebuild a state (aggregates and scene memory included) from to_dict() output"""
+        if data.get("format") != STATE_FORMAT:
+            raise ValueError(f"Unsupported show state format {data.get('format')!r}")
+        memory = data.get("memory")
+        state = cls(
+            suggestion=data["suggestion"],
+            rounds=data["rounds"],
+            order=list(data["order"]),
+            critic=data["critic"],
+            wrapped=data["wrapped"],
+            memory=SceneMemory(memory["token_budget"], memory["keep_last"]) if memory else None,
+            metrics=ShowMetrics.from_dict(data["metrics"]) if data.get("metrics") else None,
+        )
+        for speaker, text, round_idx in data["lines"]:
+            state.add_line(speaker, text, round_idx)
+        if state.memory:
+            state.memory.prompt_tokens = list(memory["prompt_tokens"])
+        for row in data["evaluations"]:
+            state.add_evaluation(LineEval(*row))
+        return state
+
+    def to_bytes(self) -> bytes:
+        """Compact serialized form (JSON via orjson when available)"""
+        return dumps(self.to_dict())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ShowState":
+        return cls.from_dict(loads(data))
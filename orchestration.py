@@ -1,179 +1,681 @@
-import json
-import random
-import logging
-from typing import Optional, Tuple, Callable
-from autogen import ConversableAgent
-from models import LineEval, ShowState
-from agents import make_comedian, make_critic
-from utils import average_scores
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
-
-def critic_judge_line(critic: ConversableAgent, speaker: str, line: str, suggestion: str, round_idx: int) -> LineEval:
-    """Have critic evaluate a comedian's line"""
-    prompt = f"""Suggestion: "{suggestion}"
-Speaker: {speaker}
-Line: "{line}"
-
-Evaluate this line and return JSON only."""
-    
-    try:
-        logger.debug(f"Critic evaluating line from {speaker}")
-        response = critic.generate_reply(messages=[{"role": "user", "content": prompt}])
-        logger.debug(f"Critic response: {response}")
-        
-        result = json.loads(response)
-        
-        return LineEval(
-            speaker=result.get("speaker", speaker).lower(),
-            text=line,
-            score=float(result.get("score", 0)),
-            tags=result.get("tags", []),
-            comments=result.get("comments", ""),
-            round_idx=round_idx
-        )
-    except Exception as e:
-        logger.error(f"Error in critic evaluation: {str(e)}")
-        # Fallback on parse failure
-        return LineEval(
-            speaker=speaker.lower(),
-            text=line,
-            score=0.0,
-            tags=["parse-failed"],
-            comments="Unable to evaluate",
-            round_idx=round_idx
-        )
-
-def comedian_turn(comedian: ConversableAgent, state: ShowState, prior_partner_line: Optional[str], 
-                  round_idx: int, last_feedback: Optional[LineEval] = None) -> Tuple[str, bool]:
-    """Execute a comedian's turn"""
-    suggestion = state.suggestion
-    
-    if prior_partner_line:
-        prompt = f"""Improv scene. Suggestion: {suggestion}. Round {round_idx + 1} of {state.rounds}. Keep ≤2 sentences. Build on scene; don't repeat.
-Your partner just said: "{prior_partner_line}"
-Respond with your next line."""
-        
-        # Add critic feedback if available
-        if last_feedback and last_feedback.speaker.lower() == comedian.name.lower():
-            prompt += f"\n\nYour last line scored {last_feedback.score}/10. Critic noted: {last_feedback.comments}"
-    else:
-        prompt = f"""Improv scene. Suggestion: {suggestion}. Round {round_idx + 1} of {state.rounds}. Keep ≤2 sentences.
-Open the scene with a strong first line."""
-    
-    try:
-        logger.debug(f"Comedian {comedian.name} generating response")
-        logger.debug(f"Prompt: {prompt}")
-        
-        # Generate reply with proper message format
-        messages = [{"role": "user", "content": prompt}]
-        response = comedian.generate_reply(messages=messages)
-        
-        logger.debug(f"Comedian response: {response}")
-        
-        # Check for termination
-        termination_phrases = ["I gotta go", "Goodbye"]
-        did_terminate = any(phrase.lower() in response.lower() for phrase in termination_phrases)
-        
-        return response, did_terminate
-    except Exception as e:
-        logger.error(f"Error in comedian turn: {str(e)}")
-        logger.error(f"Error type: {type(e)}")
-        raise
-
-def run_improv_streaming(suggestion: str, rounds: int, starter_choice: str, llm_config: dict, 
-                        on_comedian_line: Callable = None, on_critic_eval: Callable = None) -> ShowState:
-    """Run the full improv show with streaming callbacks"""
-    try:
-        logger.info(f"Starting improv show with suggestion: {suggestion}")
-        logger.debug(f"LLM Config: {llm_config}")
-        logger.info(f"Rounds: {rounds}")
-        
-        # Create agents
-        cathy = make_comedian("Cathy", llm_config)
-        joe = make_comedian("Joe", llm_config)
-        critic = make_critic(llm_config)
-        
-        # Determine order
-        if starter_choice == "Random":
-            order = [cathy, joe] if random.random() < 0.5 else [joe, cathy]
-        elif starter_choice == "Cathy":
-            order = [cathy, joe]
-        else:
-            order = [joe, cathy]
-        
-        state = ShowState(
-            suggestion=suggestion,
-            rounds=rounds,
-            order=order,
-            critic=critic,
-            transcript=[],
-            evaluations=[],
-            wrapped=False
-        )
-        
-        # Track last feedback for each comedian
-        last_feedback = {"Cathy": None, "Joe": None}
-        
-        # Run rounds
-        for round_idx in range(rounds):
-            # Speaker A turn
-            speaker_a = order[0]
-            prior_line = state.transcript[-1]["text"] if len(state.transcript) > 1 else None
-            
-            line_a, did_terminate = comedian_turn(speaker_a, state, prior_line, round_idx, 
-                                                  last_feedback.get(speaker_a.name))
-            state.transcript.append({"speaker": speaker_a.name, "text": line_a})
-            
-            # Callback for streaming
-            if on_comedian_line:
-                on_comedian_line(speaker_a.name, line_a, round_idx)
-            
-            # Evaluate
-            eval_a = critic_judge_line(critic, speaker_a.name, line_a, suggestion, round_idx)
-            state.evaluations.append(eval_a)
-            last_feedback[speaker_a.name] = eval_a  # Store feedback
-            
-            # Callback for critic evaluation
-            if on_critic_eval:
-                on_critic_eval(eval_a)
-            
-            if did_terminate:
-                state.wrapped = True
-                break
-            
-            # Speaker B turn
-            speaker_b = order[1]
-            line_b, did_terminate = comedian_turn(speaker_b, state, line_a, round_idx,
-                                                  last_feedback.get(speaker_b.name))
-            state.transcript.append({"speaker": speaker_b.name, "text": line_b})
-            
-            # Callback for streaming
-            if on_comedian_line:
-                on_comedian_line(speaker_b.name, line_b, round_idx)
-            
-            # Evaluate
-            eval_b = critic_judge_line(critic, speaker_b.name, line_b, suggestion, round_idx)
-            state.evaluations.append(eval_b)
-            last_feedback[speaker_b.name] = eval_b  # Store feedback
-            
-            # Callback for critic evaluation
-            if on_critic_eval:
-                on_critic_eval(eval_b)
-            
-            if did_terminate:
-                state.wrapped = True
-                break
-        
-        return state
-    except Exception as e:
-        logger.error(f"Error in run_improv: {str(e)}")
-        raise
-
-# Keep the original function for backward compatibility
-def run_improv(suggestion: str, rounds: int, starter_choice: str, llm_config: dict) -> ShowState:
-    """Run the full improv show (non-streaming version)"""
-    return run_improv_streaming(suggestion, rounds, starter_choice, llm_config, 
-                               on_comedian_line=None, on_critic_eval=None)
+import time
+import random
+import asyncio
+import inspect
+import logging
+from dataclasses import asdict, replace
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple, Callable, List
+from autogen import ConversableAgent
+from models import LineEval, ShowState
+from agents import AgentPool, default_agent_pool
+from cache import CacheMiss
+from candidates import CANDIDATE_SELECTORS, parse_choice, pick_heuristic, selector_prompt
+from calls import CallContext, CancelToken, ShowCancelled, a_generate_reply
+from checkpoint import ShowLog
+from critic_output import (CriticParseError, LineEvalSchema, LineEvalBatchSchema, parse_batch,
+                           parse_line_eval, reject_structured_output, rejects_structured_output,
+                           repair_prompt, supports_structured_output)
+from log_setup import log_body
+from memory import SceneMemory
+from retry import default_retry_policy
+from metrics import ShowMetrics
+
+if TYPE_CHECKING:
+    from archive import ShowArchive
+    from prescore import PreScorer
+
+logger = logging.getLogger(__name__)
+
+TERMINATION_PHRASES = ["I gotta go", "Goodbye"]
+
+# Prompts put everything that is fixed for a show (the suggestion and instructions)
+# first and the per-call parts last, so that after the agent's system message each
+# prompt shares a byte-identical prefix the provider can serve from its prompt cache.
+
+def _critic_prompt(speaker: str, line: str, suggestion: str) -> str:
+    """Build the critic prompt for a single line"""
+    return (f'Suggestion: "{suggestion}"\nEvaluate the line below and return JSON only.\n\n'
+            f'Speaker: {speaker}\nLine: "{line}"')
+
+def _critic_batch_prompt(entries: List[Tuple[str, str, int]], suggestion: str) -> str:
+    """Build one critic prompt covering several (speaker, line, round_idx) entries"""
+    numbered = "\n".join(
+        f'Line {i + 1} - Speaker: {speaker}\n"{line}"' for i, (speaker, line, _) in enumerate(entries)
+    )
+    return f"""Suggestion: "{suggestion}"
+Evaluate each numbered line below independently and return a JSON object {{"evaluations": [...]}} with one evaluation per line, in order. JSON only.
+
+{numbered}"""
+
+def _failed_eval(speaker: str, line: str, round_idx: int) -> LineEval:
+    """Fallback evaluation used when the critic reply cannot be parsed"""
+    return LineEval(
+        speaker=speaker.lower(),
+        text=line,
+        score=0.0,
+        tags=["parse-failed"],
+        comments="Unable to evaluate",
+        round_idx=round_idx
+    )
+
+def _comedian_prompt(comedian: ConversableAgent, state: ShowState, prior_partner_line: Optional[str],
+                     round_idx: int, last_feedback: Optional[LineEval] = None,
+                     scene_context: Optional[str] = None) -> str:
+    """Build the prompt for a comedian's turn
+
+    The header is the same for every turn of the show; the scene so far only grows
+    between turns until memory starts summarizing, so it comes before the round.
+    """
+    prompt = f"Improv scene. Suggestion: {state.suggestion}. Keep ≤2 sentences. Build on scene; don't repeat.\n"
+    if scene_context:
+        prompt += f"Scene so far:\n{scene_context}\n"
+    prompt += f"Round {round_idx + 1} of {state.rounds}.\n"
+
+    if prior_partner_line:
+        prompt += f"""Your partner just said: "{prior_partner_line}"
+Respond with your next line."""
+
+        # Add critic feedback if available
+        if last_feedback and last_feedback.speaker.lower() == comedian.name.lower():
+            prompt += f"\n\nYour last line scored {last_feedback.score}/10. Critic noted: {last_feedback.comments}"
+    else:
+        prompt += "Open the scene with a strong first line."
+
+    return prompt
+
+def _count(ctx: Optional[CallContext], name: str, amount: int = 1):
+    """Bump a show metrics counter if metrics are being collected"""
+    if ctx and ctx.metrics:
+        ctx.metrics.incr(name, amount)
+
+def _did_terminate(response: str) -> bool:
+    """Check whether a comedian line ends the scene"""
+    return any(phrase.lower() in response.lower() for phrase in TERMINATION_PHRASES)
+
+def _critic_llm_config(critic: ConversableAgent, ctx: Optional[CallContext], kind: str):
+    """Config of the endpoints that may serve a critic call"""
+    if ctx and ctx.router:
+        # Routed calls go to the pool's endpoints, not to the critic's own config
+        return {"config_list": ctx.router.pool_for(kind).config_list()}
+    return critic.llm_config
+
+def _critic_params(critic: ConversableAgent, batch: bool, ctx: Optional[CallContext], kind: str) -> Optional[dict]:
+    """Per-call structured-output request when every endpoint that may serve the call supports it"""
+    if supports_structured_output(_critic_llm_config(critic, ctx, kind)):
+        return {"response_format": LineEvalBatchSchema if batch else LineEvalSchema}
+    return None
+
+async def _a_critic_reply(critic: ConversableAgent, prompt: str, ctx: Optional[CallContext], kind: str,
+                          batch: bool) -> str:
+    """One critic call, asking for structured output where the endpoints support it
+
+    If the provider rejects response_format anyway, the call is made once more
+    without it, and its endpoints are not asked for structured output again.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    params = _critic_params(critic, batch, ctx, kind)
+    try:
+        return await a_generate_reply(critic, messages, ctx, kind=kind, params=params)
+    except Exception as e:
+        if params is None or not rejects_structured_output(e):
+            raise
+        logger.warning("Provider rejected structured output for %s calls; falling back to plain JSON", kind)
+        reject_structured_output(_critic_llm_config(critic, ctx, kind))
+        return await a_generate_reply(critic, messages, ctx, kind=kind)
+
+async def _a_repair(critic: ConversableAgent, reply: str, ctx: Optional[CallContext], batch: bool) -> str:
+    """One cheap reformatting call for an unparseable critic reply (never a re-critique)"""
+    return await _a_critic_reply(critic, repair_prompt(reply, batch), ctx, "critic_repair", batch)
+
+def critic_judge_line(critic: ConversableAgent, speaker: str, line: str, suggestion: str, round_idx: int,
+                      ctx: Optional[CallContext] = None) -> LineEval:
+    """Have critic evaluate a comedian's line (sync wrapper over a_critic_judge_line)"""
+    return _run_sync(a_critic_judge_line(critic, speaker, line, suggestion, round_idx, ctx))
+
+async def a_critic_judge_line(critic: ConversableAgent, speaker: str, line: str, suggestion: str,
+                              round_idx: int, ctx: Optional[CallContext] = None) -> LineEval:
+    """Have critic evaluate a comedian's line (async)
+
+    Replies are parsed tolerantly (fenced or chatty JSON, scores clamped to 0-10). If
+    that still fails, one short repair call asks the critic to reformat its reply.
+    """
+    prompt = _critic_prompt(speaker, line, suggestion)
+
+    try:
+        logger.debug("Critic evaluating line from %s", speaker)
+        response = await _a_critic_reply(critic, prompt, ctx, "critic", batch=False)
+        log_body(logger, "Critic response: %s", response)
+        _count(ctx, "critic_parse_attempts")
+
+        try:
+            return parse_line_eval(response, speaker, line, round_idx)
+        except CriticParseError as e:
+            logger.debug("Critic reply unparseable (%s), requesting repair", e)
+            _count(ctx, "critic_parse_failed")
+
+        repaired = await _a_repair(critic, response, ctx, batch=False)
+        evaluation = parse_line_eval(repaired, speaker, line, round_idx)
+        _count(ctx, "critic_repaired")
+        return evaluation
+    except (CacheMiss, ShowCancelled):
+        # Replay runs must fail loudly rather than record a 0-score, and cancelled shows must stop
+        raise
+    except Exception as e:
+        logger.error("Error in critic evaluation: %s", e)
+        _count(ctx, "critic_unparsed" if isinstance(e, CriticParseError) else "critic_call_failed")
+        # Fallback on parse failure
+        return _failed_eval(speaker, line, round_idx)
+
+def critic_judge_lines(critic: ConversableAgent, entries: List[Tuple[str, str, int]], suggestion: str,
+                       ctx: Optional[CallContext] = None) -> List[LineEval]:
+    """Have critic evaluate several (speaker, line, round_idx) entries in one call (sync wrapper)"""
+    return _run_sync(a_critic_judge_lines(critic, entries, suggestion, ctx))
+
+async def a_critic_judge_lines(critic: ConversableAgent, entries: List[Tuple[str, str, int]],
+                               suggestion: str, ctx: Optional[CallContext] = None) -> List[LineEval]:
+    """Have critic evaluate several (speaker, line, round_idx) entries in one call (async)
+
+    An unparseable reply gets one repair call; entries still missing fall back to
+    concurrent per-line calls.
+    """
+    evals = [None] * len(entries)
+    try:
+        logger.debug("Critic evaluating batch of %d lines", len(entries))
+        response = await _a_critic_reply(critic, _critic_batch_prompt(entries, suggestion), ctx, "critic_batch",
+                                         batch=True)
+        log_body(logger, "Critic batch response: %s", response)
+        _count(ctx, "critic_parse_attempts")
+        try:
+            evals = parse_batch(response, entries)
+        except CriticParseError as e:
+            logger.debug("Critic batch reply unparseable (%s), requesting repair", e)
+            _count(ctx, "critic_parse_failed")
+            evals = parse_batch(await _a_repair(critic, response, ctx, batch=True), entries)
+            _count(ctx, "critic_repaired")
+    except (CacheMiss, ShowCancelled):
+        raise
+    except Exception as e:
+        logger.error("Error in batched critic evaluation: %s", e)
+        _count(ctx, "critic_unparsed" if isinstance(e, CriticParseError) else "critic_call_failed")
+
+    missing = [i for i, evaluation in enumerate(evals) if evaluation is None]
+    if missing:
+        _count(ctx, "critic_batch_entries_failed", len(missing))
+        logger.debug("Falling back to per-line critic calls for %d lines", len(missing))
+        retried = await asyncio.gather(*(
+            a_critic_judge_line(critic, entries[i][0], entries[i][1], suggestion, entries[i][2], ctx) for i in missing
+        ))
+        for i, evaluation in zip(missing, retried):
+            evals[i] = evaluation
+    return evals
+
+def comedian_turn(comedian: ConversableAgent, state: ShowState, prior_partner_line: Optional[str],
+                  round_idx: int, last_feedback: Optional[LineEval] = None,
+                  ctx: Optional[CallContext] = None) -> Tuple[str, bool]:
+    """Execute a comedian's turn (sync wrapper over a_comedian_turn)"""
+    return _run_sync(a_comedian_turn(comedian, state, prior_partner_line, round_idx, last_feedback, ctx))
+
+async def a_comedian_turn(comedian: ConversableAgent, state: ShowState, prior_partner_line: Optional[str],
+                          round_idx: int, last_feedback: Optional[LineEval] = None,
+                          ctx: Optional[CallContext] = None,
+                          on_token: Optional[Callable] = None) -> Tuple[str, bool]:
+    """Execute a comedian's turn (async)
+
+    on_token is an async callable receiving text chunks as they stream in; termination
+    is still detected on the final text. If state.memory is set, the prompt includes
+    the token-budgeted scene context and its size is recorded.
+    """
+    scene_context = None
+    if state.memory:
+        # The partner's line is quoted separately, so leave it out of the context
+        scene_context = state.memory.render(skip_latest=1 if prior_partner_line else 0)
+    prompt = _comedian_prompt(comedian, state, prior_partner_line, round_idx, last_feedback, scene_context)
+    if state.memory:
+        state.memory.account(prompt)
+
+    try:
+        logger.debug("Comedian %s generating response", comedian.name)
+        log_body(logger, "Prompt: %s", prompt)
+
+        messages = [{"role": "user", "content": prompt}]
+        response = await a_generate_reply(comedian, messages, ctx, on_token=on_token, kind="comedian")
+
+        log_body(logger, "Comedian response: %s", response)
+
+        return response, _did_terminate(response)
+    except Exception as e:
+        logger.error("Error in comedian turn (%s): %s", type(e).__name__, e)
+        raise
+
+async def _a_select(critic: ConversableAgent, lines: List[str], suggestion: str,
+                    prior_partner_line: Optional[str], ctx: Optional[CallContext]) -> Optional[int]:
+    """Have the critic pick the strongest candidate line in one short call"""
+    try:
+        prompt = selector_prompt(lines, suggestion, prior_partner_line)
+        reply = await a_generate_reply(critic, [{"role": "user", "content": prompt}], ctx, kind="critic_select")
+        log_body(logger, "Selector response: %s", reply)
+        return parse_choice(reply, len(lines))
+    except (CacheMiss, ShowCancelled):
+        raise
+    except Exception as e:
+        logger.warning("Candidate selection failed (%s), using heuristic", e)
+        return None
+
+async def a_comedian_candidates(comedian: ConversableAgent, state: ShowState, prior_partner_line: Optional[str],
+                                round_idx: int, last_feedback: Optional[LineEval] = None,
+                                ctx: Optional[CallContext] = None, candidates: int = 3,
+                                selector: str = "critic", budget_s: Optional[float] = None,
+                                critic: Optional[ConversableAgent] = None) -> Tuple[str, bool]:
+    """Execute a comedian's turn as best-of-N (async)
+
+    The same prompt is sent as `candidates` concurrent calls (each after the first with
+    its own seed, so replies differ) and one line is picked: by a short critic call
+    over all candidates ("critic") or locally by heuristic_score ("heuristic"). With
+    budget_s, candidates still running when the budget runs out are dropped (at least
+    one is always awaited), and the critic pick must fit in what is left of it or the
+    heuristic decides instead. With the heuristic a turn costs about one call's
+    latency; the critic pick is a second, sequential call, so a turn takes about two
+    (bounded by budget_s). Without a critic agent the heuristic always picks.
+    """
+    scene_context = None
+    if state.memory:
+        scene_context = state.memory.render(skip_latest=1 if prior_partner_line else 0)
+    prompt = _comedian_prompt(comedian, state, prior_partner_line, round_idx, last_feedback, scene_context)
+    if state.memory:
+        state.memory.account(prompt)
+
+    messages = [{"role": "user", "content": prompt}]
+    seed = comedian.llm_config.get("seed", 0) if isinstance(comedian.llm_config, dict) else 0
+    started = time.perf_counter()
+    logger.debug("Comedian %s generating %d candidates", comedian.name, candidates)
+    tasks = [
+        asyncio.ensure_future(a_generate_reply(comedian, messages, ctx, kind="comedian",
+                                               params={"seed": seed + i} if i else None))
+        for i in range(candidates)
+    ]
+    try:
+        done, running = await asyncio.wait(tasks, timeout=budget_s)
+        if not any(task.exception() is None for task in done):
+            # Nothing usable within the budget: take the first candidate that succeeds
+            while running and not any(task.exception() is None for task in done):
+                finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                done |= finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    # Keep launch order among the candidates that made it
+    lines = [task.result() for task in tasks if task in done and task.exception() is None]
+    if not lines:
+        errors = [task.exception() for task in tasks if task in done]
+        logger.error("Error in comedian turn (%s): %s", type(errors[0]).__name__, errors[0])
+        raise errors[0]
+    _count(ctx, "candidates_generated", len(lines))
+    if len(lines) < candidates:
+        _count(ctx, "candidates_dropped", candidates - len(lines))
+
+    choice = 0
+    if len(lines) > 1:
+        remaining = None if budget_s is None else budget_s - (time.perf_counter() - started)
+        picked = None
+        if selector == "critic" and critic is not None and (remaining is None or remaining > 0):
+            try:
+                picked = await asyncio.wait_for(
+                    _a_select(critic, lines, state.suggestion, prior_partner_line, ctx), remaining)
+            except asyncio.TimeoutError:
+                logger.debug("Candidate selection ran past the turn budget")
+            if picked is None:
+                _count(ctx, "candidate_selector_fallback")
+        choice = picked if picked is not None else pick_heuristic(lines, state.suggestion, prior_partner_line)
+
+    response = lines[choice]
+    log_body(logger, "Comedian response (candidate %d of %d): %s", choice + 1, len(lines), response)
+    return response, _did_terminate(response)
+
+async def _notify(callback: Optional[Callable], *args):
+    """Invoke a streaming callback, awaiting it if it is a coroutine function"""
+    if callback:
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            await result
+
+def _pick_order(starter_choice: str, cathy: ConversableAgent, joe: ConversableAgent) -> List[ConversableAgent]:
+    """Determine the speaking order"""
+    if starter_choice == "Random":
+        return [cathy, joe] if random.random() < 0.5 else [joe, cathy]
+    elif starter_choice == "Cathy":
+        return [cathy, joe]
+    else:
+        return [joe, cathy]
+
+CRITIC_BATCH_MODES = ("line", "round", "show")
+
+async def run_improv_async(suggestion: str, rounds: int, starter_choice: str, llm_config: dict,
+                           on_comedian_line: Callable = None, on_critic_eval: Callable = None,
+                           on_comedian_token: Callable = None,
+                           pipeline_critic: bool = False, critic_batch: str = "line",
+                           ctx: Optional[CallContext] = None,
+                           agent_pool: Optional[AgentPool] = None,
+                           memory_budget: Optional[int] = None, memory_lines: int = 4,
+                           archive: Optional["ShowArchive"] = None,
+                           checkpoint: Optional[ShowLog] = None,
+                           candidates: int = 1, candidate_selector: str = "critic",
+                           candidate_budget_s: Optional[float] = None,
+                           prescorer: Optional["PreScorer"] = None,
+                           cancel: Optional[CancelToken] = None) -> ShowState:
+    """Run the full improv show on the event loop
+
+    Callbacks may be plain functions or coroutine functions. on_comedian_token(speaker,
+    token, round_idx) receives comedian text as it streams from the provider, before
+    on_comedian_line fires with the complete line. With pipeline_critic=True
+    each critic evaluation runs as a background task while the next comedian is already
+    generating. Feedback is applied to the first later turn it is ready for, and
+    on_critic_eval still fires in line order.
+
+    critic_batch picks how many lines go into one critic call: "line" (live feedback),
+    "round" (feedback lags by a round) or "show" (no feedback; best for offline runs).
+
+    ctx carries call-level settings such as a rate limiter shared across shows and
+    the retry policy; each show gets its own retry budget.
+    Agents are leased from agent_pool (the process-wide pool by default) and
+    returned when the show ends.
+
+    memory_budget (tokens) enables scene memory: comedians see the last memory_lines
+    lines verbatim plus a rolling summary of older ones instead of only the partner's
+    last line, at a flat per-turn prompt cost.
+
+    Every agent call and round is timed into state.metrics (a ShowMetrics that also
+    feeds the process-wide metrics registry).
+
+    With an archive, lines and evaluations are written to it as they happen and the
+    show is marked finished at the end; failed shows stay out of archive queries.
+
+    With a checkpoint (ShowLog), every line and recorded evaluation is appended to
+    its event log. If the log already holds events from an interrupted run, they
+    are replayed first (callbacks fire for them too) and the show continues from the
+    next turn; lines that were never evaluated are sent to the critic again. A log
+    whose show already ended is only replayed, and its state returned as is.
+
+    With candidates > 1 every comedian turn is best-of-N (see a_comedian_candidates):
+    the candidates are generated concurrently, candidate_selector ("critic" or
+    "heuristic") picks one within candidate_budget_s, and only that line is recorded
+    and passed to on_comedian_line. Comedian tokens are not streamed in this mode.
+
+    With a prescorer (PreScorer), lines are first scored locally; lines it is
+    confident about (empty lines, repeats, rambling) skip the LLM critic, and only
+    the rest are sent to it. Each LineEval records which tier scored it.
+
+    A cancel token (CancelToken) is checked before every turn and every agent call;
+    once it is cancelled the show stops with ShowCancelled and no new call is made.
+    Its checkpoint, if any, can still be resumed.
+    """
+    if critic_batch not in CRITIC_BATCH_MODES:
+        raise ValueError(f"critic_batch must be one of {CRITIC_BATCH_MODES}, got {critic_batch!r}")
+    if candidate_selector not in CANDIDATE_SELECTORS:
+        raise ValueError(f"candidate_selector must be one of {CANDIDATE_SELECTORS}, got {candidate_selector!r}")
+    if candidates > 1:
+        # Which candidate wins is only known once they have all finished
+        on_comedian_token = None
+
+    # Per-show copy of the call context so concurrent shows keep separate metrics
+    show_metrics = ShowMetrics()
+    ctx = replace(ctx, metrics=show_metrics) if ctx else CallContext(metrics=show_metrics)
+    ctx.retry_budget = (ctx.retry or default_retry_policy).new_budget()
+    ctx.cancel = cancel or ctx.cancel
+
+    pool = agent_pool or default_agent_pool
+    leased = []
+    succeeded = False
+    pending = deque()
+    try:
+        logger.info("Starting improv show with suggestion: %s", suggestion)
+        logger.debug("LLM Config: %s", llm_config)
+        logger.info("Rounds: %d", rounds)
+
+        # Lease agents from the pool (built only on first use)
+        # ag2 only honours "stream" per config_list entry (a top-level key is read as another endpoint)
+        comedian_config = llm_config
+        if on_comedian_token:
+            comedian_config = {**llm_config, "config_list": [{**entry, "stream": True}
+                                                             for entry in llm_config["config_list"]]}
+        cathy = pool.acquire("comedian", "Cathy", comedian_config)
+        leased.append(cathy)
+        joe = pool.acquire("comedian", "Joe", comedian_config)
+        leased.append(joe)
+        critic = pool.acquire("critic", "Critic", llm_config)
+        leased.append(critic)
+
+        replayed = checkpoint.events() if checkpoint else []
+        header = next((event for event in replayed if event["type"] == "show"), None)
+        ended = next((event for event in replayed if event["type"] == "end"), None)
+        if ended:
+            # The show already finished (and was archived then); only rebuild its state
+            archive = None
+        if header:
+            if not checkpoint.matches(suggestion, rounds):
+                raise ValueError(f"Checkpoint {checkpoint.path} is for a different show")
+            comedians = {"Cathy": cathy, "Joe": joe}
+            order = [comedians[name] for name in header["order"]]
+        else:
+            order = _pick_order(starter_choice, cathy, joe)
+            if checkpoint:
+                checkpoint.append("show", suggestion=suggestion, rounds=rounds,
+                                  order=[agent.name for agent in order])
+
+        # The state refers to agents by name only; the live agents stay local to this run
+        state = ShowState(
+            suggestion=suggestion,
+            rounds=rounds,
+            order=[agent.name for agent in order],
+            critic=critic.name,
+            memory=SceneMemory(memory_budget, memory_lines) if memory_budget else None,
+            metrics=show_metrics
+        )
+
+        show_id = archive.begin_show(suggestion, rounds) if archive else None
+
+        # Track last feedback for each comedian
+        last_feedback = {"Cathy": None, "Joe": None}
+
+        # Lines waiting to be sent to the critic as (speaker, line, round_idx)
+        batch = []
+
+        async def judge(entries: List[Tuple[str, str, int]]) -> List[LineEval]:
+            if len(entries) == 1:
+                speaker_name, line, line_round = entries[0]
+                return [await a_critic_judge_line(critic, speaker_name, line, suggestion, line_round, ctx)]
+            return await a_critic_judge_lines(critic, entries, suggestion, ctx)
+
+        async def evaluate(entries: List[Tuple[str, str, int]]) -> List[LineEval]:
+            if not prescorer:
+                return await judge(entries)
+            # Transcript index of each line, so it is only compared with what came before it
+            positions = [line_round * len(order) + state.order.index(name) for name, _, line_round in entries]
+            evals = prescorer.score(entries, [entry.text for entry in state.transcript], positions)
+            escalated = [i for i, line_eval in enumerate(evals) if line_eval is None]
+            if len(escalated) < len(entries):
+                _count(ctx, "critic_local", len(entries) - len(escalated))
+            if escalated:
+                _count(ctx, "critic_escalated", len(escalated))
+                judged = await judge([entries[i] for i in escalated])
+                for i, line_eval in zip(escalated, judged):
+                    evals[i] = line_eval
+            return evals
+
+        def apply_eval(speaker_name: str, line_eval: LineEval):
+            state.add_evaluation(line_eval)
+            last_feedback[speaker_name] = line_eval  # Store feedback
+            if archive:
+                archive.add_evaluation(show_id, speaker_name, line_eval)
+
+        def apply_line(speaker_name: str, line: str, round_idx: int):
+            state.add_line(speaker_name, line, round_idx)
+            if archive:
+                archive.add_line(show_id, speaker_name, line, round_idx)
+
+        async def record_evals(entries: List[Tuple[str, str, int]], evals: List[LineEval]):
+            for (speaker_name, _, _), line_eval in zip(entries, evals):
+                apply_eval(speaker_name, line_eval)
+                if checkpoint:
+                    checkpoint.append("eval", speaker=speaker_name, eval=asdict(line_eval))
+
+                # Callback for critic evaluation
+                await _notify(on_critic_eval, line_eval)
+
+        async def flush_batch():
+            nonlocal batch
+            if not batch:
+                return
+            entries, batch = batch, []
+            if pipeline_critic:
+                # Pending critic tasks in line order
+                pending.append((entries, asyncio.ensure_future(evaluate(entries))))
+            else:
+                await record_evals(entries, await evaluate(entries))
+
+        async def drain_evals(wait: bool):
+            while pending and (wait or pending[0][1].done()):
+                entries, task = pending.popleft()
+                await record_evals(entries, await task)
+
+        # Replay an interrupted run: every paid-for line and evaluation, in the original order
+        unevaluated = []
+        for event in replayed:
+            if event["type"] == "line":
+                apply_line(event["speaker"], event["text"], event["round"])
+                unevaluated.append((event["speaker"], event["text"], event["round"]))
+                state.wrapped = state.wrapped or event["terminated"]
+                await _notify(on_comedian_line, event["speaker"], event["text"], event["round"])
+            elif event["type"] == "eval":
+                line_eval = LineEval(**event["eval"])
+                apply_eval(event["speaker"], line_eval)
+                unevaluated = [entry for entry in unevaluated
+                               if (entry[0], entry[2]) != (event["speaker"], line_eval.round_idx)]
+                await _notify(on_critic_eval, line_eval)
+        if ended:
+            logger.info("Checkpoint %s holds a finished show; returning its state", checkpoint.path)
+            state.wrapped = ended["wrapped"]
+            succeeded = True
+            return state
+        if replayed:
+            logger.info("Resumed show from %s after %d lines", checkpoint.path, len(state.transcript))
+        for entry in unevaluated:
+            batch.append(entry)
+            if critic_batch == "line":
+                await flush_batch()
+
+        # Run rounds, starting at the first turn the checkpoint doesn't cover
+        done_turns = len(state.transcript)
+        first_round = rounds if state.wrapped else done_turns // len(order)
+        for round_idx in range(first_round, rounds):
+            round_started = time.perf_counter()
+            for position, speaker in enumerate(order):
+                if round_idx * len(order) + position < done_turns:
+                    continue
+
+                if ctx.cancel:
+                    ctx.cancel.raise_if_cancelled()
+
+                # Apply whatever feedback has arrived before this turn starts
+                await drain_evals(wait=False)
+                prior_line = state.transcript[-1].text if state.transcript else None
+
+                async def stream_token(token: str, name: str = speaker.name, idx: int = round_idx):
+                    await _notify(on_comedian_token, name, token, idx)
+
+                on_token = stream_token if on_comedian_token else None
+
+                feedback = last_feedback.get(speaker.name)
+                if candidates > 1:
+                    line, did_terminate = await a_comedian_candidates(
+                        speaker, state, prior_line, round_idx, feedback, ctx, candidates,
+                        candidate_selector, candidate_budget_s, critic)
+                else:
+                    line, did_terminate = await a_comedian_turn(speaker, state, prior_line, round_idx,
+                                                                feedback, ctx, on_token=on_token)
+                apply_line(speaker.name, line, round_idx)
+                if checkpoint:
+                    checkpoint.append("line", speaker=speaker.name, text=line, round=round_idx,
+                                      terminated=did_terminate)
+
+                # Callback for streaming
+                await _notify(on_comedian_line, speaker.name, line, round_idx)
+
+                # Evaluate
+                batch.append((speaker.name, line, round_idx))
+                if critic_batch == "line":
+                    await flush_batch()
+
+                if did_terminate:
+                    state.wrapped = True
+                    break
+
+            if critic_batch == "round":
+                await flush_batch()
+
+            show_metrics.record_round(time.perf_counter() - round_started)
+            if state.wrapped:
+                break
+
+        await flush_batch()
+        await drain_evals(wait=True)
+        if archive:
+            archive.finish_show(show_id, state.wrapped)
+        if checkpoint:
+            checkpoint.append("end", wrapped=state.wrapped)
+        succeeded = True
+        return state
+    except ShowCancelled as e:
+        logger.info("Show cancelled: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Error in run_improv: %s", e)
+        raise
+    finally:
+        show_metrics.finish()
+        for _, task in pending:
+            task.cancel()
+        if checkpoint:
+            checkpoint.close()
+        # Agents from a failed show may still have calls in flight; don't reuse them
+        for agent in leased:
+            pool.release(agent, reusable=succeeded)
+
+def _run_sync(coro):
+    """Run a coroutine to completion from synchronous code"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # Already inside an event loop (e.g. a notebook): use a private loop on a worker thread
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+def run_improv_streaming(suggestion: str, rounds: int, starter_choice: str, llm_config: dict,
+                        on_comedian_line: Callable = None, on_critic_eval: Callable = None,
+                        **options) -> ShowState:
+    """Run the full improv show with streaming callbacks (sync wrapper over run_improv_async)"""
+    return _run_sync(run_improv_async(suggestion, rounds, starter_choice, llm_config,
+                                      on_comedian_line=on_comedian_line,
+                                      on_critic_eval=on_critic_eval, **options))
+
+# Keep the original function for backward compatibility
+def run_improv(suggestion: str, rounds: int, starter_choice: str, llm_config: dict, **options) -> ShowState:
+    """Run the full improv show (non-streaming version)"""
+    return run_improv_streaming(suggestion, rounds, starter_choice, llm_config,
+                               on_comedian_line=None, on_critic_eval=None, **options)
+
+async def resume_show_async(checkpoint: ShowLog, llm_config: dict, **options) -> ShowState:
+    """Continue an interrupted show from its event log (see run_improv_async)"""
+    header = checkpoint.header()
+    if header is None:
+        raise ValueError(f"Checkpoint {checkpoint.path} has no show to resume")
+    return await run_improv_async(header["suggestion"], header["rounds"], header["order"][0], llm_config,
+                                  checkpoint=checkpoint, **options)
+
+def resume_show(checkpoint: ShowLog, llm_config: dict, **options) -> ShowState:
+    """Continue an interrupted show from its event log (sync wrapper)"""
+    return _run_sync(resume_show_async(checkpoint, llm_config, **options))
@@ -0,0 +1,91 @@
+import re
+import zlib
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from candidates import sentence_count
+from models import LineEval
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+def _hashed(grams: List[str], dims: int) -> List[int]:
+    return [zlib.crc32(gram.encode("utf-8")) % dims for gram in grams]
+
+def _vectorize(texts: Sequence[str], dims: int) -> np.ndarray:
+    """Binary hashed unigram + bigram feature rows, one per text"""
+    grams = np.zeros((len(texts), dims), dtype=np.float32)
+    for i, text in enumerate(texts):
+        words = _WORD.findall(text.lower())
+        bigrams = [f"{a} {b}" for a, b in zip(words, words[1:])]
+        grams[i, _hashed(words + bigrams, dims)] = 1.0
+    return grams
+
+@dataclass
+class PreScorer:
+    """Local first tier of the critic
+
+    Scores a batch of lines with NumPy on hashed word and bigram features: similarity
+    to every earlier transcript line, sentence count and length. Only lines that
+    clearly break the comedians' rules get a score directly: empty lines, near-repeats
+    of an earlier line, and rambling lines (more than max_sentences sentences or
+    max_words words). Everything else, including whether a line fits the suggestion
+    (word overlap can't tell a paraphrase from a miss), is left to the LLM critic.
+    Local evaluations carry tier="local".
+    """
+    repeat_similarity: float = 0.6
+    max_sentences: int = 3
+    max_words: int = 60
+    repeat_score: float = 1.0
+    rambling_score: float = 2.0
+    dims: int = 4096
+
+    def score(self, entries: List[Tuple[str, str, int]], transcript: Sequence[str],
+              positions: Sequence[int]) -> List[Optional[LineEval]]:
+        """Local evaluations for (speaker, line, round_idx) entries, None where the LLM should decide
+
+        positions[i] is the index of entry i in transcript; only earlier lines count
+        as context for it.
+        """
+        if not entries:
+            return []
+        lines = [line for _, line, _ in entries]
+        line_grams = _vectorize(lines, self.dims)
+        prior_grams = _vectorize(transcript, self.dims)
+
+        # Only lines said before each entry count as its context
+        earlier = np.arange(len(transcript))[None, :] < np.asarray(positions)[:, None]
+
+        shared = line_grams @ prior_grams.T
+        union = line_grams.sum(axis=1)[:, None] + prior_grams.sum(axis=1)[None, :] - shared
+        similarity = np.where(earlier, shared / np.maximum(union, 1.0), 0.0)
+        max_similarity = similarity.max(axis=1) if len(transcript) else np.zeros(len(lines))
+
+        words = np.array([len(_WORD.findall(line.lower())) for line in lines])
+        sentences = np.array([sentence_count(line) for line in lines])
+
+        repeat = max_similarity >= self.repeat_similarity
+        rambling = (sentences > self.max_sentences) | (words > self.max_words)
+
+        results: List[Optional[LineEval]] = []
+        for i, (speaker, line, round_idx) in enumerate(entries):
+            if words[i] == 0:
+                verdict = (0.0, "empty", "No line was delivered.")
+            elif repeat[i]:
+                verdict = (self.repeat_score, "repeat",
+                           f"Repeats an earlier line ({max_similarity[i]:.0%} overlap); build on the scene instead.")
+            elif rambling[i]:
+                verdict = (self.rambling_score, "too-long",
+                           f"{sentences[i]} sentences, {words[i]} words; keep it to 2 sentences.")
+            else:
+                results.append(None)
+                continue
+            score, tag, comments = verdict
+            results.append(LineEval(speaker=speaker.lower(), text=line, score=score, tags=[tag],
+                                    comments=comments, round_idx=round_idx, tier="local"))
+        logger.debug("Pre-scored %d of %d lines locally", sum(r is not None for r in results), len(results))
+        return results
@@ -0,0 +1,72 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute / 60` units per second"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)"""
+        # Never ask for more than a full bucket, or a large request would wait forever
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+class RateLimiter:
+    """Shared requests-per-minute / tokens-per-minute limiter for agent calls
+
+    One instance is meant to be shared by every show in a process. `acquire` waits
+    until both budgets allow the call; `consume` charges tokens only known afterwards
+    (e.g. the completion), which may push the token budget into debt.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 0):
+        """Wait for one request slot and `tokens` prompt tokens"""
+        if not self._requests and not self._tokens:
+            return
+
+        # Holding the lock while sleeping keeps waiters first-come, first-served
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = 0.0
+                if self._requests:
+                    self._requests.refill(now)
+                    wait = max(wait, self._requests.wait_time(1))
+                if self._tokens:
+                    self._tokens.refill(now)
+                    wait = max(wait, self._tokens.wait_time(tokens))
+                if wait <= 0:
+                    break
+                logger.debug("Rate limit reached, waiting %.2fs", wait)
+                await asyncio.sleep(wait)
+
+            if self._requests:
+                self._requests.level -= 1
+            if self._tokens:
+                self._tokens.level -= tokens
+
+    def consume(self, tokens: int):
+        """Charge tokens that were only known after the call completed"""
+        if self._tokens:
+            self._tokens.refill(time.monotonic())
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level - tokens)
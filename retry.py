@@ -0,0 +1,151 @@
+import math
+import random
+import asyncio
+import logging
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth another attempt: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429}
+_RETRYABLE_NAMES = ("Timeout", "RateLimit", "Connection", "ServiceUnavailable", "InternalServer")
+
+def status_of(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider error, if it carries one"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient (429, 5xx, timeouts, dropped connections)"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return any(part in type(error).__name__ for part in _RETRYABLE_NAMES)
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, if it said"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        value = headers.get("retry-after") if headers is not None else None
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class RetryBudget:
+    """Extra calls (retries and hedges) one show may still make"""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.spent = 0
+
+    def try_spend(self) -> bool:
+        if self.limit is not None and self.spent >= self.limit:
+            return False
+        self.spent += 1
+        return True
+
+@dataclass
+class RetryPolicy:
+    """How agent calls are retried, bounded and hedged
+
+    Each attempt gets deadline_s (None: only the client timeout applies). Retryable
+    errors back off exponentially from base_delay_s with full jitter, capped at
+    max_delay_s, and honour Retry-After. Every show gets a RetryBudget of
+    show_budget extra calls, shared by retries and hedges.
+
+    With hedge_quantile (e.g. 0.95), a non-streaming call still running after that
+    quantile of recent latencies for its kind gets a duplicate request, and whichever
+    returns first wins. Hedging starts once hedge_min_samples latencies are known.
+    One policy is meant to be shared by every show so the latency window warms up.
+    """
+    max_attempts: int = 3
+    base_delay_s: float = 0.5
+    max_delay_s: float = 8.0
+    deadline_s: Optional[float] = None
+    show_budget: Optional[int] = 8
+    hedge_quantile: Optional[float] = None
+    hedge_min_samples: int = 20
+    window: int = 500
+    _latencies: Dict[str, Deque[float]] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self):
+        self._latencies = defaultdict(lambda: deque(maxlen=self.window))
+
+    def new_budget(self) -> RetryBudget:
+        return RetryBudget(self.show_budget)
+
+    def observe(self, kind: str, latency_s: float):
+        """Record a successful call's latency for hedging decisions"""
+        with self._lock:
+            self._latencies[kind].append(latency_s)
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """Seconds after which a call of this kind is hedged, or None"""
+        if not self.hedge_quantile:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies[kind])
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(self.hedge_quantile * len(samples)) - 1)]
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Delay before retry number attempt + 1 (full jitter)"""
+        delay = random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            delay = max(delay, min(requested, 60.0))
+        return delay
+
+    async def with_deadline(self, call: Awaitable[Any]) -> Any:
+        if self.deadline_s is None:
+            return await call
+        return await asyncio.wait_for(call, self.deadline_s)
+
+    async def hedged(self, kind: str, attempt: Callable[[], Awaitable[Any]],
+                     budget: Optional[RetryBudget] = None,
+                     on_hedge: Optional[Callable[[str], None]] = None) -> Any:
+        """Run attempt(), racing a duplicate if it outlives the hedge delay
+
+        on_hedge is told "hedged" when a duplicate is sent and "hedge_won" if it
+        finished first.
+        """
+        delay = self.hedge_delay(kind)
+        if delay is None:
+            return await attempt()
+
+        first = asyncio.ensure_future(attempt())
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or (budget is not None and not budget.try_spend()):
+            return await first
+
+        logger.debug("Hedging %s call after %.2fs", kind, delay)
+        if on_hedge:
+            on_hedge("hedged")
+        second = asyncio.ensure_future(attempt())
+        tasks = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second and on_hedge:
+                            on_hedge("hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+# Used for calls whose CallContext sets no policy
+default_retry_policy = RetryPolicy()
@@ -0,0 +1,232 @@
+"""Per-call routing of agent calls across several endpoints/deployments.
+
+Endpoints are grouped into pools by agent role ("comedian", "critic", with
+"default" as the fallback), so e.g. the critic can use a cheaper deployment.
+For each call the pool picks the endpoint with the lowest expected wait: observed
+latency (EWMA) scaled by calls in flight, divided by weight and by the share of
+its tokens-per-minute quota left. Endpoints at their concurrency or quota limit
+are skipped, and endpoints that keep failing (or answer 429) cool down for a while.
+
+An endpoints file looks like:
+
+    {
+      "comedian": [
+        {"name": "east", "model": "gpt-4o-mini", "base_url": "https://east.openai.azure.com",
+         "api_key_env": "EAST_KEY", "api_version": "2024-08-01-preview",
+         "weight": 2, "max_concurrency": 16, "tokens_per_minute": 150000},
+        {"name": "west", "model": "gpt-4o-mini", "base_url": "https://west.openai.azure.com",
+         "api_key_env": "WEST_KEY", "api_version": "2024-08-01-preview"}
+      ],
+      "critic": [{"name": "cheap", "model": "gpt-4o-mini", "api_key_env": "OPENAI_API_KEY"}]
+    }
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config import make_llm_config
+from ratelimit import TokenBucket
+from retry import is_retryable, retry_after
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Endpoint:
+    """One deployment calls can be routed to"""
+    name: str
+    config: dict  # a config_list entry
+    weight: float = 1.0
+    max_concurrency: Optional[int] = None
+    tokens_per_minute: Optional[float] = None
+    requests_per_minute: Optional[float] = None
+
+class EndpointState:
+    """Live load, latency and health of one endpoint"""
+
+    def __init__(self, endpoint: Endpoint):
+        self.endpoint = endpoint
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.tokens = TokenBucket(endpoint.tokens_per_minute) if endpoint.tokens_per_minute else None
+        self.requests = TokenBucket(endpoint.requests_per_minute) if endpoint.requests_per_minute else None
+        self._client = None
+
+    @property
+    def name(self) -> str:
+        return self.endpoint.name
+
+    @property
+    def client(self):
+        """ag2 client for this endpoint, built on first use"""
+        if self._client is None:
+            from autogen import OpenAIWrapper
+            # Never let the SDK retry on its own; RetryPolicy and the cooldowns here decide
+            self._client = OpenAIWrapper(config_list=[{**self.endpoint.config, "max_retries": 0}])
+        return self._client
+
+    def available(self, now: float, tokens: int) -> bool:
+        if now < self.cooldown_until:
+            return False
+        limit = self.endpoint.max_concurrency
+        if limit is not None and self.in_flight >= limit:
+            return False
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket:
+                bucket.refill(now)
+                if bucket.wait_time(amount) > 0:
+                    return False
+        return True
+
+    def score(self, fallback_latency: float) -> float:
+        """Expected wait; lower is better"""
+        latency = self.latency_ewma if self.latency_ewma is not None else fallback_latency
+        score = latency * (1 + self.in_flight) / max(self.endpoint.weight, 1e-9)
+        if self.tokens:
+            score /= max(self.tokens.level / self.tokens.capacity, 0.05)
+        return score
+
+class EndpointPool:
+    """Chooses an endpoint per call among a set of deployments"""
+
+    def __init__(self, endpoints: List[Endpoint], cooldown_s: float = 30.0, failure_threshold: int = 3,
+                 latency_alpha: float = 0.2, poll_s: float = 0.05):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.states = [EndpointState(endpoint) for endpoint in endpoints]
+        self.cooldown_s = cooldown_s
+        self.failure_threshold = failure_threshold
+        self.latency_alpha = latency_alpha
+        self.poll_s = poll_s
+        # Shows may run on different event loops (one per Streamlit session), so use a thread lock
+        self._lock = threading.Lock()
+
+    def config_list(self) -> List[dict]:
+        """config_list entries of every endpoint in the pool"""
+        return [state.endpoint.config for state in self.states]
+
+    def _try_acquire(self, tokens: int) -> Optional[EndpointState]:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [state for state in self.states if state.available(now, tokens)]
+            if not candidates:
+                return None
+            known = [state.latency_ewma for state in self.states if state.latency_ewma is not None]
+            # Untried endpoints look as fast as the fastest known one, so they get explored
+            fallback = min(known) if known else 1.0
+            state = min(candidates, key=lambda s: s.score(fallback))
+            state.in_flight += 1
+            state.calls += 1
+            if state.requests:
+                state.requests.level -= 1
+            if state.tokens:
+                state.tokens.level -= tokens
+            return state
+
+    async def acquire(self, tokens: int = 0) -> EndpointState:
+        """Reserve a call (and its prompt tokens) on the best available endpoint"""
+        while True:
+            state = self._try_acquire(tokens)
+            if state is not None:
+                return state
+            with self._lock:
+                now = time.monotonic()
+                cooling = [s.cooldown_until - now for s in self.states if s.cooldown_until > now]
+            # Wait for a slot to free up, or for the first endpoint to come back from cooldown
+            wait = self.poll_s if len(cooling) < len(self.states) else min(cooling)
+            logger.debug("All endpoints busy, waiting %.2fs", wait)
+            await asyncio.sleep(wait)
+
+    def release(self, state: EndpointState, latency_s: float, error: Optional[BaseException] = None,
+                completed: bool = True):
+        """Return a call slot; completed calls update latency, transient errors update health
+
+        A call abandoned before it finished (e.g. the losing side of a hedge) took at
+        least latency_s, so it only ever raises the latency estimate.
+        """
+        with self._lock:
+            state.in_flight -= 1
+            if error is not None:
+                state.errors += 1
+                if not is_retryable(error):
+                    return
+                state.failures += 1
+                status = getattr(error, "status_code", None)
+                if status == 429 or state.failures >= self.failure_threshold:
+                    cooldown = retry_after(error) or self.cooldown_s
+                    state.cooldown_until = time.monotonic() + cooldown
+                    state.failures = 0
+                    logger.warning("Endpoint %s cooling down for %.0fs after %s", state.name, cooldown,
+                                   type(error).__name__)
+                return
+            if completed:
+                state.failures = 0
+            elif state.latency_ewma is not None and latency_s <= state.latency_ewma:
+                # An abandoned call's time is only a lower bound; this one says nothing new
+                return
+            alpha = self.latency_alpha
+            state.latency_ewma = (latency_s if state.latency_ewma is None
+                                  else alpha * latency_s + (1 - alpha) * state.latency_ewma)
+
+    def consume(self, state: EndpointState, tokens: int):
+        """Charge tokens only known after the call (completion, prompt estimate correction)"""
+        if state.tokens:
+            with self._lock:
+                state.tokens.refill(time.monotonic())
+                state.tokens.level = min(state.tokens.capacity, state.tokens.level - tokens)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {"endpoint": s.name, "calls": s.calls, "errors": s.errors, "in_flight": s.in_flight,
+                 "latency_ewma_s": s.latency_ewma, "cooling_down": s.cooldown_until > now}
+                for s in self.states
+            ]
+
+class EndpointRouter:
+    """Endpoint pools by agent role ("comedian", "critic"), with "default" as the fallback"""
+
+    def __init__(self, pools: Dict[str, EndpointPool]):
+        if not pools:
+            raise ValueError("The router needs at least one endpoint pool")
+        self.pools = pools
+
+    def pool_for(self, kind: str) -> EndpointPool:
+        """Pool for a call kind ("comedian", "critic", "critic_batch", ...)"""
+        role = "critic" if kind.startswith("critic") else "comedian"
+        return self.pools.get(role) or self.pools.get("default") or next(iter(self.pools.values()))
+
+    def stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {role: pool.stats() for role, pool in self.pools.items()}
+
+# Keys of an endpoints-file entry that configure routing rather than the client
+_ROUTING_KEYS = ("name", "weight", "max_concurrency", "tokens_per_minute", "requests_per_minute")
+
+def endpoint_from_dict(entry: dict) -> Endpoint:
+    """Build an Endpoint from an endpoints-file entry (api_key or api_key_env)"""
+    api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env", ""), "")
+    config = make_llm_config(model=entry["model"], api_key=api_key, base_url=entry.get("base_url", ""),
+                             api_version=entry.get("api_version", ""))["config_list"][0]
+    return Endpoint(
+        name=entry.get("name") or entry.get("base_url") or entry["model"],
+        config=config,
+        **{key: entry[key] for key in _ROUTING_KEYS[1:] if entry.get(key) is not None},
+    )
+
+def load_router(path: str, **pool_options) -> EndpointRouter:
+    """Read an endpoints file (see the module docstring)"""
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return EndpointRouter({
+        role: EndpointPool([endpoint_from_dict(entry) for entry in entries], **pool_options)
+        for role, entries in spec.items()
+    })
@@ -0,0 +1,29 @@
+"""Fast JSON encoding for exports, checkpoints and serialized show state.
+
+Uses orjson when it is installed and the standard library otherwise; both produce
+the same JSON (UTF-8, no ASCII escaping), so files written by one load with the other.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Encode obj as UTF-8 JSON bytes (compact, or indented by two spaces)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_text(obj: Any, indent: bool = False) -> str:
+    """dumps() as a str, for text files and HTTP bodies built from strings"""
+    return dumps(obj, indent).decode("utf-8")
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,541 @@
+"""Headless HTTP show server.
+
+Runs shows on one asyncio event loop in the background and streams their events
+to any number of viewers over Server-Sent Events. Every viewer of a show reads the
+same event log, so audiences of any size cost no extra model calls; viewers who
+join late or reconnect (Last-Event-ID) are replayed what they missed. At most
+max_shows shows run at once, up to max_queued more wait their turn, and further
+requests are turned away with 429.
+
+    python show_server.py --port 8080 --max-shows 8 --max-queued 64
+    curl -X POST localhost:8080/shows -d '{"suggestion": "airport security", "rounds": 4}'
+    curl -N localhost:8080/shows/<id>/events
+
+Endpoints:
+    POST /shows               start a show (JSON body, see SHOW_OPTIONS); 202 with its id
+    GET  /shows               recent shows and their status
+    GET  /shows/<id>          status, and the exported show once finished
+    GET  /shows/<id>/events   SSE stream: queued, started, token, line, eval, end or error
+    GET  /metrics             Prometheus metrics
+"""
+import sys
+import json
+import time
+import select
+import socket
+import uuid
+import queue
+import asyncio
+import logging
+import argparse
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib import request as urlrequest
+
+from calls import CallContext
+from candidates import CANDIDATE_SELECTORS
+from config import Config, make_llm_config
+from log_setup import setup_logging
+from metrics import registry
+from models import LineEval
+from orchestration import CRITIC_BATCH_MODES, run_improv_async
+from serialize import dumps, dumps_text
+from utils import show_export
+
+logger = logging.getLogger(__name__)
+
+# Request fields a client may set, with their types (see run_improv_async)
+SHOW_OPTIONS = {
+    "suggestion": str,
+    "rounds": int,
+    "starter": str,
+    "pipeline_critic": bool,
+    "critic_batch": str,
+    "memory_budget": int,
+    "candidates": int,
+    "candidate_selector": str,
+    "stream_tokens": bool,
+    "prescore": bool,
+}
+
+STATUSES = ("queued", "running", "finished", "failed")
+# How often an idle event stream checks whether its viewer has gone away
+DISCONNECT_POLL_S = 1.0
+TERMINAL_EVENTS = ("end", "error")
+
+class ServerBusy(Exception):
+    """Raised when the show queue is full"""
+
+class _Subscriber:
+    """One viewer's buffer of pending events"""
+
+    def __init__(self, buffer: int):
+        self.events: "queue.Queue[Dict]" = queue.Queue(maxsize=buffer)
+        # Set when the viewer fell too far behind; it reconnects and replays from its last event id
+        self.dropped = False
+
+class ShowChannel:
+    """Event log of one show, fanned out to every subscriber
+
+    Only the newest `history` events are kept for replay (a long streamed show emits
+    one event per token). A viewer resuming from an event that has been dropped first
+    gets an "events_dropped" event with the number it missed; the final "end" event
+    still carries the whole exported show.
+    """
+
+    def __init__(self, show_id: str, options: Dict[str, Any], subscriber_buffer: int = 1024,
+                 history: int = 4096):
+        self.id = show_id
+        self.options = options
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.export: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.subscriber_buffer = subscriber_buffer
+        self._events: Deque[Dict] = deque(maxlen=history)
+        self._published = 0
+        self._subscribers: List[_Subscriber] = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("finished", "failed")
+
+    def publish(self, event_type: str, **data):
+        """Append an event and hand it to every subscriber"""
+        with self._lock:
+            self._published += 1
+            event = {"id": self._published, "type": event_type, **data}
+            self._events.append(event)
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.events.put_nowait(event)
+                except queue.Full:
+                    subscriber.dropped = True
+                    self._subscribers.remove(subscriber)
+
+    def subscribe(self, after_id: int = 0) -> Tuple[List[Dict], Optional[_Subscriber]]:
+        """Events after after_id, plus a live subscription unless the show is over"""
+        with self._lock:
+            first_id = self._events[0]["id"] if self._events else self._published + 1
+            backlog = list(islice(self._events, max(0, after_id - first_id + 1), None))
+            if after_id < first_id - 1:
+                backlog.insert(0, {"id": first_id - 1, "type": "events_dropped", "count": first_id - 1 - after_id})
+            if backlog and backlog[-1]["type"] in TERMINAL_EVENTS:
+                return backlog, None
+            subscriber = _Subscriber(self.subscriber_buffer)
+            self._subscribers.append(subscriber)
+            return backlog, subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    @property
+    def events_dropped(self) -> int:
+        """Events no longer available for replay"""
+        with self._lock:
+            return self._published - len(self._events)
+
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "suggestion": self.options["suggestion"],
+            "rounds": self.options.get("rounds"),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "events": self._published,
+            "events_dropped": self.events_dropped,
+            "subscribers": self.subscribers,
+            "error": self.error,
+        }
+
+def _eval_event(line_eval: LineEval) -> dict:
+    """Evaluation in the export format"""
+    data = asdict(line_eval)
+    data["round"] = data.pop("round_idx") + 1
+    return data
+
+class ShowServer:
+    """Runs submitted shows on a background event loop with a concurrency limit
+
+    One process-wide CallContext (rate limiter, router, retry policy) and agent pool
+    are shared by every show, so limits hold across the whole server.
+    """
+
+    def __init__(self, llm_config: dict, ctx: Optional[CallContext] = None, max_shows: int = 4,
+                 max_queued: int = 64, max_rounds: int = 16, max_candidates: int = 5,
+                 keep_finished: int = 256, subscriber_buffer: int = 1024, event_history: int = 4096,
+                 archive=None):
+        self.llm_config = llm_config
+        self.ctx = ctx
+        self.max_shows = max_shows
+        self.max_queued = max_queued
+        self.max_rounds = max_rounds
+        self.max_candidates = max_candidates
+        self.keep_finished = keep_finished
+        self.subscriber_buffer = subscriber_buffer
+        self.event_history = event_history
+        self.archive = archive
+        self._channels: "OrderedDict[str, ShowChannel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._thread: Optional[threading.Thread] = None
+        self._prescorer = None
+
+    def start(self) -> "ShowServer":
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._slots = asyncio.Semaphore(self.max_shows)
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="show-loop", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """Cancel running and queued shows, let them publish their error, then stop the event loop"""
+        async def shutdown():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._loop.stop()
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def validate(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Checked show options from a request body; raises ValueError"""
+        unknown = set(body) - set(SHOW_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        for key, value in body.items():
+            expected = SHOW_OPTIONS[key]
+            if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+                raise ValueError(f"{key} must be {expected.__name__}")
+        suggestion = body.get("suggestion", "").strip()
+        if not suggestion:
+            raise ValueError("suggestion is required")
+        options = {"rounds": 4, "starter": "Random", **body, "suggestion": suggestion}
+        if not 1 <= options["rounds"] <= self.max_rounds:
+            raise ValueError(f"rounds must be between 1 and {self.max_rounds}")
+        if options["starter"] not in ("Random", "Cathy", "Joe"):
+            raise ValueError("starter must be Random, Cathy or Joe")
+        if options.get("critic_batch", "line") not in CRITIC_BATCH_MODES:
+            raise ValueError(f"critic_batch must be one of {', '.join(CRITIC_BATCH_MODES)}")
+        if options.get("candidate_selector", "critic") not in CANDIDATE_SELECTORS:
+            raise ValueError(f"candidate_selector must be one of {', '.join(CANDIDATE_SELECTORS)}")
+        if not 1 <= options.get("candidates", 1) <= self.max_candidates:
+            raise ValueError(f"candidates must be between 1 and {self.max_candidates}")
+        if options.get("memory_budget", 1) < 1:
+            raise ValueError("memory_budget must be positive")
+        return options
+
+    def submit(self, options: Dict[str, Any]) -> ShowChannel:
+        """Queue a show; raises ServerBusy when max_queued shows are already waiting"""
+        with self._lock:
+            waiting = sum(1 for channel in self._channels.values() if channel.status == "queued")
+            if waiting >= self.max_queued:
+                raise ServerBusy(f"{waiting} shows already waiting")
+            channel = ShowChannel(uuid.uuid4().hex[:12], options, self.subscriber_buffer, self.event_history)
+            self._channels[channel.id] = channel
+        channel.publish("queued", position=waiting + 1)
+        asyncio.run_coroutine_threadsafe(self._run(channel), self._loop)
+        return channel
+
+    def get(self, show_id: str) -> Optional[ShowChannel]:
+        with self._lock:
+            return self._channels.get(show_id)
+
+    def channels(self) -> List[ShowChannel]:
+        with self._lock:
+            return list(self._channels.values())
+
+    def _evict(self):
+        """Forget the oldest finished shows nobody is watching beyond keep_finished"""
+        with self._lock:
+            finished = [c for c in self._channels.values() if c.done and not c.subscribers]
+            for channel in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._channels[channel.id]
+
+    def _show_kwargs(self, channel: ShowChannel) -> Dict[str, Any]:
+        options = dict(channel.options)
+        for key in ("suggestion", "rounds", "starter", "stream_tokens", "prescore"):
+            options.pop(key, None)
+        if channel.options.get("stream_tokens"):
+            def on_comedian_token(speaker: str, token: str, round_idx: int):
+                channel.publish("token", speaker=speaker, token=token, round=round_idx + 1)
+            options["on_comedian_token"] = on_comedian_token
+        if channel.options.get("prescore"):
+            if self._prescorer is None:
+                from prescore import PreScorer
+                self._prescorer = PreScorer()
+            options["prescorer"] = self._prescorer
+        return options
+
+    async def _run(self, channel: ShowChannel):
+        try:
+            async with self._slots:
+                channel.status = "running"
+                channel.publish("started")
+                options = channel.options
+                try:
+                    state = await run_improv_async(
+                        options["suggestion"], options["rounds"], options["starter"], self.llm_config,
+                        on_comedian_line=lambda speaker, line, round_idx: channel.publish(
+                            "line", speaker=speaker, text=line, round=round_idx + 1),
+                        on_critic_eval=lambda line_eval: channel.publish("eval", **_eval_event(line_eval)),
+                        ctx=self.ctx, archive=self.archive, **self._show_kwargs(channel),
+                    )
+                    channel.export = show_export(state)
+                    channel.status = "finished"
+                    channel.publish("end", show=channel.export)
+                except Exception as e:
+                    logger.error("Show %s failed: %s", channel.id, e)
+                    channel.status = "failed"
+                    channel.error = f"{type(e).__name__}: {e}"
+                    channel.publish("error", message=channel.error)
+        except asyncio.CancelledError:
+            # Queued shows are cancelled while waiting for a slot
+            channel.status = "failed"
+            channel.error = "Server shutting down"
+            channel.publish("error", message=channel.error)
+            raise
+        finally:
+            channel.finished_at = time.time()
+        self._evict()
+
+    def to_prometheus(self) -> str:
+        """Server gauges followed by the process-wide metrics"""
+        channels = self.channels()
+        lines = ["# TYPE improv_server_shows gauge"]
+        for status in STATUSES:
+            count = sum(1 for c in channels if c.status == status)
+            lines.append(f'improv_server_shows{{status="{status}"}} {count}')
+        lines.append("# TYPE improv_server_subscribers gauge")
+        lines.append(f"improv_server_subscribers {sum(c.subscribers for c in channels)}")
+        return "\n".join(lines) + "\n" + registry.to_prometheus()
+
+def _sse(event: Dict) -> bytes:
+    data = {k: v for k, v in event.items() if k not in ("id", "type")}
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {dumps_text(data)}\n\n".encode("utf-8")
+
+def _make_handler(server: ShowServer, keepalive_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: Any):
+            body = dumps(payload)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _parts(self) -> List[str]:
+            return [part for part in self.path.split("?")[0].split("/") if part]
+
+        def do_POST(self):
+            if self._parts() != ["shows"]:
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("Body must be a JSON object")
+                channel = server.submit(server.validate(body))
+            except ServerBusy as e:
+                self._send_json(429, {"error": str(e)})
+                return
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(202, {**channel.summary(), "events_url": f"/shows/{channel.id}/events"})
+
+        def do_GET(self):
+            parts = self._parts()
+            if parts == ["metrics"]:
+                body = server.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif parts == ["shows"]:
+                self._send_json(200, [channel.summary() for channel in reversed(server.channels())])
+            elif len(parts) in (2, 3) and parts[0] == "shows" and parts[2:] in ([], ["events"]):
+                channel = server.get(parts[1])
+                if channel is None:
+                    self._send_json(404, {"error": "no such show"})
+                elif len(parts) == 3:
+                    self._stream(channel)
+                else:
+                    self._send_json(200, {**channel.summary(), "show": channel.export})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _disconnected(self) -> bool:
+            """Whether the viewer closed its side (an SSE client never sends after the request)"""
+            try:
+                readable, _, _ = select.select([self.connection], [], [], 0)
+                return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+            except (OSError, ValueError):
+                return True
+
+        def _stream(self, channel: ShowChannel):
+            try:
+                after = int(self.headers.get("Last-Event-ID", 0))
+            except ValueError:
+                after = 0
+            backlog, subscriber = channel.subscribe(after)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                for event in backlog:
+                    self.wfile.write(_sse(event))
+                self.wfile.flush()
+                last_write = time.monotonic()
+                while subscriber is not None:
+                    try:
+                        event = subscriber.events.get(timeout=min(keepalive_s, DISCONNECT_POLL_S))
+                    except queue.Empty:
+                        if subscriber.dropped or self._disconnected():
+                            break
+                        if time.monotonic() - last_write >= keepalive_s:
+                            # Comment line; keeps proxies from timing out an idle stream
+                            self.wfile.write(b": keepalive\n\n")
+                            self.wfile.flush()
+                            last_write = time.monotonic()
+                        continue
+                    self.wfile.write(_sse(event))
+                    self.wfile.flush()
+                    last_write = time.monotonic()
+                    if event["type"] in TERMINAL_EVENTS:
+                        break
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug("Viewer of show %s disconnected", channel.id)
+            finally:
+                if subscriber is not None:
+                    channel.unsubscribe(subscriber)
+
+        def log_message(self, format, *args):
+            logger.debug("show-server: " + format, *args)
+
+    return Handler
+
+def serve(show_server: ShowServer, host: str = "127.0.0.1", port: int = 8080,
+          keepalive_s: float = 15.0) -> ThreadingHTTPServer:
+    """HTTP front end for a started ShowServer (call serve_forever on the result)"""
+    httpd = ThreadingHTTPServer((host, port), _make_handler(show_server, keepalive_s))
+    httpd.daemon_threads = True
+    return httpd
+
+def start_show(base_url: str, suggestion: str, timeout: float = 10.0, **options) -> dict:
+    """Client helper: submit a show and return its summary (including its id)"""
+    body = json.dumps({"suggestion": suggestion, **options}).encode("utf-8")
+    req = urlrequest.Request(f"{base_url.rstrip('/')}/shows", data=body, method="POST",
+                             headers={"Content-Type": "application/json"})
+    with urlrequest.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def stream_events(base_url: str, show_id: str, last_event_id: int = 0,
+                  timeout: float = 60.0) -> Iterator[Dict]:
+    """Client helper: yield a show's events ({"id", "type", ...}) until it ends"""
+    req = urlrequest.Request(f"{base_url.rstrip('/')}/shows/{show_id}/events",
+                             headers={"Last-Event-ID": str(last_event_id)})
+    with urlrequest.urlopen(req, timeout=timeout) as response:
+        event: Dict[str, Any] = {}
+        for raw in response:
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if not line:
+                if "type" in event:
+                    yield event
+                    if event["type"] in TERMINAL_EVENTS:
+                        return
+                event = {}
+            elif line.startswith("id: "):
+                event["id"] = int(line[4:])
+            elif line.startswith("event: "):
+                event["type"] = line[7:]
+            elif line.startswith("data: "):
+                event.update(json.loads(line[6:]))
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve improv shows over HTTP with SSE event streams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-shows", type=int, default=4, help="Shows running at once")
+    parser.add_argument("--max-queued", type=int, default=64, help="Shows waiting before requests get 429")
+    parser.add_argument("--keep-finished", type=int, default=256, help="Finished shows kept for late viewers")
+    parser.add_argument("--event-history", type=int, default=4096,
+                        help="Events per show kept for replay to late or reconnecting viewers")
+    parser.add_argument("--rpm", type=float, default=None, help="Server-wide requests-per-minute limit")
+    parser.add_argument("--tpm", type=float, default=None, help="Server-wide tokens-per-minute limit")
+    parser.add_argument("--endpoints", default=None,
+                        help="JSON file of endpoints to route calls across (see router.py)")
+    parser.add_argument("--archive", default=None, help="Also write shows to this SQLite show archive")
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--base-url", default=None)
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level)
+    env_config = Config()
+    llm_config = make_llm_config(
+        model=args.model or env_config.model,
+        api_key=env_config.api_key,
+        base_url=args.base_url if args.base_url is not None else env_config.endpoint,
+        api_version=env_config.api_version,
+        timeout=args.timeout,
+        seed=args.seed,
+    )
+
+    from ratelimit import RateLimiter
+    from router import load_router
+    endpoints = args.endpoints or env_config.endpoints_path
+    ctx = CallContext(limiter=RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm),
+                      router=load_router(endpoints) if endpoints else None)
+    archive = None
+    if args.archive:
+        from archive import ShowArchive
+        archive = ShowArchive(args.archive)
+
+    show_server = ShowServer(llm_config, ctx=ctx, max_shows=args.max_shows, max_queued=args.max_queued,
+                             keep_finished=args.keep_finished, event_history=args.event_history,
+                             archive=archive).start()
+    httpd = serve(show_server, args.host, args.port)
+    print(f"Serving shows on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        show_server.stop()
+        if archive:
+            archive.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
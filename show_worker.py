@@ -0,0 +1,101 @@
+import queue
+import asyncio
+import logging
+import threading
+import traceback
+from typing import List, Optional, Tuple
+
+from calls import CancelToken, ShowCancelled
+from models import LineEval, ShowState
+
+logger = logging.getLogger(__name__)
+
+class ShowWorker:
+    """Runs one show on a background thread and queues its events for a UI to poll
+
+    Events are tuples: ("token", speaker, token, round_idx), ("line", speaker, line,
+    round_idx) and ("eval", LineEval). cancel() stops the show before its next agent
+    call and abandons the one in flight; with idle_timeout_s the show also stops by
+    itself once the UI stops calling drain() (e.g. the browser tab was closed).
+    """
+
+    def __init__(self, suggestion: str, rounds: int, starter: str, llm_config: dict,
+                 stream_tokens: bool = False, idle_timeout_s: Optional[float] = None, **options):
+        self.suggestion = suggestion
+        self.rounds = rounds
+        self.starter = starter
+        self.llm_config = llm_config
+        self.stream_tokens = stream_tokens
+        self.options = options
+        self.token = CancelToken(idle_timeout_s)
+        self.state: Optional[ShowState] = None
+        self.error: Optional[BaseException] = None
+        self.traceback: Optional[str] = None
+        self._events: "queue.Queue[Tuple]" = queue.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread = threading.Thread(target=self._run, name="show-worker", daemon=True)
+
+    def start(self) -> "ShowWorker":
+        self._thread.start()
+        return self
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def cancelled(self) -> bool:
+        return isinstance(self.error, (ShowCancelled, asyncio.CancelledError))
+
+    def cancel(self, reason: str = "Stopped by user"):
+        """Stop the show: no new calls start, and the current one is no longer awaited"""
+        self.token.cancel(reason)
+        loop, task = self._loop, self._task
+        if loop is not None and task is not None:
+            loop.call_soon_threadsafe(task.cancel)
+
+    def drain(self) -> List[Tuple]:
+        """Events queued since the last call; also counts as a viewer heartbeat"""
+        self.token.touch()
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def join(self, timeout: Optional[float] = None):
+        self._thread.join(timeout)
+
+    async def _main(self) -> ShowState:
+        from orchestration import run_improv_async
+
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+
+        def on_comedian_token(speaker: str, token: str, round_idx: int):
+            self._events.put(("token", speaker, token, round_idx))
+
+        def on_comedian_line(speaker: str, line: str, round_idx: int):
+            self._events.put(("line", speaker, line, round_idx))
+
+        def on_critic_eval(line_eval: LineEval):
+            self._events.put(("eval", line_eval))
+
+        return await run_improv_async(
+            self.suggestion, self.rounds, self.starter, self.llm_config,
+            on_comedian_line=on_comedian_line, on_critic_eval=on_critic_eval,
+            on_comedian_token=on_comedian_token if self.stream_tokens else None,
+            cancel=self.token, **self.options,
+        )
+
+    def _run(self):
+        try:
+            self.state = asyncio.run(self._main())
+        except BaseException as e:
+            # CancelledError is a BaseException; keep it so callers can tell a stop from a failure
+            self.error = e
+            self.traceback = traceback.format_exc()
+            if not self.cancelled:
+                logger.error("Show worker failed: %s", e)
@@ -0,0 +1,107 @@
+"""Cold-start and rerun latency of the Streamlit app.
+
+Runs app.py headlessly with Streamlit's AppTest harness. Cold start is measured in
+fresh interpreters (imports plus the first script run); rerun latency is measured
+by toggling a sidebar widget in one session, which is what users do while setting
+up a show. Also reports whether heavy modules were loaded before any show ran.
+
+    python startup_benchmark.py -o startup.json
+    python startup_benchmark.py --max-cold-s 3 --max-rerun-ms 150
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from typing import List
+
+from metrics import percentiles
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Modules that should only load once a show runs or results are displayed
+HEAVY_MODULES = ("autogen", "openai", "pandas", "pydantic")
+
+_COLD_START = """
+import sys, json, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=60)
+app.run()
+finished = time.perf_counter()
+print(json.dumps({
+    "streamlit_import_s": imported - started,
+    "first_run_s": finished - imported,
+    "total_s": finished - started,
+    "exceptions": [str(e.value) for e in app.exception],
+    "heavy_loaded": [m for m in sys.argv[2].split(",") if m in sys.modules],
+}))
+"""
+
+def measure_cold_start(runs: int) -> dict:
+    """Start the app in fresh interpreters and time imports plus the first run"""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", _COLD_START, APP_PATH, ",".join(HEAVY_MODULES)],
+                                capture_output=True, text=True, check=True)
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        "runs": runs,
+        "total_s": percentiles(s["total_s"] for s in samples),
+        "first_run_s": percentiles(s["first_run_s"] for s in samples),
+        "streamlit_import_s": percentiles(s["streamlit_import_s"] for s in samples),
+        "heavy_loaded": sorted({m for s in samples for m in s["heavy_loaded"]}),
+        "exceptions": sorted({e for s in samples for e in s["exceptions"]}),
+    }
+
+def measure_reruns(runs: int) -> dict:
+    """Time reruns triggered by sidebar widget changes in one session"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.run()
+    durations: List[float] = []
+    for i in range(runs):
+        checkbox = app.sidebar.checkbox[i % len(app.sidebar.checkbox)]
+        checkbox.set_value(not checkbox.value)
+        started = time.perf_counter()
+        app.run()
+        durations.append(time.perf_counter() - started)
+    return {
+        "runs": runs,
+        "rerun_ms": {k: v * 1000 for k, v in percentiles(durations).items()},
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure Streamlit cold start and rerun latency")
+    parser.add_argument("-o", "--output", default=None, help="Write JSON results here (default: stdout)")
+    parser.add_argument("--cold-runs", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=50)
+    parser.add_argument("--max-cold-s", type=float, default=None, help="Fail if p50 cold start exceeds this")
+    parser.add_argument("--max-rerun-ms", type=float, default=None, help="Fail if p95 rerun latency exceeds this")
+    args = parser.parse_args(argv)
+
+    results = {"cold_start": measure_cold_start(args.cold_runs), "rerun": measure_reruns(args.reruns)}
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    failures = []
+    cold_p50 = results["cold_start"]["total_s"]["p50"]
+    if args.max_cold_s is not None and cold_p50 > args.max_cold_s:
+        failures.append(f"cold start p50 {cold_p50:.2f}s > {args.max_cold_s:.2f}s")
+    rerun_p95 = results["rerun"]["rerun_ms"]["p95"]
+    if args.max_rerun_ms is not None and rerun_p95 > args.max_rerun_ms:
+        failures.append(f"rerun p95 {rerun_p95:.1f}ms > {args.max_rerun_ms:.1f}ms")
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+from array import array
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from models import LineEval
+
+class _SpeakerStats:
+    """Running sum/count/min/max for one speaker"""
+    __slots__ = ("total", "count", "low", "high")
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self.low = float("inf")
+        self.high = float("-inf")
+
+    def add(self, score: float):
+        self.total += score
+        self.count += 1
+        self.low = min(self.low, score)
+        self.high = max(self.high, score)
+
+class ScoreStats:
+    """Incrementally maintained score aggregates for one or more shows
+
+    add() is O(1) per evaluation. Evaluations are also kept column by column
+    (scores and rounds in typed arrays) so to_dataframe() builds the table
+    directly from columns instead of per-row dicts.
+    """
+
+    def __init__(self):
+        self._speakers: Dict[str, _SpeakerStats] = {}
+        self._last: Dict[str, "LineEval"] = {}
+        self.tag_counts: Counter = Counter()
+        self.best: Optional["LineEval"] = None
+
+        # Columnar store, one entry per evaluation
+        self._rounds = array("i")
+        self._scores = array("d")
+        self._speaker_col: List[str] = []
+        self._tags_col: List[str] = []
+        self._comments_col: List[str] = []
+        self._text_col: List[str] = []
+        self._tier_col: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def add(self, line_eval: "LineEval"):
+        """Fold one evaluation into the running aggregates"""
+        speaker = line_eval.speaker.capitalize()
+        self._speakers.setdefault(speaker, _SpeakerStats()).add(line_eval.score)
+        self._last[speaker.lower()] = line_eval
+        self.tag_counts.update(line_eval.tags)
+
+        # Strictly greater keeps the first of equal scores, like max()
+        if self.best is None or line_eval.score > self.best.score:
+            self.best = line_eval
+
+        self._rounds.append(line_eval.round_idx + 1)
+        self._scores.append(line_eval.score)
+        self._speaker_col.append(speaker)
+        self._tags_col.append(", ".join(line_eval.tags))
+        self._comments_col.append(line_eval.comments)
+        self._text_col.append(line_eval.text)
+        self._tier_col.append(line_eval.tier)
+
+    def merge(self, other: "ScoreStats"):
+        """Fold another show's aggregates into this one"""
+        for speaker, theirs in other._speakers.items():
+            mine = self._speakers.setdefault(speaker, _SpeakerStats())
+            mine.total += theirs.total
+            mine.count += theirs.count
+            mine.low = min(mine.low, theirs.low)
+            mine.high = max(mine.high, theirs.high)
+        self._last.update(other._last)
+        self.tag_counts.update(other.tag_counts)
+        if other.best is not None and (self.best is None or other.best.score > self.best.score):
+            self.best = other.best
+
+        self._rounds.extend(other._rounds)
+        self._scores.extend(other._scores)
+        self._speaker_col.extend(other._speaker_col)
+        self._tags_col.extend(other._tags_col)
+        self._comments_col.extend(other._comments_col)
+        self._text_col.extend(other._text_col)
+        self._tier_col.extend(other._tier_col)
+
+    def averages(self) -> Dict[str, float]:
+        """Average score by speaker"""
+        return {speaker: s.total / s.count for speaker, s in self._speakers.items() if s.count > 0}
+
+    def speaker_summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, mean, min and max score by speaker"""
+        return {
+            speaker: {"count": s.count, "mean": s.total / s.count, "min": s.low, "max": s.high}
+            for speaker, s in self._speakers.items() if s.count > 0
+        }
+
+    def last_feedback(self, speaker: str) -> Optional["LineEval"]:
+        """Most recent evaluation for a speaker"""
+        return self._last.get(speaker.lower())
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """Evaluations table, one row per judged line"""
+        import pandas as pd
+
+        return pd.DataFrame({
+            "round": pd.Series(self._rounds, dtype="int64"),
+            "speaker": self._speaker_col,
+            "score": pd.Series(self._scores, dtype="float64"),
+            "tags": self._tags_col,
+            "comments": self._comments_col,
+            "text": self._text_col,
+            "tier": self._tier_col,
+        })
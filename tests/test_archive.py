@@ -0,0 +1,48 @@
+import sqlite3
+
+from archive import ShowArchive
+from models import LineEval
+
+def _eval(score: float, tags, round_idx: int = 0) -> LineEval:
+    return LineEval(speaker="cathy", text="First line", score=score, tags=tags, comments="", round_idx=round_idx)
+
+def _finished_show(archive: ShowArchive, score: float) -> int:
+    show_id = archive.begin_show("airport security", 1)
+    archive.add_line(show_id, "Cathy", "First line", 0)
+    archive.add_evaluation(show_id, "Cathy", _eval(score, ["wordplay"]))
+    archive.finish_show(show_id, wrapped=False)
+    return show_id
+
+def test_re_archiving_a_line_does_not_duplicate_tags(tmp_path):
+    archive = ShowArchive(str(tmp_path / "shows.sqlite"))
+    show_id = archive.begin_show("airport security", 1)
+    archive.add_line(show_id, "Cathy", "First line", 0)
+    archive.add_evaluation(show_id, "Cathy", _eval(7, ["wordplay", "Wordplay"]))
+    archive.add_evaluation(show_id, "Cathy", _eval(8, ["wordplay", "callback"]))
+    archive.finish_show(show_id, wrapped=False)
+
+    rows = archive._conn.execute("SELECT tag FROM line_tags ORDER BY tag").fetchall()
+    assert [row["tag"] for row in rows] == ["callback", "wordplay"]
+    assert len(archive.search_lines(tag="wordplay")) == 1
+
+def test_old_line_tags_table_is_migrated(tmp_path):
+    path = str(tmp_path / "shows.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript("CREATE TABLE line_tags (show_id INTEGER NOT NULL, round INTEGER NOT NULL, "
+                       "speaker TEXT NOT NULL, tag TEXT NOT NULL);"
+                       "INSERT INTO line_tags VALUES (1, 0, 'cathy', 'pun'), (1, 0, 'cathy', 'pun');")
+    conn.commit()
+    conn.close()
+
+    archive = ShowArchive(path)
+    assert archive._conn.execute("SELECT COUNT(*) FROM line_tags").fetchone()[0] == 1
+
+def test_last_shows_counts_only_finished_shows(tmp_path):
+    archive = ShowArchive(str(tmp_path / "shows.sqlite"))
+    finished = _finished_show(archive, 6)
+    # Aborted shows never finish but still take ids
+    for _ in range(3):
+        archive.begin_show("airport security", 1)
+
+    rows = archive.search_lines(last_shows=1)
+    assert [row["show_id"] for row in rows] == [finished]
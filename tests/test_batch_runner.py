@@ -0,0 +1,35 @@
+from collections import Counter
+
+from batch_runner import checkpoint_log, remaining_suggestions
+
+def _started(directory, suggestion, occurrence, rounds=4, starter="Random", ended=False):
+    log = checkpoint_log(str(directory), suggestion, rounds, starter, occurrence)
+    log.append("show", suggestion=suggestion, rounds=rounds, order=["Cathy", "Joe"])
+    if ended:
+        log.append("end", wrapped=False)
+    log.close()
+    return log
+
+def test_occurrences_are_numbered_over_the_whole_input():
+    suggestions = ["A", "B", "A", "A"]
+    assert remaining_suggestions(suggestions, Counter()) == [("A", 1), ("B", 1), ("A", 2), ("A", 3)]
+    # Without logs the output can't say which occurrence finished; the first ones are assumed done
+    assert remaining_suggestions(suggestions, Counter({"A": 1})) == [("B", 1), ("A", 2), ("A", 3)]
+
+def test_interrupted_occurrences_resume_first(tmp_path):
+    # #2 finished (its log was deleted), #1 and #3 were interrupted
+    _started(tmp_path, "A", 1)
+    _started(tmp_path, "A", 3)
+    assert remaining_suggestions(["A", "A", "A"], Counter({"A": 1}), str(tmp_path)) == [("A", 1), ("A", 3)]
+
+def test_finished_log_left_behind_is_discarded(tmp_path):
+    finished = _started(tmp_path, "A", 1, ended=True)
+    _started(tmp_path, "A", 2)
+    assert remaining_suggestions(["A", "A"], Counter({"A": 1}), str(tmp_path)) == [("A", 2)]
+    assert not finished.exists
+
+def test_logs_are_keyed_on_rounds_and_starter(tmp_path):
+    log = _started(tmp_path, "A", 1, rounds=4)
+    assert not checkpoint_log(str(tmp_path), "A", 6, "Random", 1).exists
+    assert not checkpoint_log(str(tmp_path), "A", 4, "Joe", 1).exists
+    assert log.matches("A", 4) and not log.matches("A", 6)
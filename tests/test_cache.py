@@ -0,0 +1,36 @@
+import pytest
+
+from cache import CacheMiss, ResponseCache
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_bytes=30)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    cache.put("c", "z" * 10)
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") == "x" * 10
+    cache.put("d", "w" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10
+    assert cache.get("c") == "z" * 10
+    assert cache.get("d") == "w" * 10
+    assert cache.stats()["bytes"] == 30
+
+def test_hit_order_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, max_bytes=20)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    cache.get("a")
+    cache.close()
+
+    reopened = ResponseCache(path, max_bytes=20)
+    reopened.put("c", "z" * 10)
+    assert reopened.get("b") is None
+    assert reopened.get("a") == "x" * 10
+
+def test_replay_only_raises_on_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), replay_only=True)
+    with pytest.raises(CacheMiss):
+        cache.get("missing")
@@ -0,0 +1,113 @@
+import pytest
+
+from checkpoint import ShowLog
+
+def test_append_after_truncated_line_starts_a_fresh_event(tmp_path):
+    path = tmp_path / "show.jsonl"
+    log = ShowLog(str(path))
+    log.append("show", suggestion="airport", rounds=2, order=["Cathy", "Joe"])
+    log.append("line", speaker="Cathy", text="First line", round=0, terminated=False)
+    log.close()
+    # A crash in the middle of writing the next event
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "line", "speaker": "Jo')
+
+    resumed = ShowLog(str(path))
+    assert [event["type"] for event in resumed.events()] == ["show", "line"]
+    resumed.append("line", speaker="Joe", text="Second line", round=0, terminated=False)
+    resumed.close()
+
+    events = ShowLog(str(path)).events()
+    assert [event["type"] for event in events] == ["show", "line", "line"]
+    assert events[-1]["text"] == "Second line"
+
+def test_header_and_discard(tmp_path):
+    log = ShowLog.new(str(tmp_path))
+    assert log.header() is None
+    log.append("show", suggestion="airport", rounds=2, order=["Joe", "Cathy"])
+    assert log.header()["order"] == ["Joe", "Cathy"]
+    log.discard()
+    assert not log.exists and log.events() == []
+
+def test_resuming_a_finished_show_returns_its_state(tmp_path):
+    pytest.importorskip("autogen")
+    from archive import ShowArchive
+    from config import make_llm_config
+    from fake_openai_server import FakeOpenAIServer, FakeServerConfig
+    from orchestration import resume_show, run_improv
+
+    archive = ShowArchive(str(tmp_path / "shows.sqlite"))
+    log = ShowLog(str(tmp_path / "show.jsonl"))
+    with FakeOpenAIServer(FakeServerConfig(latency_ms=1, latency_sigma=0.0, seed=1)) as server:
+        llm_config = make_llm_config(model="fake-model", api_key="sk-fake", base_url=server.base_url)
+        first = run_improv("airport", 2, "Cathy", llm_config, checkpoint=log, archive=archive)
+        requests = server.backend.requests
+        again = resume_show(ShowLog(log.path), llm_config, archive=archive)
+        assert server.backend.requests == requests
+    assert [line.text for line in again.transcript] == [line.text for line in first.transcript]
+    assert [e.score for e in again.evaluations] == [e.score for e in first.evaluations]
+    assert archive.count_shows() == 1
+    assert [event["type"] for event in ShowLog(log.path).events()].count("end") == 1
+
+@pytest.mark.parametrize("critic_batch,pipeline_critic", [
+    ("line", False), ("line", True), ("round", False), ("round", True), ("show", False),
+])
+def test_cancelled_show_resumes_exactly(tmp_path, critic_batch, pipeline_critic):
+    pytest.importorskip("autogen")
+    from calls import CallContext, CancelToken, ShowCancelled
+    from config import make_llm_config
+    from fake_openai_server import FakeOpenAIServer, FakeServerConfig
+    from models import LineEval
+    from orchestration import resume_show, run_improv_streaming
+
+    rounds, cancel_after = 3, 3
+    options = {"critic_batch": critic_batch, "pipeline_critic": pipeline_critic}
+    config = FakeServerConfig(latency_ms=20, latency_sigma=0.0, seed=1)
+    log = ShowLog(str(tmp_path / "show.jsonl"))
+    token = CancelToken()
+
+    def on_line(speaker, line, round_idx):
+        if len([e for e in log.events() if e["type"] == "line"]) == cancel_after:
+            token.cancel()
+
+    with FakeOpenAIServer(config) as server:
+        llm_config = make_llm_config(model="fake-model", api_key="sk-fake", base_url=server.base_url)
+        with pytest.raises(ShowCancelled):
+            run_improv_streaming("airport", rounds, "Cathy", llm_config, on_comedian_line=on_line,
+                                 checkpoint=log, ctx=CallContext(cancel=token), **options)
+
+    events = ShowLog(log.path).events()
+    lines = [(e["speaker"], e["text"]) for e in events if e["type"] == "line"]
+    evals = [e["eval"] for e in events if e["type"] == "eval"]
+    assert len(lines) == cancel_after
+
+    # A fresh server, so calls abandoned by the cancelled run can't be counted
+    with FakeOpenAIServer(config) as server:
+        prompts = []
+        reply = server.backend.reply
+        server.backend.reply = lambda messages: prompts.append(messages) or reply(messages)
+        llm_config = make_llm_config(model="fake-model", api_key="sk-fake", base_url=server.base_url)
+        state = resume_show(ShowLog(log.path), llm_config, **options)
+
+    # Everything paid for before the interruption comes back unchanged
+    assert [(line.speaker, line.text) for line in state.transcript[:cancel_after]] == lines
+    assert state.evaluations[:len(evals)] == [LineEval(**e) for e in evals]
+    assert len(state.transcript) == 2 * rounds
+    assert sorted((e.speaker, e.round_idx) for e in state.evaluations) == \
+        sorted((line.speaker.lower(), i // 2) for i, line in enumerate(state.transcript))
+
+    # Only the unfinished calls are issued again
+    critic = [m for m in prompts if "comedy judge" in m[0]["content"]]
+    comedian = [m for m in prompts if "comedy judge" not in m[0]["content"]]
+    assert len(comedian) == 2 * rounds - cancel_after
+    expected_critic = {"line": 2 * rounds - len(evals), "round": rounds - cancel_after // 2, "show": 1}
+    assert len(critic) == expected_critic[critic_batch]
+
+    # The first resumed turn gets the feedback its comedian had when the show stopped
+    speaker = state.transcript[cancel_after].speaker
+    feedback = [e for e in evals if e["speaker"] == speaker.lower()]
+    prompt = comedian[0][-1]["content"]
+    if feedback:
+        assert f"Your last line scored {feedback[-1]['score']}/10" in prompt
+    else:
+        assert "Your last line scored" not in prompt
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from critic_output import CriticParseError, parse_batch, parse_line_eval, repair_prompt
+
+ENTRIES = [("Cathy", "First line", 0), ("Joe", "Second line", 0)]
+
+def test_parses_fenced_and_chatty_replies():
+    reply = 'Love it!\n```json\n{"speaker": "Cathy", "score": "8/10", "tags": "wordplay, callback", "comments": "Nice"}\n```'
+    line_eval = parse_line_eval(reply, "Cathy", "First line", 2)
+    assert (line_eval.speaker, line_eval.score, line_eval.tags, line_eval.round_idx) == (
+        "cathy", 8.0, ["wordplay", "callback"], 2)
+    assert line_eval.text == "First line"
+
+def test_clamps_scores_and_unwraps_batch_shape():
+    line_eval = parse_line_eval('{"evaluations": [{"score": 14, "tags": [], "comments": ""}]}', "Joe", "x", 0)
+    assert line_eval.score == 10.0 and line_eval.speaker == "joe"
+
+@pytest.mark.parametrize("reply", ["Great energy! Here's my take:\n{\"score\": 7, oops",
+                                   '{"score": true, "tags": []}', "no json here"])
+def test_unusable_replies_raise(reply):
+    with pytest.raises(CriticParseError):
+        parse_line_eval(reply, "Cathy", "First line", 0)
+
+def test_batch_keeps_good_entries_and_marks_bad_ones():
+    evals = parse_batch('{"evaluations": [{"score": 6, "tags": ["absurd"], "comments": "ok"}, {"score": "n/a"}]}',
+                        ENTRIES)
+    assert evals[0].score == 6.0 and evals[0].speaker == "cathy"
+    assert evals[1] is None
+    with pytest.raises(CriticParseError):
+        parse_batch('{"score": 6}', ENTRIES)
+
+def test_repair_prompt_quotes_the_reply_and_asks_for_the_shape():
+    prompt = repair_prompt("score: seven", batch=True)
+    assert "score: seven" in prompt and '"evaluations"' in prompt
+
+def test_unparseable_reply_is_repaired_with_one_call():
+    pytest.importorskip("autogen")
+    from agents import make_critic
+    from calls import CallContext
+    from config import make_llm_config
+    from fake_openai_server import FakeOpenAIServer, FakeServerConfig
+    from metrics import ShowMetrics
+    from orchestration import a_critic_judge_line
+
+    # With seed 9 the first critic reply is broken JSON and the repair reply is valid
+    config = FakeServerConfig(latency_ms=1, latency_sigma=0.0, critic_parse_failure_rate=0.5, seed=9)
+    ctx = CallContext(metrics=ShowMetrics())
+    with FakeOpenAIServer(config) as server:
+        critic = make_critic(make_llm_config(model="fake-model", api_key="sk-fake", base_url=server.base_url))
+        line_eval = asyncio.run(a_critic_judge_line(critic, "Cathy", "First line", "airport", 0, ctx))
+    assert line_eval.tags != ["parse-failed"]
+    assert ctx.metrics.counters["critic_parse_failed"] == 1
+    assert ctx.metrics.counters["critic_repaired"] == 1
+    assert [call.kind for call in ctx.metrics.calls] == ["critic", "critic_repair"]
+
+def test_structured_output_follows_the_serving_pool():
+    pytest.importorskip("autogen")
+    from agents import make_critic
+    from calls import CallContext
+    from config import make_llm_config
+    from orchestration import _critic_params
+    from router import EndpointPool, EndpointRouter, endpoint_from_dict
+
+    critic = make_critic(make_llm_config(model="gpt-4o-mini", api_key="sk-fake"))
+
+    # A self-hosted deployment would reject response_format with a 400
+    local = endpoint_from_dict({"model": "llama-3", "base_url": "http://localhost:8000/v1", "api_key": "x"})
+    ctx = CallContext(router=EndpointRouter({"critic": EndpointPool([local])}))
+    assert _critic_params(critic, False, ctx, "critic") is None
+    assert _critic_params(critic, True, ctx, "critic_batch") is None
+
+def test_rejected_structured_output_falls_back_once_and_is_remembered(monkeypatch):
+    pytest.importorskip("autogen")
+    import orchestration
+    from agents import make_critic
+    from config import make_llm_config
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    calls = []
+
+    async def fake_reply(agent, messages, ctx, kind, params=None):
+        calls.append(params)
+        if params:
+            raise BadRequest("Invalid parameter: 'response_format' of type 'json_schema' is not supported")
+        return '{"speaker": "cathy", "score": 7, "tags": ["wordplay"], "comments": "Nice."}'
+
+    monkeypatch.setattr(orchestration, "a_generate_reply", fake_reply)
+    # An Azure api_version that predates json_schema support
+    critic = make_critic(make_llm_config(model="gpt-4o-rejects", api_key="sk-fake",
+                                         base_url="https://east.openai.azure.com", api_version="2024-02-01"))
+    assert orchestration._critic_params(critic, False, None, "critic") is not None
+
+    line_eval = asyncio.run(orchestration.a_critic_judge_line(critic, "Cathy", "First line", "airport", 0))
+    assert line_eval.score == 7
+    assert [params is not None for params in calls] == [True, False]
+
+    asyncio.run(orchestration.a_critic_judge_line(critic, "Cathy", "Second line", "airport", 1))
+    assert [params is not None for params in calls] == [True, False, False]
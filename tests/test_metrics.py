@@ -0,0 +1,20 @@
+from metrics import CallRecord, MetricsRegistry, ShowMetrics
+
+def test_failed_attempts_stay_out_of_calls_and_latencies():
+    registry = MetricsRegistry()
+    metrics = ShowMetrics(registry)
+    metrics.record_call(CallRecord(kind="critic", agent="Critic", model="m", latency_s=30.0, error="TimeoutError"))
+    metrics.record_call(CallRecord(kind="critic", agent="Critic", model="m", latency_s=0.5, prompt_tokens=10))
+
+    snapshot = metrics.snapshot()
+    assert snapshot["calls"] == 1 and snapshot["errors"] == 1
+    assert snapshot["by_kind"]["critic"]["errors"] == 1
+    assert snapshot["by_kind"]["critic"]["p99"] == 0.5
+
+    totals = registry.snapshot()
+    assert totals["counters"]["critic_calls"] == 1
+    assert totals["counters"]["critic_errors"] == 1
+    assert totals["latency_s"]["critic"]["p99"] == 0.5
+
+    restored = ShowMetrics.from_dict(metrics.to_dict(), registry)
+    assert len(restored.calls) == 1 and len(restored.errors) == 1
@@ -0,0 +1,43 @@
+from fake_openai_server import COMEDIAN_LINES
+from prescore import PreScorer
+
+TRANSCRIPT = [
+    "Welcome to airport security, please remove your shoes.",
+    "My shoes are my emotional support animals.",
+    "Welcome to airport security, please remove your shoes now.",
+    "Bananas are yellow.",
+    "One. Two. Three. Four. Five.",
+    "The scanner loves my emotional support shoes, honestly.",
+]
+
+def _score(scorer, transcript=TRANSCRIPT):
+    entries = [("Cathy" if i % 2 == 0 else "Joe", line, i // 2) for i, line in enumerate(transcript)]
+    return scorer.score(entries, transcript, list(range(len(transcript))))
+
+def test_rule_breaking_lines_are_scored_locally():
+    results = _score(PreScorer())
+    tags = [r.tags[0] if r else None for r in results]
+    assert tags == [None, None, "repeat", None, "too-long", None]
+    assert all(r.tier == "local" for r in results if r)
+    assert results[2].speaker == "cathy" and results[2].round_idx == 1
+
+def test_local_scores_follow_the_configured_ranking():
+    scorer = PreScorer(repeat_score=1.0, rambling_score=2.5)
+    results = _score(scorer)
+    assert results[2].score == 1.0 and results[4].score == 2.5
+
+def test_on_topic_paraphrases_are_escalated():
+    # None of these share a word with "airport security", yet all are on topic
+    assert _score(PreScorer(), transcript=COMEDIAN_LINES) == [None] * len(COMEDIAN_LINES)
+
+def test_only_earlier_lines_count_as_context():
+    # The same line judged first in the scene has nothing to repeat
+    first = _score(PreScorer(), transcript=[TRANSCRIPT[2], TRANSCRIPT[0]])
+    assert first[0] is None
+    assert first[1].tags == ["repeat"]
+
+def test_empty_batch_and_empty_line():
+    scorer = PreScorer()
+    assert scorer.score([], TRANSCRIPT, []) == []
+    result, = scorer.score([("Joe", "...", 0)], [], [0])
+    assert result.score == 0.0 and result.tags == ["empty"]
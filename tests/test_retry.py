@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("autogen")
+
+from agents import make_comedian
+from calls import CallContext, a_generate_reply
+from config import make_llm_config
+from fake_openai_server import COMEDIAN_LINES, FakeOpenAIServer, FakeServerConfig
+from metrics import ShowMetrics
+from retry import RetryBudget, RetryPolicy
+
+MESSAGES = [{"role": "user", "content": "Open the scene with a strong first line."}]
+
+def _call(server: FakeOpenAIServer, ctx: CallContext) -> str:
+    llm_config = make_llm_config(model="fake-model", api_key="sk-fake", base_url=server.base_url, timeout=10)
+    return asyncio.run(a_generate_reply(make_comedian("Cathy", llm_config), MESSAGES, ctx, kind="comedian"))
+
+def test_transient_error_is_retried_by_the_policy():
+    # With seed 1 the first request fails and the second succeeds
+    config = FakeServerConfig(latency_ms=1, latency_sigma=0.0, error_rate=0.5, error_status=503, seed=1)
+    ctx = CallContext(metrics=ShowMetrics(), retry=RetryPolicy(base_delay_s=0.0))
+    with FakeOpenAIServer(config) as server:
+        reply = _call(server, ctx)
+    assert reply in COMEDIAN_LINES
+    assert ctx.metrics.snapshot()["retries"] == 1
+
+def test_client_does_not_retry_on_its_own():
+    config = FakeServerConfig(latency_ms=1, latency_sigma=0.0, error_rate=1.0, error_status=503)
+    ctx = CallContext(metrics=ShowMetrics(), retry=RetryPolicy(max_attempts=3, base_delay_s=0.0))
+    with FakeOpenAIServer(config) as server:
+        with pytest.raises(Exception):
+            _call(server, ctx)
+        # One HTTP request per policy attempt
+        assert server.backend.requests == 3
+
+def test_retry_budget_caps_retries():
+    config = FakeServerConfig(latency_ms=1, latency_sigma=0.0, error_rate=1.0, error_status=429)
+    ctx = CallContext(metrics=ShowMetrics(), retry=RetryPolicy(max_attempts=5, base_delay_s=0.0),
+                      retry_budget=RetryBudget(1))
+    with FakeOpenAIServer(config) as server:
+        with pytest.raises(Exception):
+            _call(server, ctx)
+        assert server.backend.requests == 2
+    assert ctx.metrics.counters["retry_budget_exhausted"] == 1
+
+def test_non_retryable_error_fails_fast():
+    config = FakeServerConfig(latency_ms=1, latency_sigma=0.0, error_rate=1.0, error_status=400)
+    ctx = CallContext(retry=RetryPolicy(max_attempts=3, base_delay_s=0.0))
+    with FakeOpenAIServer(config) as server:
+        with pytest.raises(Exception):
+            _call(server, ctx)
+        assert server.backend.requests == 1
@@ -0,0 +1,34 @@
+import asyncio
+
+from router import Endpoint, EndpointPool
+
+def _pool():
+    return EndpointPool([Endpoint("fast", {"model": "m"}), Endpoint("slow", {"model": "m"})], latency_alpha=0.5)
+
+def _call(pool, state, latency_s, completed=True):
+    # Reserve the slot on this endpoint as acquire() would, then hand it back
+    state.in_flight += 1
+    pool.release(state, latency_s, completed=completed)
+
+def test_abandoned_calls_only_raise_the_latency_estimate():
+    pool = _pool()
+    _, slow = pool.states
+    _call(pool, slow, 0.1)
+    assert slow.latency_ewma == 0.1
+
+    # A hedged loser cancelled after 2s took at least that long
+    _call(pool, slow, 2.0, completed=False)
+    assert slow.latency_ewma == 1.05
+    # One cancelled quickly says nothing about the endpoint
+    _call(pool, slow, 0.01, completed=False)
+    assert slow.latency_ewma == 1.05
+    assert slow.in_flight == 0
+
+def test_slow_hedge_losers_steer_calls_away():
+    pool = _pool()
+    fast, slow = pool.states
+    _call(pool, fast, 0.5)
+    _call(pool, slow, 0.2)
+    for _ in range(3):
+        _call(pool, slow, 3.0, completed=False)
+    assert asyncio.run(pool.acquire()) is fast
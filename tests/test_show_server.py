@@ -0,0 +1,54 @@
+import gc
+import logging
+import time
+
+import pytest
+
+from show_server import ShowChannel
+
+
+def _channel(history):
+    return ShowChannel("s1", {"suggestion": "a lighthouse"}, subscriber_buffer=8, history=history)
+
+
+def test_history_is_capped_and_ids_keep_counting():
+    channel = _channel(history=3)
+    for i in range(10):
+        channel.publish("token", text=str(i))
+    backlog, _ = channel.subscribe(after_id=8)
+    assert [e["id"] for e in backlog] == [9, 10]
+    assert channel.events_dropped == 7
+    assert channel.summary()["events"] == 10
+
+
+def test_resume_behind_history_reports_dropped_events():
+    channel = _channel(history=3)
+    for i in range(10):
+        channel.publish("token", text=str(i))
+    backlog, _ = channel.subscribe(after_id=2)
+    assert backlog[0] == {"id": 7, "type": "events_dropped", "count": 5}
+    assert [e["id"] for e in backlog[1:]] == [8, 9, 10]
+
+def test_stop_tells_running_and_queued_shows(caplog):
+    pytest.importorskip("autogen")
+    from config import make_llm_config
+    from fake_openai_server import FakeOpenAIServer, FakeServerConfig
+    from show_server import ShowServer
+
+    with FakeOpenAIServer(FakeServerConfig(latency_ms=200, latency_sigma=0.0)) as fake:
+        llm_config = make_llm_config(model="fake-model", api_key="sk-fake", base_url=fake.base_url)
+        server = ShowServer(llm_config, max_shows=2).start()
+        channels = [server.submit(server.validate({"suggestion": "airport", "rounds": 4})) for _ in range(3)]
+        deadline = time.monotonic() + 5
+        while sum(c.status == "running" for c in channels) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with caplog.at_level(logging.ERROR, logger="asyncio"):
+            server.stop()
+            gc.collect()
+
+    assert [c.status for c in channels] == ["failed"] * 3
+    for channel in channels:
+        backlog, subscriber = channel.subscribe()
+        assert subscriber is None
+        assert backlog[-1]["type"] == "error" and backlog[-1]["message"] == "Server shutting down"
+    assert not [r for r in caplog.records if "destroyed" in r.getMessage()]
@@ -1,80 +1,146 @@
-import streamlit as st
-import pandas as pd
-import json
-from models import ShowState, LineEval
-from utils import evaluations_df, average_scores, best_line
-
-def display_transcript(state: ShowState):
-    """Display the show transcript"""
-    st.subheader("📝 Transcript")
-    for msg in state.transcript:
-        with st.chat_message(msg["speaker"]):
-            st.write(f"**{msg['speaker']}:** {msg['text']}")
-
-def display_scores(state: ShowState):
-    """Display scores table and charts"""
-    st.subheader("📊 Scores")
-    if state.evaluations:
-        df = evaluations_df(state.evaluations)
-        st.dataframe(df, use_container_width=True)
-        
-        # Average scores chart
-        st.subheader("📈 Average Scores")
-        avg_scores = average_scores(state.evaluations)
-        chart_df = pd.DataFrame(list(avg_scores.items()), columns=["Speaker", "Average Score"])
-        st.bar_chart(chart_df.set_index("Speaker"))
-
-def display_best_line(state: ShowState):
-    """Display the best line"""
-    st.subheader("🏆 Best Line")
-    best = best_line(state.evaluations)
-    if best:
-        st.success(f"**{best.speaker.capitalize()}** (Score: {best.score})")
-        st.write(f"*\"{best.text}\"*")
-        if best.tags:
-            st.write(f"Tags: {', '.join(best.tags)}")
-        if best.comments:
-            st.write(f"Judge's note: {best.comments}")
-
-def display_export(state: ShowState):
-    """Display export options"""
-    st.subheader("💾 Export")
-    export_data = {
-        "suggestion": state.suggestion,
-        "rounds": state.rounds,
-        "wrapped": state.wrapped,
-        "transcript": state.transcript,
-        "evaluations": [
-            {
-                "speaker": e.speaker,
-                "text": e.text,
-                "score": e.score,
-                "tags": e.tags,
-                "comments": e.comments,
-                "round": e.round_idx + 1
-            }
-            for e in state.evaluations
-        ],
-        "averages": average_scores(state.evaluations)
-    }
-    
-    st.download_button(
-        label="Download JSON",
-        data=json.dumps(export_data, indent=2),
-        file_name=f"improv_show_{state.suggestion.replace(' ', '_')}.json",
-        mime="application/json"
-    )
-
-def display_score_update(eval: LineEval):
-    """Display a single score update in a compact format"""
-    score_emoji = "🔥" if eval.score >= 8 else "👍" if eval.score >= 6 else "🤔"
-    st.write(f"{score_emoji} **{eval.speaker.capitalize()}** scored {eval.score}/10")
-    if eval.tags:
-        st.caption(f"Tags: {', '.join(eval.tags)}")
-    if eval.comments:
-        st.caption(f"💭 {eval.comments}")
-
-def display_transcript_streaming(transcript_entry: dict):
-    """Display a single transcript entry for streaming"""
-    with st.chat_message(transcript_entry["speaker"]):
-        st.write(f"**{transcript_entry['speaker']}:** {transcript_entry['text']}")
+import streamlit as st
+from typing import TYPE_CHECKING
+from models import Line, ShowState, LineEval
+from serialize import dumps_text
+from utils import show_export
+
+if TYPE_CHECKING:
+    from archive import ShowArchive
+
+def display_transcript(state: ShowState):
+    """Display the show transcript"""
+    st.subheader("📝 Transcript")
+    for line in state.transcript:
+        with st.chat_message(line.speaker):
+            st.write(f"**{line.speaker}:** {line.text}")
+
+def display_scores(state: ShowState):
+    """Display scores table and charts"""
+    st.subheader("📊 Scores")
+    if state.evaluations:
+        df = state.stats.to_dataframe()
+        st.dataframe(df, use_container_width=True)
+        
+        import pandas as pd
+
+        # Average scores chart
+        st.subheader("📈 Average Scores")
+        avg_scores = state.stats.averages()
+        chart_df = pd.DataFrame(list(avg_scores.items()), columns=["Speaker", "Average Score"])
+        st.bar_chart(chart_df.set_index("Speaker"))
+
+def display_best_line(state: ShowState):
+    """Display the best line"""
+    st.subheader("🏆 Best Line")
+    best = state.stats.best
+    if best:
+        st.success(f"**{best.speaker.capitalize()}** (Score: {best.score})")
+        st.write(f"*\"{best.text}\"*")
+        if best.tags:
+            st.write(f"Tags: {', '.join(best.tags)}")
+        if best.comments:
+            st.write(f"Judge's note: {best.comments}")
+
+def display_export(state: ShowState):
+    """Display export options"""
+    st.subheader("💾 Export")
+    export_data = show_export(state)
+    
+    st.download_button(
+        label="Download JSON",
+        data=dumps_text(export_data, indent=True),
+        file_name=f"improv_show_{state.suggestion.replace(' ', '_')}.json",
+        mime="application/json"
+    )
+
+def display_score_update(eval: LineEval):
+    """Display a single score update in a compact format"""
+    score_emoji = "🔥" if eval.score >= 8 else "👍" if eval.score >= 6 else "🤔"
+    st.write(f"{score_emoji} **{eval.speaker.capitalize()}** scored {eval.score}/10")
+    if eval.tags:
+        st.caption(f"Tags: {', '.join(eval.tags)}")
+    if eval.comments:
+        st.caption(f"💭 {eval.comments}")
+
+def display_transcript_streaming(line: Line):
+    """Display a single transcript line for streaming"""
+    with st.chat_message(line.speaker):
+        st.write(f"**{line.speaker}:** {line.text}")
+
+def display_performance(state: ShowState):
+    """Display per-show latency, token and cost metrics in a collapsible panel"""
+    if not state.metrics:
+        return
+    snapshot = state.metrics.snapshot()
+    with st.expander("⚡ Performance", expanded=False):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Show time", f"{snapshot['duration_s']:.1f}s")
+        col2.metric("Agent calls", snapshot["calls"])
+        col3.metric("Tokens", snapshot["prompt_tokens"] + snapshot["completion_tokens"])
+        col4.metric("Est. cost", f"${snapshot['cost']:.4f}")
+        
+        rows = [
+            {"call": kind, **{k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()}}
+            for kind, stats in snapshot["by_kind"].items()
+        ]
+        if rows:
+            import pandas as pd
+            st.dataframe(pd.DataFrame(rows).set_index("call"), use_container_width=True)
+        
+        round_latency = snapshot["round_latency_s"]
+        st.caption(
+            f"Round latency p50 {round_latency['p50']:.2f}s · p95 {round_latency['p95']:.2f}s · "
+            f"p99 {round_latency['p99']:.2f}s · retries {snapshot['retries']} · "
+            f"cached prompt tokens {snapshot['cached_tokens']} ({snapshot['cached_prompt_share']:.0%}) · "
+            f"critic parse failures {snapshot['counters'].get('critic_parse_failed', 0)} "
+            f"({snapshot['counters'].get('critic_repaired', 0)} repaired)"
+        )
+
+def display_history(archive: "ShowArchive", page_size: int = 20):
+    """Browse archived lines one page at a time"""
+    st.subheader("📚 Show History")
+    st.caption(f"{archive.count_shows()} archived shows")
+
+    col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+    suggestion = col1.text_input("Suggestion contains", key="history_suggestion")
+    speaker = col2.selectbox("Speaker", ["Any", "Cathy", "Joe"], key="history_speaker")
+    tag = col3.text_input("Tag", key="history_tag")
+    order_by = col4.selectbox("Order", ["score", "recent"], key="history_order")
+    min_score = st.slider("Minimum score", 0.0, 10.0, 0.0, 0.5, key="history_min_score")
+
+    # Start from the first page whenever the filters change
+    filters = (suggestion, speaker, tag, order_by, min_score)
+    if st.session_state.get("history_filters") != filters:
+        st.session_state.history_filters = filters
+        st.session_state.history_page = 0
+    page = st.session_state.get("history_page", 0)
+
+    # Fetch one extra row to know whether a next page exists
+    rows = archive.search_lines(
+        suggestion=suggestion or None,
+        speaker=None if speaker == "Any" else speaker,
+        tag=tag or None,
+        min_score=min_score or None,
+        order_by=order_by,
+        limit=page_size + 1,
+        offset=page * page_size,
+    )
+    has_next = len(rows) > page_size
+
+    if not rows:
+        st.info("No archived lines match these filters.")
+    for row in rows[:page_size]:
+        with st.container(border=True):
+            st.write(f"**{row['speaker'].capitalize()}** ({row['score']}/10) · *{row['suggestion']}* · round {row['round']}")
+            st.write(f"\"{row['text']}\"")
+            if row["tags"]:
+                st.caption(f"Tags: {', '.join(row['tags'])}")
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    if prev_col.button("← Previous", disabled=page == 0, key="history_prev"):
+        st.session_state.history_page = page - 1
+        st.rerun()
+    page_col.caption(f"Page {page + 1}")
+    if next_col.button("Next →", disabled=not has_next, key="history_next"):
+        st.session_state.history_page = page + 1
+        st.rerun()